@@ -0,0 +1,93 @@
+# base/achievements.py
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from .models import (
+    Achievement, LearningStreak, Student, StudentAchievement,
+    StudentProgress, VoiceInteraction,
+)
+
+
+def collect_student_metrics(student_ids):
+    """Metric values per student from one grouped query per source table"""
+    metrics = {
+        student_id: {'progress': 0, 'completed_assignments': 0, 'streak': 0, 'voice_count': 0}
+        for student_id in student_ids
+    }
+
+    progress_rows = StudentProgress.objects.filter(student_id__in=student_ids).values('student').annotate(
+        avg_progress=Avg('progress_percentage'),
+        completed=Count('id', filter=Q(completed=True))
+    )
+    for row in progress_rows:
+        metrics[row['student']]['progress'] = row['avg_progress'] or 0
+        metrics[row['student']]['completed_assignments'] = row['completed'] or 0
+
+    streak_rows = LearningStreak.objects.filter(student_id__in=student_ids).values('student').annotate(
+        longest=Max('longest_streak')
+    )
+    for row in streak_rows:
+        metrics[row['student']]['streak'] = row['longest'] or 0
+
+    voice_rows = VoiceInteraction.objects.filter(student_id__in=student_ids).values('student').annotate(
+        total=Count('id')
+    )
+    for row in voice_rows:
+        metrics[row['student']]['voice_count'] = row['total'] or 0
+
+    return metrics
+
+
+def evaluate_achievements(student_ids=None, chunk_size=2000):
+    """Award every rule-based achievement that active students now qualify for.
+
+    Students are processed in chunks so IN clauses stay bounded; each chunk
+    costs four grouped reads and one bulk insert. New awards carry their data
+    hash and are anchored later by StudentAchievement.anchor_pending().
+    Returns the number of awards created.
+    """
+    rules = list(Achievement.objects.exclude(rule_metric='').filter(rule_threshold__isnull=False))
+    if not rules:
+        return 0
+
+    students = Student.objects.filter(is_active=True)
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+    all_ids = list(students.order_by('id').values_list('id', flat=True))
+
+    earned_date = timezone.now()
+    hashes = {
+        rule.id: StudentAchievement.calculate_achievement_hash(rule, earned_date)
+        for rule in rules
+    }
+
+    created = 0
+    for start in range(0, len(all_ids), chunk_size):
+        chunk = all_ids[start:start + chunk_size]
+        metrics = collect_student_metrics(chunk)
+        already_earned = set(StudentAchievement.objects.filter(
+            student_id__in=chunk,
+            achievement__in=rules
+        ).values_list('student_id', 'achievement_id'))
+
+        awards = [
+            StudentAchievement(
+                student_id=student_id,
+                achievement_id=rule.id,
+                earned_date=earned_date,
+                notes='Awarded automatically',
+                data_hash=hashes[rule.id]
+            )
+            for student_id in chunk
+            for rule in rules
+            if (student_id, rule.id) not in already_earned
+            and metrics[student_id][rule.rule_metric] >= rule.rule_threshold
+        ]
+
+        with transaction.atomic():
+            StudentAchievement.objects.bulk_create(awards, batch_size=500, ignore_conflicts=True)
+        Student.invalidate_voice_context(award.student_id for award in awards)
+        created += len(awards)
+
+    return created
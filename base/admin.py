@@ -12,11 +12,16 @@ class SubjectAdmin(admin.ModelAdmin):
     list_display = ['name', 'code']
     search_fields = ['name', 'code']
 
+class AssignmentTargetGradeInline(admin.TabularInline):
+    model = AssignmentTargetGrade
+    extra = 0
+
 @admin.register(Assignment)
 class AssignmentAdmin(admin.ModelAdmin):
     list_display = ['title', 'subject', 'due_date', 'created_by']
-    list_filter = ['subject', 'due_date']
+    list_filter = ['subject', 'due_date', 'target_grades__grade_level']
     search_fields = ['title']
+    inlines = [AssignmentTargetGradeInline]
 
 @admin.register(StudentProgress)
 class StudentProgressAdmin(admin.ModelAdmin):
@@ -43,6 +48,13 @@ class VoiceInteractionAdmin(admin.ModelAdmin):
     search_fields = ['student__name', 'voice_command']
 
 
+@admin.register(LessonContent)
+class LessonContentAdmin(admin.ModelAdmin):
+    list_display = ['question', 'subject_area', 'grade_band', 'source', 'updated_at']
+    list_filter = ['subject_area', 'grade_band', 'source']
+    search_fields = ['question', 'answer', 'keywords']
+
+
 @admin.register(StudentNote)
 class StudentNoteAdmin(admin.ModelAdmin):
     list_display = ['student', 'author', 'created_at', 'is_important']
@@ -63,3 +75,10 @@ class BlockchainRecordAdmin(admin.ModelAdmin):
     def transaction_hash_short(self, obj):
         return obj.transaction_hash[:16] + '...' if obj.transaction_hash else ''
     transaction_hash_short.short_description = 'Transaction Hash'
+
+
+@admin.register(Achievement)
+class AchievementAdmin(admin.ModelAdmin):
+    list_display = ['name', 'level', 'rule_metric', 'rule_threshold', 'points']
+    list_filter = ['level', 'rule_metric']
+    search_fields = ['name', 'requirement']
@@ -0,0 +1,168 @@
+# base/admission.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from django.conf import settings
+
+
+class AdmissionController:
+    """Admission control in front of the voice pipeline.
+
+    Every request takes a token from its student's bucket and its teacher's
+    bucket (VOICE_STUDENT_RATE / VOICE_TEACHER_RATE tokens a second, up to
+    the burst sizes); a request finding either empty is turned away at once.
+    Upstream LLM calls then need one of VOICE_LLM_CONCURRENCY slots. When
+    all slots are busy, callers queue per student and freed slots go to the
+    waiting students in turn, so one busy student cannot take them all; a
+    caller that waits longer than VOICE_ADMISSION_WAIT gets no slot and
+    answers locally. Buckets and slots are per worker process.
+    """
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._active = 0
+        self._waiting = OrderedDict()
+        self.rejected = 0
+        self.queued = 0
+        self.timeouts = 0
+
+    @property
+    def max_concurrency(self):
+        return getattr(settings, 'VOICE_LLM_CONCURRENCY', 8)
+
+    @property
+    def max_wait(self):
+        return getattr(settings, 'VOICE_ADMISSION_WAIT', 3.0)
+
+    def _limits(self, scope):
+        if scope == 'teacher':
+            return getattr(settings, 'VOICE_TEACHER_RATE', 2.0), getattr(settings, 'VOICE_TEACHER_BURST', 30)
+        return getattr(settings, 'VOICE_STUDENT_RATE', 0.2), getattr(settings, 'VOICE_STUDENT_BURST', 5)
+
+    def _level(self, key, now):
+        rate, burst = self._limits(key[0])
+        tokens, updated = self._buckets.get(key, (burst, now))
+        return min(burst, tokens + (now - updated) * rate)
+
+    def admit(self, student_key, teacher_key=None):
+        """Take a token from the student's and the teacher's bucket; False if either is empty"""
+        keys = [('student', student_key)]
+        if teacher_key is not None:
+            keys.append(('teacher', teacher_key))
+        now = time.monotonic()
+        with self._lock:
+            levels = {key: self._level(key, now) for key in keys}
+            if any(level < 1 for level in levels.values()):
+                self.rejected += 1
+                for key, level in levels.items():
+                    self._buckets[key] = (level, now)
+                return False
+            for key, level in levels.items():
+                self._buckets[key] = (level - 1, now)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+        return True
+
+    def _prune(self, now):
+        """Forget buckets that have refilled; they are recreated full on demand"""
+        for key in list(self._buckets):
+            if self._level(key, now) >= self._limits(key[0])[1]:
+                del self._buckets[key]
+
+    def _enqueue(self, student_key):
+        """A future that resolves once the student holds a slot"""
+        future = Future()
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                future.set_result(True)
+                return future
+            self._waiting.setdefault(student_key, deque()).append(future)
+            self.queued += 1
+        return future
+
+    def _abandon(self, student_key, future):
+        """Withdraw a waiter that timed out; True if a slot was granted meanwhile"""
+        with self._lock:
+            if future.done():
+                return True
+            waiters = self._waiting.get(student_key)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiting[student_key]
+            self.timeouts += 1
+        return False
+
+    def acquire(self, student_key, timeout=None):
+        """Wait for an upstream slot; False when none frees up within the timeout"""
+        future = self._enqueue(student_key)
+        try:
+            return future.result(timeout=self.max_wait if timeout is None else timeout)
+        except FutureTimeoutError:
+            return self._abandon(student_key, future)
+
+    async def acquire_async(self, student_key, timeout=None):
+        future = self._enqueue(student_key)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                self.max_wait if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            return self._abandon(student_key, future)
+        except asyncio.CancelledError:
+            if self._abandon(student_key, future):
+                self.release()
+            raise
+
+    def acquire_spare(self, share):
+        """Take a slot for background work only while nobody waits and under ``share`` of the slots are busy"""
+        with self._lock:
+            if self._waiting or self._active >= self.max_concurrency * share:
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        """Free a slot, handing it to the next student in the rotation"""
+        with self._lock:
+            while self._waiting:
+                student_key, waiters = self._waiting.popitem(last=False)
+                future = waiters.popleft()
+                if waiters:
+                    self._waiting[student_key] = waiters  # Back of the rotation
+                future.set_result(True)
+                return
+            self._active -= 1
+
+    @contextmanager
+    def slot(self, student_key, timeout=None):
+        """Context manager yielding whether an upstream slot was obtained"""
+        acquired = self.acquire(student_key, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self._active,
+                'waiting': sum(len(waiters) for waiters in self._waiting.values()),
+                'rejected': self.rejected,
+                'queued': self.queued,
+                'timeouts': self.timeouts,
+            }
+
+
+# Singleton instance
+voice_admission = AdmissionController()
@@ -0,0 +1,305 @@
+# base/conversations.py
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+
+from .llm import llm_clients, model_catalog
+
+CONVERSATION_KEY = 'base:conversation:{}:{}'
+CONVERSATION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)"""
+    return len(text or '') // 4 + 1
+
+
+def exchange_tokens(exchange):
+    return (
+        estimate_tokens(exchange['user']) + estimate_tokens(exchange['assistant'])
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+
+
+def conversation_summary(exchanges):
+    """Running summary carried at the head of a conversation context, if any"""
+    for exchange in exchanges or []:
+        if isinstance(exchange, dict) and exchange.get('summary'):
+            return exchange['summary']
+    return ''
+
+
+def trim_history(exchanges, token_budget):
+    """Most recent complete exchanges that fit in token_budget, oldest first"""
+    kept = []
+    used = 0
+    for exchange in reversed(exchanges or []):
+        if not isinstance(exchange, dict) or 'user' not in exchange or 'assistant' not in exchange:
+            continue
+        cost = exchange_tokens(exchange)
+        if used + cost > token_budget:
+            break
+        kept.append(exchange)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+class ConversationStore:
+    """Server-side voice conversation history.
+
+    The browser keeps only a conversation id. Each conversation is a
+    running summary of older turns plus the recent exchanges, held in the
+    VOICE_CONVERSATION_CACHE cache so every worker and restart sees the
+    same history. Every write stamps a new version next to it; the
+    per-process LRU (up to VOICE_CONVERSATION_LOCAL_MAX conversations) only
+    serves a local copy while its version is still the cached one, so a
+    read costs one small lookup. Writes re-read the conversation under a
+    short lock taken with cache.add(), so concurrent turns and the
+    summarizer do not overwrite each other. Each history keeps at most
+    VOICE_CONVERSATION_MAX_TURNS exchanges; prompts are trimmed further by
+    token budget when built.
+    """
+
+    # Seconds a writer may hold the lock, and waits for it before writing anyway
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 2
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'VOICE_CONVERSATION_CACHE', 'default')]
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'VOICE_CONVERSATION_LOCAL_MAX', 200)
+
+    @property
+    def max_turns(self):
+        return getattr(settings, 'VOICE_CONVERSATION_MAX_TURNS', 20)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'VOICE_CONVERSATION_TTL', 3600)
+
+    def resolve(self, conversation_id):
+        """The client's conversation id if well formed, otherwise a new one"""
+        if isinstance(conversation_id, str) and CONVERSATION_ID_PATTERN.match(conversation_id):
+            return conversation_id
+        return uuid.uuid4().hex
+
+    def get(self, owner_id, conversation_id):
+        """{'summary': str, 'history': [{'user', 'assistant'}, ...]} for a conversation"""
+        key = CONVERSATION_KEY.format(owner_id, conversation_id)
+        if self.max_entries > 0:
+            version = self.cache.get(f"{key}:version")
+            with self._lock:
+                state = self._entries.get(key)
+                if state is not None and version is not None and state['version'] == version:
+                    self._entries.move_to_end(key)
+                    return {'summary': state['summary'], 'history': list(state['history'])}
+        state = self._load(key)
+        return {'summary': state['summary'], 'history': list(state['history'])}
+
+    def context(self, owner_id, conversation_id):
+        """Conversation as a context list: the summary entry first, then the exchanges"""
+        state = self.get(owner_id, conversation_id)
+        summary = [{'summary': state['summary']}] if state['summary'] else []
+        return summary + state['history']
+
+    def append(self, owner_id, conversation_id, user_message, response_text):
+        """Add one exchange and write the conversation through to the cache"""
+        key = CONVERSATION_KEY.format(owner_id, conversation_id)
+        with self._locked(key):
+            state = self._load(key)
+            state['history'].append({'user': user_message, 'assistant': response_text})
+            state['history'] = state['history'][-self.max_turns:]
+            self._save(key, state)
+        return {'summary': state['summary'], 'history': list(state['history'])}
+
+    def fold(self, owner_id, conversation_id, folded, summary):
+        """Replace the folded exchanges with the new running summary"""
+        key = CONVERSATION_KEY.format(owner_id, conversation_id)
+        with self._locked(key):
+            state = self._load(key)
+            state['history'] = [exchange for exchange in state['history'] if exchange not in folded]
+            state['summary'] = summary
+            self._save(key, state)
+        return {'summary': state['summary'], 'history': list(state['history'])}
+
+    @contextmanager
+    def _locked(self, key):
+        """Hold the conversation's cache lock while it is re-read, changed and written back"""
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_WAIT
+        acquired = False
+        try:
+            while not acquired:
+                acquired = self.cache.add(lock_key, token, self.LOCK_TIMEOUT)
+                if not acquired:
+                    if time.monotonic() >= deadline:
+                        print(f"Conversation lock {key} still held, writing anyway")
+                        break
+                    time.sleep(0.01)
+        except Exception as e:
+            print(f"Error locking conversation {key}: {e}")
+        try:
+            yield
+        finally:
+            if acquired and self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def _load(self, key):
+        """The cached conversation, refreshing the local copy"""
+        state = self.cache.get(key) or {}
+        if isinstance(state, list):
+            state = {'history': state}  # Stored before summaries existed
+        state = {
+            'summary': state.get('summary', ''),
+            'history': list(state.get('history', [])),
+            'version': state.get('version'),
+        }
+        self._remember(key, dict(state, history=list(state['history'])))
+        return state
+
+    def _save(self, key, state):
+        state['version'] = uuid.uuid4().hex
+        try:
+            self.cache.set_many({key: state, f"{key}:version": state['version']}, self.ttl)
+        except Exception as e:
+            print(f"Error saving conversation {key}: {e}")
+        self._remember(key, dict(state, history=list(state['history'])))
+
+    def _remember(self, key, state):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ConversationSummarizer:
+    """Folds older exchanges into the conversation's running summary.
+
+    Once a conversation's exchanges pass VOICE_SUMMARY_THRESHOLD tokens,
+    all but the last VOICE_SUMMARY_KEEP_TURNS are summarized on a
+    background thread, after the reply has gone out, so prompts stay about
+    the same size however long the session runs. The summary comes from a
+    small Groq model; without one, the student's earlier questions are
+    listed instead.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='voice-summary')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def threshold(self):
+        return getattr(settings, 'VOICE_SUMMARY_THRESHOLD', 600)
+
+    @property
+    def keep_turns(self):
+        return getattr(settings, 'VOICE_SUMMARY_KEEP_TURNS', 3)
+
+    @property
+    def max_tokens(self):
+        return getattr(settings, 'VOICE_SUMMARY_MAX_TOKENS', 200)
+
+    def needs_summary(self, state):
+        history = state['history']
+        if len(history) <= self.keep_turns:
+            return False
+        return sum(exchange_tokens(exchange) for exchange in history) > self.threshold
+
+    def schedule(self, owner_id, conversation_id, state):
+        """Queue a fold for the conversation if it is over the threshold; True if queued"""
+        if not self.needs_summary(state):
+            return False
+        key = (owner_id, conversation_id)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, owner_id, conversation_id)
+        return True
+
+    def _run(self, owner_id, conversation_id):
+        try:
+            state = self.store.get(owner_id, conversation_id)
+            if not self.needs_summary(state):
+                return
+            folded = state['history'][:-self.keep_turns]
+            summary = self.summarize(state['summary'], folded)
+            self.store.fold(owner_id, conversation_id, folded, summary)
+            print(f"Folded {len(folded)} exchanges into the summary of conversation {conversation_id}")
+        except Exception as e:
+            print(f"Error summarizing conversation {conversation_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((owner_id, conversation_id))
+
+    def summarize(self, summary, exchanges):
+        """New running summary covering the previous summary and the given exchanges"""
+        client = llm_clients.get_groq_client()
+        if client:
+            transcript = '\n'.join(
+                f"Student: {exchange['user']}\nAssistant: {exchange['assistant']}"
+                for exchange in exchanges
+            )
+            models = model_catalog.get_models()
+            model = getattr(settings, 'VOICE_SUMMARY_MODEL', '')
+            for candidate in ([model] if model in models else []) + models[-1:]:
+                try:
+                    response = client.chat.completions.create(
+                        model=candidate,
+                        messages=[
+                            {"role": "system", "content": (
+                                "Summarize this tutoring conversation for the assistant's own memory. "
+                                "Keep the topics covered, what the student found hard, answers they "
+                                "gave and anything left unfinished. Be brief and factual."
+                            )},
+                            {"role": "user", "content": (
+                                f"Summary so far: {summary or 'none'}\n\nNew exchanges:\n{transcript}"
+                            )},
+                        ],
+                        temperature=0.2,
+                        max_tokens=self.max_tokens,
+                        timeout=getattr(settings, 'LLM_REQUEST_TIMEOUT', 15)
+                    )
+                    text = response.choices[0].message.content.strip()
+                    if text:
+                        return text
+                except Exception as e:
+                    print(f"Summary model {candidate} failed: {e}")
+
+        questions = '; '.join(exchange['user'].strip().rstrip('?') for exchange in exchanges)
+        text = f"{summary} The student also asked about: {questions}." if summary else f"The student asked about: {questions}."
+        # Keep the most recent part when the list outgrows the budget
+        limit = self.max_tokens * 4
+        return text if len(text) <= limit else '...' + text[-limit:].split(' ', 1)[-1]
+
+
+# Singleton instances
+conversation_store = ConversationStore()
+conversation_summarizer = ConversationSummarizer(conversation_store)
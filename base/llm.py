@@ -0,0 +1,835 @@
+# base/llm.py
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import groq
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+# Preference order used until the first catalog refresh completes
+DEFAULT_GROQ_MODELS = [
+    "llama-3.1-70b-versatile",
+    "llama-3.1-8b-instant",
+    "mixtral-8x7b-32768",
+    "gemma2-9b-it",
+    "llama3-70b-8192",
+    "llama3-8b-8192",
+]
+
+
+class LLMClientRegistry:
+    """Process-wide LLM clients that keep their HTTP connections alive between requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groq_client = None
+        self._session = None
+        # Async clients belong to the event loop they were created on
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _timeout(self):
+        return httpx.Timeout(getattr(settings, 'LLM_REQUEST_TIMEOUT', 15), connect=5)
+
+    def _limits(self):
+        return httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=120)
+
+    def get_groq_client(self):
+        """Shared Groq client, or None when no API key is configured"""
+        if self._groq_client is None:
+            api_key = getattr(settings, 'GROQ_API_KEY', None)
+            if not api_key or api_key == 'your-groq-api-key-here':
+                print("Warning: GROQ_API_KEY is not set in settings.py")
+                return None
+            with self._lock:
+                if self._groq_client is None:
+                    http_client = httpx.Client(timeout=self._timeout(), limits=self._limits())
+                    # Retries are decided by the router, not hidden inside the client
+                    self._groq_client = groq.Groq(api_key=api_key, http_client=http_client, max_retries=0)
+        return self._groq_client
+
+    def get_session(self):
+        """Shared requests session for the HTTP providers (Hugging Face, Ollama)"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _loop_clients(self):
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(loop)
+        if clients is None:
+            clients = self._async_clients[loop] = {}
+        return clients
+
+    def get_async_http_client(self):
+        """Shared httpx.AsyncClient for the running event loop"""
+        clients = self._loop_clients()
+        if 'http' not in clients:
+            clients['http'] = httpx.AsyncClient(timeout=self._timeout(), limits=self._limits())
+        return clients['http']
+
+    def get_async_groq_client(self):
+        """Shared groq.AsyncGroq for the running event loop, or None without an API key"""
+        api_key = getattr(settings, 'GROQ_API_KEY', None)
+        if not api_key or api_key == 'your-groq-api-key-here':
+            return None
+        clients = self._loop_clients()
+        if 'groq' not in clients:
+            clients['groq'] = groq.AsyncGroq(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(timeout=self._timeout(), limits=self._limits()),
+                max_retries=0
+            )
+        return clients['groq']
+
+    def close(self):
+        with self._lock:
+            if self._groq_client is not None:
+                self._groq_client.close()
+                self._groq_client = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class ModelCatalog:
+    """Groq models to try, refreshed in the background and never probed on the request path"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._available = None
+        self._unavailable = {}
+        self._refreshed_at = 0
+        self._refreshing = False
+
+    @property
+    def preferred(self):
+        return list(getattr(settings, 'GROQ_MODELS', DEFAULT_GROQ_MODELS))
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'LLM_MODEL_CATALOG_TTL', 3600)
+
+    def get_models(self):
+        """Models in preference order, minus those known to be unavailable.
+
+        Returns immediately from the last known catalog and starts a
+        background refresh when it is older than the TTL.
+        """
+        if time.monotonic() - self._refreshed_at > self.ttl:
+            self.refresh_in_background()
+
+        now = time.monotonic()
+        models = self.preferred
+        if self._available is not None:
+            models = [model for model in models if model in self._available] or self.preferred
+        return [model for model in models if self._unavailable.get(model, 0) <= now]
+
+    def mark_unavailable(self, model, duration=None):
+        """Skip a model that was decommissioned or not found until the next refresh"""
+        self._unavailable[model] = time.monotonic() + (duration or self.ttl)
+        print(f"Groq model {model} marked unavailable")
+
+    def refresh(self):
+        """Fetch the model list from the Groq API"""
+        client = self.registry.get_groq_client()
+        if not client:
+            return False
+        try:
+            available = {model.id for model in client.models.list().data}
+        except Exception as e:
+            print(f"Groq model catalog refresh failed: {e}")
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            self._available = available
+            self._unavailable = {
+                model: until for model, until in self._unavailable.items()
+                if until > now and model in available
+            }
+        print(f"Groq model catalog refreshed: {sorted(available)}")
+        return True
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            # Set now so concurrent requests do not start more refreshes
+            self._refreshed_at = time.monotonic()
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='groq-model-catalog', daemon=True).start()
+
+
+class ProviderHealth:
+    """Circuit breakers per provider and per model, shared between workers through the cache.
+
+    A breaker opens after LLM_BREAKER_FAILURES consecutive failures (errors,
+    empty answers or calls slower than LLM_BREAKER_SLOW_CALL seconds) and
+    stays open for LLM_BREAKER_COOLDOWN seconds. After that one worker
+    claims a half-open probe; its outcome closes or reopens the breaker.
+    A model's failures only count against its provider when the provider
+    itself is at fault (unreachable, or refusing the credentials), or once
+    that many different models have failed; one retired or overloaded
+    model does not shut out the provider's other models.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    KEY_PREFIX = 'llm:health:'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'LLM_HEALTH_CACHE', 'default')]
+
+    def _settings(self):
+        return (
+            getattr(settings, 'LLM_BREAKER_FAILURES', 3),
+            getattr(settings, 'LLM_BREAKER_COOLDOWN', 30),
+            getattr(settings, 'LLM_BREAKER_SLOW_CALL', 6),
+        )
+
+    @staticmethod
+    def provider_of(name):
+        return name.split(':', 1)[0]
+
+    def get_states(self, names):
+        keys = {self.KEY_PREFIX + name: name for name in names}
+        stored = self.cache.get_many(list(keys))
+        return {
+            name: stored.get(key) or {'state': self.CLOSED, 'failures': 0, 'opened_until': 0, 'latencies': []}
+            for key, name in keys.items()
+        }
+
+    def _save(self, name, state):
+        self.cache.set(self.KEY_PREFIX + name, state, 86400)
+
+    def allows(self, name, state):
+        """Closed circuits pass; an expired open circuit passes for one probe"""
+        if state['state'] == self.CLOSED:
+            return True
+        if time.time() < state['opened_until']:
+            return False
+        failures, cooldown, slow_call = self._settings()
+        if not self.cache.add(f"{self.KEY_PREFIX}probe:{name}", 1, slow_call + 5):
+            return False
+        state['state'] = self.HALF_OPEN
+        self._save(name, state)
+        print(f"Circuit {name} half-open, probing")
+        return True
+
+    @staticmethod
+    def p50(state):
+        latencies = sorted(state.get('latencies') or ())
+        return latencies[len(latencies) // 2] if latencies else None
+
+    def route(self, candidates):
+        """Candidates whose provider and model circuits allow a call, fastest p50 first"""
+        names = {candidate.name for candidate in candidates}
+        names |= {self.provider_of(name) for name in names}
+        states = self.get_states(names)
+
+        allowed = {}
+        for name in sorted(names, key=lambda name: ':' in name):
+            provider = self.provider_of(name)
+            if name != provider and not allowed.get(provider):
+                allowed[name] = False
+                continue
+            allowed[name] = self.allows(name, states[name])
+
+        default = getattr(settings, 'LLM_HEDGE_DELAY', 2.0)
+        routed = [candidate for candidate in candidates if allowed[candidate.name]]
+        skipped = [candidate.name for candidate in candidates if not allowed[candidate.name]]
+        if skipped:
+            print(f"Skipping open circuits: {', '.join(skipped)}")
+
+        def p50_or_default(candidate):
+            p50 = self.p50(states[candidate.name])
+            return default if p50 is None else p50
+
+        return sorted(routed, key=p50_or_default)
+
+    def record(self, name, ok, seconds, error=None):
+        """Feed one call outcome to the model circuit and its provider circuit"""
+        failure_threshold, cooldown, slow_call = self._settings()
+        ok = ok and seconds <= slow_call
+        provider = self.provider_of(name)
+        names = [name] if provider == name else [name, provider]
+        for key, state in self.get_states(names).items():
+            if ok:
+                if state['state'] != self.CLOSED:
+                    print(f"Circuit {key} closed")
+                state.update(state=self.CLOSED, failures=0, failed_models=[])
+                state['latencies'] = (state.get('latencies') or [])[-19:] + [round(seconds, 3)]
+            else:
+                if key != name and not is_provider_error(error):
+                    failed_models = set(state.get('failed_models') or ()) | {name}
+                    state['failed_models'] = sorted(failed_models)
+                    tripped = len(failed_models) >= failure_threshold
+                    cause = f"{len(failed_models)} failing models"
+                else:
+                    state['failures'] += 1
+                    tripped = state['failures'] >= failure_threshold
+                    cause = f"{state['failures']} failures"
+                if state['state'] == self.HALF_OPEN or tripped:
+                    if state['state'] != self.OPEN:
+                        print(f"Circuit {key} opened after {cause}")
+                    state.update(state=self.OPEN, opened_until=time.time() + cooldown)
+            self._save(key, state)
+            if state['state'] != self.HALF_OPEN:
+                self.cache.delete(f"{self.KEY_PREFIX}probe:{key}")
+
+
+class ProviderCandidate:
+    """One way of answering a prompt.
+
+    ``call(timeout)`` returns text or None, or raises. Providers that can
+    stream also set ``stream(timeout)``, an iterator of text deltas, and
+    those with an async client set ``acall(timeout)``, a coroutine.
+    """
+
+    def __init__(self, name, call, stream=None, acall=None):
+        self.name = name
+        self.call = call
+        self.stream = stream
+        self.acall = acall
+
+    def __repr__(self):
+        return f"ProviderCandidate({self.name})"
+
+
+class ProviderRacer:
+    """Hedged dispatch over provider candidates.
+
+    The first candidate starts straight away. If it has not answered by
+    its usual latency (a configurable percentile of its recent successes),
+    the next candidate is started alongside it, and a failed candidate is
+    replaced at once. The first non-empty answer wins; candidates still
+    running are abandoned and none are started after the deadline.
+
+    Abandoned calls cannot be interrupted, so each call is cut off at
+    LLM_BREAKER_SLOW_CALL (slower answers count as failures anyway), and
+    no hedges are started while all LLM_RACE_WORKERS threads are busy.
+    """
+
+    def __init__(self, health=None, max_workers=None, samples=50):
+        self.health = health
+        self.max_workers = max_workers or getattr(settings, 'LLM_RACE_WORKERS', 32)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm-race')
+        self._latencies = {}
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def deadline(self):
+        return getattr(settings, 'LLM_RESPONSE_DEADLINE', 8.0)
+
+    def record_latency(self, name, seconds):
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=self._samples)).append(seconds)
+
+    def latency_percentile(self, name, percentile):
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+    def hedge_delay(self, name):
+        """Seconds to wait for ``name`` before starting the next candidate"""
+        percentile = getattr(settings, 'LLM_HEDGE_PERCENTILE', 0.9)
+        delay = self.latency_percentile(name, percentile)
+        if delay is None:
+            delay = getattr(settings, 'LLM_HEDGE_DELAY', 2.0)
+        return max(0.2, delay)
+
+    @property
+    def call_timeout(self):
+        return getattr(settings, 'LLM_BREAKER_SLOW_CALL', 6)
+
+    @property
+    def saturated(self):
+        with self._lock:
+            return self._in_flight >= self.max_workers
+
+    def _run(self, candidate, timeout):
+        started = time.monotonic()
+        error = None
+        try:
+            result = candidate.call(timeout)
+        except Exception as e:
+            print(f"Provider {candidate.name} failed: {str(e)[:100]}")
+            result, error = None, e
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        elapsed = time.monotonic() - started
+        if result:
+            self.record_latency(candidate.name, elapsed)
+        if self.health:
+            self.health.record(candidate.name, bool(result), elapsed, error)
+        return result
+
+    def race(self, candidates, deadline=None):
+        """Return (text, candidate name) from the first good answer, or (None, None)"""
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        queue = self.health.route(candidates) if self.health else list(candidates)
+        pending = {}
+        hedge_at = None
+
+        def launch():
+            candidate = queue.pop(0)
+            with self._lock:
+                self._in_flight += 1
+            timeout = max(0.1, min(deadline_at - time.monotonic(), self.call_timeout))
+            future = self.executor.submit(self._run, candidate, timeout)
+            pending[future] = candidate
+            print(f"Racing provider {candidate.name}")
+            return time.monotonic() + self.hedge_delay(candidate.name)
+
+        while queue or pending:
+            now = time.monotonic()
+            if now >= deadline_at:
+                break
+            if not pending:
+                hedge_at = launch()
+                continue
+
+            timeout = deadline_at - now
+            if queue:
+                timeout = max(0, min(timeout, hedge_at - now))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                candidate = pending.pop(future)
+                result = future.result()
+                if result:
+                    for other in pending:
+                        other.cancel()
+                    return result, candidate.name
+            if queue and (done or time.monotonic() >= hedge_at):
+                if done or not self.saturated:
+                    hedge_at = launch()
+                else:
+                    # Every thread is busy: wait for this race's calls instead of queueing more
+                    hedge_at = deadline_at
+
+        for future in pending:
+            future.cancel()
+        print("No provider answered before the deadline")
+        return None, None
+
+    async def _run_async(self, candidate, timeout):
+        started = time.monotonic()
+        error = None
+        try:
+            result = await asyncio.wait_for(candidate.acall(timeout), timeout)
+        except asyncio.CancelledError:
+            # Lost the race; not a failure of the provider
+            raise
+        except Exception as e:
+            print(f"Provider {candidate.name} failed: {str(e)[:100] or type(e).__name__}")
+            result, error = None, e
+        elapsed = time.monotonic() - started
+        if result:
+            self.record_latency(candidate.name, elapsed)
+        if self.health:
+            await sync_to_async(self.health.record, thread_sensitive=False)(
+                candidate.name, bool(result), elapsed, error
+            )
+        return result
+
+    async def race_async(self, candidates, deadline=None):
+        """Async race(): same hedging and deadline, and losing requests are really cancelled"""
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline or self.deadline)
+        candidates = [candidate for candidate in candidates if candidate.acall]
+        if self.health:
+            candidates = await sync_to_async(self.health.route, thread_sensitive=False)(candidates)
+        queue = list(candidates)
+        pending = {}
+        hedge_at = None
+
+        def launch():
+            candidate = queue.pop(0)
+            task = asyncio.ensure_future(self._run_async(candidate, max(0.1, deadline_at - loop.time())))
+            pending[task] = candidate
+            print(f"Racing provider {candidate.name}")
+            return loop.time() + self.hedge_delay(candidate.name)
+
+        try:
+            while queue or pending:
+                now = loop.time()
+                if now >= deadline_at:
+                    break
+                if not pending:
+                    hedge_at = launch()
+                    continue
+
+                timeout = deadline_at - now
+                if queue:
+                    timeout = max(0, min(timeout, hedge_at - now))
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    candidate = pending.pop(task)
+                    result = task.result()
+                    if result:
+                        return result, candidate.name
+                if queue and (done or loop.time() >= hedge_at):
+                    hedge_at = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        print("No provider answered before the deadline")
+        return None, None
+
+    def stream(self, candidates, first_token_timeout=None):
+        """Yield (candidate name, text delta) from the first streaming candidate that produces any.
+
+        Candidates are tried in routed order until one sends a first token
+        within ``first_token_timeout``; a failure after that ends the stream
+        rather than restarting the answer elsewhere.
+        """
+        timeout = first_token_timeout or self.deadline
+        candidates = [candidate for candidate in candidates if candidate.stream]
+        if self.health:
+            candidates = self.health.route(candidates)
+
+        for candidate in candidates:
+            started = time.monotonic()
+            first_token = None
+            try:
+                print(f"Streaming from provider {candidate.name}")
+                for delta in candidate.stream(timeout):
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.monotonic() - started
+                        self.record_latency(candidate.name, first_token)
+                    yield candidate.name, delta
+            except Exception as e:
+                print(f"Provider {candidate.name} stream failed: {str(e)[:100]}")
+                if self.health:
+                    self.health.record(candidate.name, False, time.monotonic() - started, e)
+                if first_token is not None:
+                    return
+                continue
+
+            if self.health:
+                self.health.record(candidate.name, first_token is not None, first_token or 0)
+            if first_token is not None:
+                return
+
+
+class OllamaProvider:
+    """Local Ollama server (OLLAMA_URL, OLLAMA_MODEL), e.g. on a school LAN box.
+
+    Every request carries OLLAMA_KEEP_ALIVE so the model stays loaded
+    between turns, and warm_up() loads it when a server starts (see
+    shule_voice/wsgi.py and asgi.py). The ``context`` tokens Ollama returns
+    with an answer are kept, keyed on the caller's scope and that exchange;
+    when the next turn in the same scope follows that exchange, only the new
+    message is sent along with the stored context, so the earlier prompt is
+    not encoded again. Without a scope nothing is kept.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return getattr(settings, 'OLLAMA_URL', 'http://localhost:11434').rstrip('/')
+
+    @property
+    def model(self):
+        return getattr(settings, 'OLLAMA_MODEL', 'llama2')
+
+    @property
+    def keep_alive(self):
+        return getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m')
+
+    @property
+    def max_contexts(self):
+        return getattr(settings, 'OLLAMA_CONTEXT_MAX_ENTRIES', 200)
+
+    @staticmethod
+    def exchange_key(scope, user_message, response_text):
+        return hashlib.sha1(f"{scope}\n{user_message.strip()}\n{response_text.strip()}".encode()).hexdigest()
+
+    def previous_context(self, scope, conversation_context):
+        """Stored context tokens if this scope's last exchange was answered here"""
+        if scope is None:
+            return None
+        exchanges = [exchange for exchange in conversation_context or [] if 'user' in exchange and 'assistant' in exchange]
+        if not exchanges:
+            return None
+        key = self.exchange_key(scope, exchanges[-1]['user'], exchanges[-1]['assistant'])
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is not None:
+                self._contexts.move_to_end(key)
+            return context
+
+    def remember_context(self, scope, user_message, response_text, context):
+        if scope is None or not context or not response_text or self.max_contexts <= 0:
+            return
+        key = self.exchange_key(scope, user_message, response_text)
+        with self._lock:
+            self._contexts[key] = context
+            self._contexts.move_to_end(key)
+            while len(self._contexts) > self.max_contexts:
+                self._contexts.popitem(last=False)
+
+    def payload(self, prompt, context=None, stream=False):
+        data = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if context:
+            data["context"] = context
+        return data
+
+    def generate(self, user_message, prompt, context=None, timeout=10, scope=None):
+        """Whole answer in one response; the returned context is kept for the next turn"""
+        response = self.registry.get_session().post(
+            f"{self.url}/api/generate", json=self.payload(prompt, context), timeout=timeout
+        )
+        response.raise_for_status()
+        result = response.json()
+        text = result.get('response', '').strip()
+        self.remember_context(scope, user_message, text, result.get('context'))
+        return text
+
+    def stream(self, user_message, prompt, context=None, timeout=10, scope=None):
+        """Yield text deltas as Ollama generates them"""
+        parts = []
+        with self.registry.get_session().post(
+            f"{self.url}/api/generate", json=self.payload(prompt, context, stream=True),
+            timeout=timeout, stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise RuntimeError(chunk['error'])
+                delta = chunk.get('response', '')
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                if chunk.get('done'):
+                    self.remember_context(scope, user_message, ''.join(parts), chunk.get('context'))
+                    return
+
+    async def agenerate(self, user_message, prompt, context=None, timeout=10, scope=None):
+        response = await self.registry.get_async_http_client().post(
+            f"{self.url}/api/generate", json=self.payload(prompt, context), timeout=timeout
+        )
+        response.raise_for_status()
+        result = response.json()
+        text = result.get('response', '').strip()
+        self.remember_context(scope, user_message, text, result.get('context'))
+        return text
+
+    def warm_up(self):
+        """Load the model in the background so the first student does not wait for it"""
+        def run():
+            try:
+                # An empty prompt only loads the model
+                response = self.registry.get_session().post(
+                    f"{self.url}/api/generate",
+                    json={"model": self.model, "keep_alive": self.keep_alive},
+                    timeout=getattr(settings, 'OLLAMA_WARMUP_TIMEOUT', 120)
+                )
+                response.raise_for_status()
+                print(f"Ollama model {self.model} loaded")
+            except Exception as e:
+                print(f"Ollama warm-up skipped: {e}")
+
+        threading.Thread(target=run, name='ollama-warmup', daemon=True).start()
+
+
+class RequestCoalescer:
+    """Single-flight for identical LLM requests that are in flight together.
+
+    The first caller for a key (the leader) makes the upstream call. Callers
+    arriving with the same key before it finishes wait on the leader's
+    future instead, each for no longer than its own timeout, and share the
+    result. ``saved`` counts the upstream calls avoided this way.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.saved = 0
+        self.timeouts = 0
+
+    def join(self, key):
+        """(future, True) when the caller leads a new flight, else (in-flight future, False)"""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.saved += 1
+                print(f"Coalesced onto an in-flight request ({self.saved} upstream calls saved)")
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self.leaders += 1
+            return future, True
+
+    def land(self, key, future, result=None, error=None):
+        """Publish the leader's result (or error) to everyone waiting on the flight"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def wait(self, future, timeout):
+        """The leader's result, or None if it failed or the caller's timeout passed first"""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            return None
+        except Exception:
+            return None
+
+    async def wait_async(self, future, timeout):
+        try:
+            # Shielded so a follower giving up does not cancel the flight for the others
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            return None
+        except Exception:
+            return None
+
+    def do(self, key, func, timeout):
+        """(result, led) running func() as the leader, or waiting for the flight already running"""
+        future, leader = self.join(key)
+        if not leader:
+            return self.wait(future, timeout), False
+        try:
+            result = func()
+        except Exception as e:
+            self.land(key, future, error=e)
+            raise
+        self.land(key, future, result)
+        return result, True
+
+    async def do_async(self, key, func, timeout):
+        """do() for coroutine functions"""
+        future, leader = self.join(key)
+        if not leader:
+            return await self.wait_async(future, timeout), False
+        try:
+            result = await func()
+        except BaseException as e:
+            self.land(key, future, error=e if isinstance(e, Exception) else None)
+            raise
+        self.land(key, future, result)
+        return result, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'saved': self.saved,
+                'timeouts': self.timeouts,
+            }
+
+
+class SentenceBuffer:
+    """Collects streamed text and releases it one complete sentence at a time"""
+
+    SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+    def __init__(self):
+        self.buffer = ''
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        while True:
+            match = self.SENTENCE_END.search(self.buffer)
+            if not match:
+                return sentences
+            sentence = self.buffer[:match.end()].strip()
+            self.buffer = self.buffer[match.end():]
+            if sentence:
+                sentences.append(sentence)
+
+    def flush(self):
+        sentence, self.buffer = self.buffer.strip(), ''
+        return sentence or None
+
+
+def is_provider_error(error):
+    """True when a failure is the provider's rather than one model's: unreachable or refusing the credentials"""
+    if isinstance(error, (groq.APITimeoutError, requests.Timeout, httpx.TimeoutException)):
+        return False
+    if isinstance(error, (groq.APIConnectionError, groq.AuthenticationError, groq.PermissionDeniedError,
+                          requests.ConnectionError, httpx.TransportError)):
+        return True
+    return getattr(getattr(error, 'response', None), 'status_code', None) in (401, 403)
+
+
+def is_model_unavailable_error(error):
+    """True when Groq says the model does not exist or has been retired"""
+    if isinstance(error, groq.NotFoundError):
+        return True
+    if isinstance(error, groq.BadRequestError):
+        message = str(error).lower()
+        return 'decommissioned' in message or 'model_not_found' in message or 'does not exist' in message
+    return False
+
+
+# Singleton instances
+llm_clients = LLMClientRegistry()
+model_catalog = ModelCatalog(llm_clients)
+provider_health = ProviderHealth()
+provider_racer = ProviderRacer(health=provider_health)
+request_coalescer = RequestCoalescer()
+ollama = OllamaProvider(llm_clients)
@@ -0,0 +1,32 @@
+# management/commands/anchor_pending_records.py
+from django.core.management.base import BaseCommand
+from base.models import StudentAchievement, StudentProgress, VoiceInteraction
+
+class Command(BaseCommand):
+    help = 'Anchor records that were saved without blockchain anchoring (e.g. bulk progress uploads)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of records to anchor per type'
+        )
+    
+    def handle(self, *args, **options):
+        limit = options['limit']
+        
+        anchored = StudentProgress.anchor_pending(limit=limit)
+        self.stdout.write(
+            self.style.SUCCESS(f'Anchored {anchored} progress records')
+        )
+        
+        anchored = StudentAchievement.anchor_pending(limit=limit)
+        self.stdout.write(
+            self.style.SUCCESS(f'Anchored {anchored} achievements')
+        )
+        
+        anchored = VoiceInteraction.anchor_pending(limit=limit)
+        self.stdout.write(
+            self.style.SUCCESS(f'Anchored {anchored} voice interactions')
+        )
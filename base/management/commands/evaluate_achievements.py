@@ -0,0 +1,35 @@
+# management/commands/evaluate_achievements.py
+import time
+from django.core.management.base import BaseCommand
+from base.achievements import evaluate_achievements
+
+class Command(BaseCommand):
+    help = 'Evaluate rule-based achievements for all active students (run nightly)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--student',
+            type=int,
+            action='append',
+            dest='student_ids',
+            help='Only evaluate this student id (can be repeated)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of students evaluated per batch'
+        )
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = evaluate_achievements(
+            student_ids=options['student_ids'],
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Awarded {created} achievements in {time.monotonic() - started:.2f}s '
+                f'(run anchor_pending_records to anchor them)'
+            )
+        )
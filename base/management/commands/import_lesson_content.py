@@ -0,0 +1,68 @@
+# management/commands/import_lesson_content.py
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from base.models import LessonContent
+from base.retrieval import curriculum_index, load_content_file
+
+class Command(BaseCommand):
+    help = 'Import curated questions and answers for the offline voice fallback from JSON or CSV files'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='Content files to import (defaults to the bundled LESSON_CONTENT_FILE)'
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete entries previously imported from the same files that are no longer in them'
+        )
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        paths = options['paths'] or [settings.LESSON_CONTENT_FILE]
+        created = updated = removed = 0
+
+        for path in paths:
+            try:
+                entries = load_content_file(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read {path}: {e}')
+
+            source = os.path.basename(path)
+            existing = {
+                (item.subject_area, item.grade_band, item.question): item
+                for item in LessonContent.objects.filter(source=source)
+            }
+            new_items, changed_items, seen = [], [], set()
+            for entry in entries:
+                key = (entry['subject_area'], entry['grade_band'], entry['question'])
+                seen.add(key)
+                item = existing.get(key)
+                if item is None:
+                    new_items.append(LessonContent(source=source, **entry))
+                elif item.answer != entry['answer'] or item.keywords != entry['keywords']:
+                    item.answer, item.keywords = entry['answer'], entry['keywords']
+                    changed_items.append(item)
+
+            with transaction.atomic():
+                LessonContent.objects.bulk_create(new_items, batch_size=500, ignore_conflicts=True)
+                LessonContent.objects.bulk_update(changed_items, ['answer', 'keywords', 'updated_at'], batch_size=500)
+                if options['replace']:
+                    stale = [item.pk for key, item in existing.items() if key not in seen]
+                    removed += LessonContent.objects.filter(pk__in=stale).delete()[0]
+            created += len(new_items)
+            updated += len(changed_items)
+
+        # Bulk writes send no signals; rebuild the index in every worker
+        curriculum_index.invalidate()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported lesson content in {time.monotonic() - started:.2f}s: '
+                f'{created} created, {updated} updated, {removed} removed'
+            )
+        )
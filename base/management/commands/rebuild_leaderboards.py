@@ -0,0 +1,14 @@
+# management/commands/rebuild_leaderboards.py
+import time
+from django.core.management.base import BaseCommand
+from base.models import LeaderboardEntry
+
+class Command(BaseCommand):
+    help = 'Rebuild the class and grade leaderboards from student progress'
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ranked = LeaderboardEntry.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Ranked {ranked} students in {time.monotonic() - started:.2f}s')
+        )
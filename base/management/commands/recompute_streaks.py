@@ -0,0 +1,18 @@
+# management/commands/recompute_streaks.py
+import time
+from django.core.management.base import BaseCommand
+from base.models import LearningStreak, StudentGoal
+
+class Command(BaseCommand):
+    help = 'Recompute learning streaks for all students from voice and progress activity (run nightly)'
+    
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created, updated = LearningStreak.recompute_all()
+        goals = StudentGoal.reconcile(StudentGoal.objects.filter(completed=False, goal_type='streak'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Recomputed streaks in {time.monotonic() - started:.2f}s: '
+                f'{created} created, {updated} updated, {goals} streak goals reconciled'
+            )
+        )
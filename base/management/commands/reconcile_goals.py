@@ -0,0 +1,23 @@
+# management/commands/reconcile_goals.py
+from django.core.management.base import BaseCommand
+from base.models import StudentGoal
+
+class Command(BaseCommand):
+    help = 'Recompute open student goals from progress, learning sessions and streaks (run nightly)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--student',
+            type=int,
+            action='append',
+            dest='student_ids',
+            help='Only reconcile goals for this student id (can be repeated)'
+        )
+    
+    def handle(self, *args, **options):
+        goals = StudentGoal.objects.filter(completed=False)
+        if options['student_ids']:
+            goals = goals.filter(student_id__in=options['student_ids'])
+        
+        reconciled = StudentGoal.reconcile(goals)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {reconciled} goals'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+GRADE_LEVELS = [
+    ('K', 'Kindergarten'), ('1', 'Grade 1'), ('2', 'Grade 2'), ('3', 'Grade 3'),
+    ('4', 'Grade 4'), ('5', 'Grade 5'), ('6', 'Grade 6'), ('7', 'Grade 7'),
+    ('8', 'Grade 8'), ('9', 'Grade 9'), ('10', 'Grade 10'), ('11', 'Grade 11'),
+    ('12', 'Grade 12'),
+]
+
+
+def copy_target_grade_levels(apps, schema_editor):
+    """Split the comma-separated target_grade_levels into AssignmentTargetGrade rows"""
+    Assignment = apps.get_model('base', 'Assignment')
+    AssignmentTargetGrade = apps.get_model('base', 'AssignmentTargetGrade')
+    lookup = {}
+    for code, name in GRADE_LEVELS:
+        lookup[code.lower()] = code
+        lookup[name.lower()] = code
+
+    rows = []
+    for assignment in Assignment.objects.exclude(target_grade_levels='').only('id', 'target_grade_levels'):
+        codes = {lookup.get(value.strip().lower()) for value in assignment.target_grade_levels.split(',')}
+        rows.extend(
+            AssignmentTargetGrade(assignment_id=assignment.id, grade_level=code)
+            for code in codes if code
+        )
+    AssignmentTargetGrade.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0007_student_blockchain_id_student_blockchain_verified_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentTargetGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade_level', models.CharField(choices=[('K', 'Kindergarten'), ('1', 'Grade 1'), ('2', 'Grade 2'), ('3', 'Grade 3'), ('4', 'Grade 4'), ('5', 'Grade 5'), ('6', 'Grade 6'), ('7', 'Grade 7'), ('8', 'Grade 8'), ('9', 'Grade 9'), ('10', 'Grade 10'), ('11', 'Grade 11'), ('12', 'Grade 12')], max_length=2)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='target_grades', to='base.assignment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['grade_level', 'assignment'], name='base_assign_grade_l_0cdde5_idx')],
+                'unique_together': {('assignment', 'grade_level')},
+            },
+        ),
+        migrations.RunPython(copy_target_grade_levels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_assignmenttargetgrade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['student', 'last_updated'], name='base_studen_student_e7fb30_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_studentprogress_student_last_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievement',
+            name='rule_metric',
+            field=models.CharField(blank=True, choices=[('progress', 'Average Progress (%)'), ('streak', 'Longest Learning Streak (days)'), ('voice_count', 'Voice Interactions'), ('completed_assignments', 'Completed Assignments')], max_length=30),
+        ),
+        migrations.AddField(
+            model_name='achievement',
+            name='rule_threshold',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentachievement',
+            name='data_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_achievement_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentgoal',
+            name='subject',
+            field=models.ForeignKey(blank=True, help_text='Subject whose completed work counts towards a subject goal', null=True, on_delete=django.db.models.deletion.CASCADE, to='base.subject'),
+        ),
+        migrations.AddIndex(
+            model_name='studentgoal',
+            index=models.Index(fields=['student', 'completed', 'goal_type'], name='base_studen_student_a51847_idx'),
+        ),
+    ]
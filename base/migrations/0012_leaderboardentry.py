@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Max, OuterRef, Subquery
+from decimal import Decimal
+
+
+def build_leaderboards(apps, schema_editor):
+    """Rank every active student by average progress within their teacher and grade"""
+    Student = apps.get_model('base', 'Student')
+    StudentProgress = apps.get_model('base', 'StudentProgress')
+    LeaderboardEntry = apps.get_model('base', 'LeaderboardEntry')
+
+    latest_subject = StudentProgress.objects.filter(
+        student=OuterRef('pk')
+    ).order_by('-last_updated').values('subject')[:1]
+    entries = [
+        LeaderboardEntry(
+            student_id=row['id'],
+            teacher_id=row['created_by'],
+            grade_level=row['grade_level'],
+            avg_progress=Decimal(row['avg'] or 0).quantize(Decimal('0.01')),
+            current_subject_id=row['latest_subject'],
+            last_activity=row['last'],
+        )
+        for row in Student.objects.filter(is_active=True).annotate(
+            avg=Avg('studentprogress__progress_percentage'),
+            last=Max('studentprogress__last_updated'),
+            latest_subject=Subquery(latest_subject),
+        ).values('id', 'created_by', 'grade_level', 'avg', 'last', 'latest_subject')
+    ]
+
+    for rank_field, key in [('teacher_rank', lambda e: e.teacher_id),
+                            ('grade_rank', lambda e: (e.teacher_id, e.grade_level))]:
+        boards = {}
+        for entry in entries:
+            boards.setdefault(key(entry), []).append(entry)
+        for board in boards.values():
+            board.sort(key=lambda e: e.avg_progress, reverse=True)
+            for position, entry in enumerate(board):
+                if position and entry.avg_progress == board[position - 1].avg_progress:
+                    setattr(entry, rank_field, getattr(board[position - 1], rank_field))
+                else:
+                    setattr(entry, rank_field, position + 1)
+
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_studentgoal_subject'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade_level', models.CharField(choices=[('K', 'Kindergarten'), ('1', 'Grade 1'), ('2', 'Grade 2'), ('3', 'Grade 3'), ('4', 'Grade 4'), ('5', 'Grade 5'), ('6', 'Grade 6'), ('7', 'Grade 7'), ('8', 'Grade 8'), ('9', 'Grade 9'), ('10', 'Grade 10'), ('11', 'Grade 11'), ('12', 'Grade 12')], max_length=2)),
+                ('avg_progress', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('teacher_rank', models.PositiveIntegerField(default=1)),
+                ('grade_rank', models.PositiveIntegerField(default=1)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('current_subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='base.subject')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='base.student')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['teacher', 'teacher_rank'], name='base_leader_teacher_f5342d_idx'), models.Index(fields=['teacher', 'grade_level', 'grade_rank'], name='base_leader_teacher_fd0da4_idx'), models.Index(fields=['teacher', 'avg_progress'], name='base_leader_teacher_67c945_idx'), models.Index(fields=['teacher', 'grade_level', 'avg_progress'], name='base_leader_teacher_63508b_idx')],
+            },
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
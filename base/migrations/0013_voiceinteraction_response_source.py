@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voiceinteraction',
+            name='response_source',
+            field=models.CharField(blank=True, help_text='Where the reply came from, e.g. groq:<model>, cache or fallback', max_length=60),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_voiceinteraction_response_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_area', models.CharField(choices=[('english', 'English'), ('math', 'Mathematics'), ('science', 'Science'), ('general', 'General')], default='general', max_length=20)),
+                ('grade_band', models.CharField(choices=[('k-2', 'Kindergarten to Grade 2'), ('3-5', 'Grades 3 to 5'), ('6-8', 'Grades 6 to 8'), ('9-12', 'Grades 9 to 12'), ('any', 'Any grade')], default='any', max_length=5)),
+                ('question', models.CharField(max_length=300)),
+                ('answer', models.TextField()),
+                ('keywords', models.CharField(blank=True, help_text='Extra search words, space separated', max_length=300)),
+                ('source', models.CharField(blank=True, help_text='Content file the entry was imported from', max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['subject_area', 'grade_band', 'question'],
+                'constraints': [models.UniqueConstraint(fields=('subject_area', 'grade_band', 'question'), name='unique_lesson_question')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:29
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def snapshot_time_baselines(apps, schema_editor):
+    """Keep existing time goals at their current value: baseline = minutes so far - current value"""
+    StudentGoal = apps.get_model('base', 'StudentGoal')
+    StudentProgress = apps.get_model('base', 'StudentProgress')
+    LearningSession = apps.get_model('base', 'LearningSession')
+
+    goals = list(StudentGoal.objects.filter(goal_type='time'))
+    student_ids = {goal.student_id for goal in goals}
+    minutes = {}
+    for model, field in ((StudentProgress, 'time_spent'), (LearningSession, 'duration_minutes')):
+        totals = model.objects.filter(student_id__in=student_ids).values('student').annotate(total=Sum(field))
+        for row in totals:
+            minutes[row['student']] = minutes.get(row['student'], 0) + (row['total'] or 0)
+
+    for goal in goals:
+        goal.baseline_minutes = max(0, minutes.get(goal.student_id, 0) - int(goal.current_value))
+    StudentGoal.objects.bulk_update(goals, ['baseline_minutes'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0014_lessoncontent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentgoal',
+            name='baseline_minutes',
+            field=models.IntegerField(default=0, help_text='Progress and session minutes the student already had when a time goal was set'),
+        ),
+        migrations.RunPython(snapshot_time_baselines, migrations.RunPython.noop),
+    ]
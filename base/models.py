@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache, caches
 from django.utils import timezone
 import datetime
 from django.urls import reverse
@@ -8,6 +10,8 @@ from django.db import models
 from django.utils import timezone
 import hashlib
 import json
+import threading
+from django.db.models.functions import Coalesce, Greatest, Rank
 from .blockchain import blockchain_service
 
 class BlockchainRecord(models.Model):
@@ -109,6 +113,29 @@ class Student(models.Model):
         # Record on blockchain if significant changes
         if self.should_record_on_blockchain():
             self.record_on_blockchain('profile_update')
+        
+        # Keep the class and grade leaderboards in step with grade/active changes
+        LeaderboardEntry.schedule_refresh([self.pk])
+    
+    # Voice assistant context (progress, streak, prompt), see views.get_student_context_data
+    VOICE_CONTEXT_KEY = 'base:voice_context:{}'
+    
+    @classmethod
+    def voice_context_cache(cls):
+        return caches[getattr(settings, 'VOICE_CONTEXT_CACHE', 'default')]
+    
+    @classmethod
+    def invalidate_voice_context(cls, student_ids):
+        """Drop cached voice contexts after progress, streak or achievement changes"""
+        keys = [cls.VOICE_CONTEXT_KEY.format(student_id) for student_id in set(student_ids) if student_id]
+        if keys:
+            cls.voice_context_cache().delete_many(keys)
+    
+    def delete(self, *args, **kwargs):
+        entry = LeaderboardEntry.objects.filter(student_id=self.pk).first()
+        if entry:
+            entry.withdraw()
+        return super().delete(*args, **kwargs)
     
     def generate_blockchain_id(self):
         """Generate unique blockchain ID"""
@@ -231,6 +258,27 @@ class Student(models.Model):
     def get_absolute_url(self):
         return reverse('student_detail', kwargs={'pk': self.pk})
 
+    @classmethod
+    def normalize_grade_level(cls, value):
+        """Map a grade code or display name ('3', 'Grade 3', 'K') to its code"""
+        value = str(value or '').strip()
+        for code, name in cls.GRADE_LEVELS:
+            if value.lower() in (code.lower(), name.lower()):
+                return code
+        return None
+
+    @classmethod
+    def normalize_grade_levels(cls, values):
+        """Normalize a list or comma-separated string of grades to unique codes"""
+        if isinstance(values, str):
+            values = values.split(',')
+        codes = []
+        for value in values or []:
+            code = cls.normalize_grade_level(value)
+            if code and code not in codes:
+                codes.append(code)
+        return codes
+
     def get_overall_progress(self):
         """Calculate overall progress percentage"""
         progress_records = StudentProgress.objects.filter(student=self)
@@ -265,10 +313,22 @@ class Student(models.Model):
 
 
 class Subject(models.Model):
+    # Cache key of the id -> name/colour table built in views.get_subject_table
+    TABLE_CACHE_KEY = 'base:subject_table'
+
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10, unique=True)
     description = models.TextField(blank=True)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.TABLE_CACHE_KEY)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(self.TABLE_CACHE_KEY)
+        return result
+
     def __str__(self):
         return self.name
 
@@ -307,9 +367,9 @@ class Assignment(models.Model):
     assigned_date = models.DateTimeField(default=timezone.now)
     due_date = models.DateTimeField()
     
-    # Assignment targeting
+    # Assignment targeting (display copy; AssignmentTargetGrade rows are used for filtering)
     target_grade_levels = models.CharField(max_length=100, blank=True, help_text="Comma-separated grade levels")
-    
+
     # Metadata
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
@@ -321,6 +381,80 @@ class Assignment(models.Model):
     def __str__(self):
         return f"{self.title} ({self.subject.name})"
     
+    def get_target_grades(self):
+        """Grade codes this assignment is targeted at"""
+        return list(self.target_grades.values_list('grade_level', flat=True))
+
+    def set_target_grades(self, grades):
+        """Replace the targeted grades with the given codes or display names.
+
+        Raises ValueError, leaving the targets unchanged, when none of the
+        given grades is a known grade level.
+        """
+        codes = Student.normalize_grade_levels(grades)
+        if not codes:
+            raise ValueError('No valid grade levels given')
+        with transaction.atomic():
+            self.target_grades.exclude(grade_level__in=codes).delete()
+            AssignmentTargetGrade.objects.bulk_create(
+                [AssignmentTargetGrade(assignment=self, grade_level=code) for code in codes],
+                ignore_conflicts=True
+            )
+            self.target_grade_levels = ','.join(codes)
+            self.save(update_fields=['target_grade_levels', 'updated_at'])
+        return codes
+
+    def fan_out_to_students(self, batch_size=500):
+        """Create AssignmentStudent rows for every active student in the targeted grades.
+
+        Students that already have a row for this assignment are skipped, so the
+        fan-out can be re-run safely after new students are enrolled.
+        """
+        grades = self.get_target_grades()
+        if not grades:
+            return 0
+
+        # Ids are materialized first: SQLite gives no isolation between a running
+        # cursor and inserts made on the same connection.
+        student_ids = list(Student.objects.filter(
+            created_by=self.created_by,
+            is_active=True,
+            grade_level__in=grades
+        ).exclude(
+            assignmentstudent__assignment=self
+        ).values_list('id', flat=True))
+
+        assigned_date = timezone.now()
+        with transaction.atomic():
+            for start in range(0, len(student_ids), batch_size):
+                AssignmentStudent.objects.bulk_create(
+                    [
+                        AssignmentStudent(assignment=self, student_id=student_id, assigned_date=assigned_date)
+                        for student_id in student_ids[start:start + batch_size]
+                    ],
+                    batch_size=batch_size,
+                    ignore_conflicts=True
+                )
+        return len(student_ids)
+
+    def get_progress_stats(self):
+        """Completion rate, counts and average time from a single aggregate query"""
+        stats = self.assignmentstudent_set.aggregate(
+            total=models.Count('id'),
+            completed=models.Count('id', filter=models.Q(completed=True)),
+            avg_score=models.Avg('score'),
+            avg_time=models.Avg('time_spent', filter=models.Q(time_spent__gt=0))
+        )
+        total = stats['total'] or 0
+        completed = stats['completed'] or 0
+        return {
+            'total_assigned': total,
+            'completed': completed,
+            'completion_rate': round((completed / total) * 100, 1) if total else 0,
+            'avg_score': round(float(stats['avg_score'] or 0), 1),
+            'avg_time_spent': round(stats['avg_time'] or 0, 1),
+        }
+
     def get_completion_rate(self):
         """Calculate completion rate percentage"""
         total_assigned = self.assignmentstudent_set.count()
@@ -385,30 +519,75 @@ class StudentProgress(models.Model):
     )
     progress_hash = models.CharField(max_length=64, blank=True, null=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values so goal deltas can be worked out on save
+        instance._loaded_completed = instance.__dict__.get('completed', False)
+        instance._loaded_time_spent = instance.__dict__.get('time_spent', 0)
+        return instance
+    
+    def goal_deltas(self):
+        """(newly completed, added minutes) since the row was loaded"""
+        newly_completed = int(bool(self.completed) and not getattr(self, '_loaded_completed', False))
+        minutes = max(0, (self.time_spent or 0) - (getattr(self, '_loaded_time_spent', 0) or 0))
+        return newly_completed, minutes
+    
     def save(self, *args, **kwargs):
         # Calculate progress hash before saving
         self.update_progress_hash()
+        newly_completed, minutes = self.goal_deltas()
         
         super().save(*args, **kwargs)
         
+        self._loaded_completed = self.completed
+        self._loaded_time_spent = self.time_spent
+        LeaderboardEntry.schedule_refresh([self.student_id])
+        StudentGoal.apply_progress_event(
+            self.student_id,
+            self.subject_id,
+            completed_assignments=newly_completed if self.assignment_id else 0,
+            completed_in_subject=newly_completed,
+            minutes=minutes
+        )
+        
         # Record significant progress updates on blockchain
-        if self.progress_percentage > 0 and (not self.blockchain_record or self.progress_percentage % 25 == 0):
+        if self.is_anchor_milestone(self.progress_percentage, self.blockchain_record_id):
             self.record_progress_on_blockchain()
     
     def update_progress_hash(self):
         """Calculate hash of progress data for integrity verification"""
+        self.progress_hash = self.calculate_progress_hash(
+            student_blockchain_id=self.student.blockchain_id,
+            subject_name=self.subject.name if self.subject else None,
+            assignment_title=self.assignment.title if self.assignment else None,
+            score=self.score,
+            progress_percentage=self.progress_percentage,
+            completed=self.completed,
+            time_spent=self.time_spent,
+        )
+
+    @staticmethod
+    def calculate_progress_hash(student_blockchain_id, subject_name, assignment_title,
+                                score, progress_percentage, completed, time_spent):
+        """Hash progress values without touching the related objects"""
         progress_data = {
-            'student_id': self.student.blockchain_id,
-            'subject': self.subject.name if self.subject else None,
-            'assignment': self.assignment.title if self.assignment else None,
-            'score': float(self.score) if self.score else None,
-            'progress_percentage': float(self.progress_percentage),
-            'completed': self.completed,
-            'time_spent': self.time_spent,
+            'student_id': student_blockchain_id,
+            'subject': subject_name,
+            'assignment': assignment_title,
+            'score': float(score) if score else None,
+            'progress_percentage': float(progress_percentage),
+            'completed': completed,
+            'time_spent': time_spent,
         }
         progress_json = json.dumps(progress_data, sort_keys=True)
-        self.progress_hash = hashlib.sha256(progress_json.encode()).hexdigest()
-    
+        return hashlib.sha256(progress_json.encode()).hexdigest()
+
+    @classmethod
+    def is_anchor_milestone(cls, progress_percentage, has_record):
+        """Whether a progress value should be (re-)anchored on the blockchain"""
+        return progress_percentage > 0 and (not has_record or progress_percentage % 25 == 0)
+
     def record_progress_on_blockchain(self):
         """Record student progress on blockchain"""
         data_hash = self.progress_hash
@@ -418,35 +597,166 @@ class StudentProgress(models.Model):
             'milestone': f"{self.progress_percentage}% completion",
         }
         
-        # Add to blockchain
-        block_index = blockchain.new_transaction(
-            student_id=self.student.blockchain_id,
-            action_type='progress_update',
-            data_hash=data_hash,
-            metadata=metadata
+        result = blockchain_service.record_student_progress(
+            self.student.blockchain_id,
+            {'data_hash': data_hash, **metadata}
         )
         
-        # Mine the block
-        last_block = blockchain.last_block
-        proof = blockchain.proof_of_work(last_block['proof'])
-        blockchain.new_block(proof)
+        if not result['success']:
+            print(f"Failed to record progress on blockchain: {result.get('error')}")
+            return False
         
-        # Store blockchain record
-        blockchain_record = BlockchainRecord.objects.create(
+        blockchain_record = BlockchainRecord.create_from_blockchain_result(
             student=self.student,
             transaction_type='progress',
-            block_index=block_index,
-            transaction_hash=blockchain.hash(blockchain.last_block),
+            result=result,
             data_hash=data_hash,
             metadata=metadata
         )
         
+        # Update directly so save() does not re-trigger anchoring
         self.blockchain_record = blockchain_record
-        self.save(update_fields=['blockchain_record'])
+        StudentProgress.objects.filter(pk=self.pk).update(blockchain_record=blockchain_record)
+        return True
+
+    @classmethod
+    def anchor_pending(cls, limit=100):
+        """Anchor progress rows that were written without anchoring (e.g. by bulk_upsert)"""
+        pending = cls.objects.filter(
+            blockchain_record__isnull=True,
+            progress_percentage__gt=0
+        ).select_related('student', 'subject').order_by('last_updated')[:limit]
+        
+        anchored = 0
+        for progress in pending:
+            if progress.record_progress_on_blockchain():
+                anchored += 1
+        return anchored
+
+    @classmethod
+    def bulk_upsert(cls, rows, batch_size=500):
+        """Create or update many progress rows keyed on (student, assignment).
+
+        Rows without an assignment are keyed on (student, subject) instead.
+
+        Each row is a dict with ``student_id`` and optional ``subject_id`` and
+        ``assignment_id`` keys plus any of ``progress_percentage``, ``score``,
+        ``time_spent``, ``completed`` and ``notes``. Missing values keep their
+        current value. Hashes are computed from prefetched names and anchoring is
+        left to anchor_pending(). Returns ``(created, updated)`` counts.
+        """
+        now = timezone.now()
+        assignments = {
+            assignment.id: assignment
+            for assignment in Assignment.objects.filter(
+                id__in={row['assignment_id'] for row in rows if row.get('assignment_id')}
+            ).only('id', 'title', 'subject_id')
+        }
+        
+        # Last row wins when the same key is sent twice
+        keyed_rows = {}
+        for row in rows:
+            assignment = assignments.get(row.get('assignment_id'))
+            subject_id = row.get('subject_id') or (assignment.subject_id if assignment else None)
+            assignment_id = assignment.id if assignment else None
+            keyed_rows[cls.upsert_key(row['student_id'], subject_id, assignment_id)] = (subject_id, row)
+        
+        student_ids = {key[0] for key in keyed_rows}
+        blockchain_ids = dict(Student.objects.filter(id__in=student_ids).values_list('id', 'blockchain_id'))
+        subject_names = dict(Subject.objects.filter(
+            id__in={subject_id for subject_id, _ in keyed_rows.values() if subject_id}
+        ).values_list('id', 'name'))
+        
+        update_fields = [
+            'progress_percentage', 'score', 'time_spent', 'completed', 'completion_date',
+            'notes', 'progress_hash', 'blockchain_record', 'last_updated',
+        ]
+        
+        with transaction.atomic():
+            # Newest row wins if older data already holds duplicates for a key
+            existing = {}
+            for progress in cls.objects.filter(student_id__in=student_ids).order_by('last_updated', 'id'):
+                existing[cls.upsert_key(progress.student_id, progress.subject_id, progress.assignment_id)] = progress
+            
+            to_update, to_insert, to_upsert = [], [], []
+            goal_events = {}
+            for key, (subject_id, row) in keyed_rows.items():
+                student_id, _, assignment_id = key
+                progress = existing.get(key)
+                if progress is not None:
+                    # An assignment row may move to the subject it was sent with
+                    if subject_id:
+                        progress.subject_id = subject_id
+                    to_update.append(progress)
+                else:
+                    progress = cls(student_id=student_id, subject_id=subject_id, assignment_id=assignment_id)
+                    (to_upsert if assignment_id else to_insert).append(progress)
+                
+                for field in ('progress_percentage', 'score', 'time_spent', 'notes'):
+                    if row.get(field) is not None:
+                        setattr(progress, field, row[field])
+                if row.get('completed') is not None:
+                    if row['completed'] and not progress.completed:
+                        progress.completion_date = now
+                    progress.completed = row['completed']
+                progress.last_updated = now
+                
+                newly_completed, minutes = progress.goal_deltas()
+                if newly_completed or minutes:
+                    event = goal_events.setdefault(student_id, {'assignments': 0, 'minutes': 0, 'subjects': {}})
+                    event['minutes'] += minutes
+                    if newly_completed and assignment_id:
+                        event['assignments'] += 1
+                    if newly_completed and subject_id:
+                        event['subjects'][subject_id] = event['subjects'].get(subject_id, 0) + 1
+                
+                assignment = assignments.get(assignment_id)
+                progress.progress_hash = cls.calculate_progress_hash(
+                    student_blockchain_id=blockchain_ids.get(student_id),
+                    subject_name=subject_names.get(subject_id),
+                    assignment_title=assignment.title if assignment else None,
+                    score=progress.score,
+                    progress_percentage=progress.progress_percentage,
+                    completed=progress.completed,
+                    time_spent=progress.time_spent,
+                )
+                # Clearing the record queues a milestone for anchor_pending()
+                if progress.blockchain_record_id and cls.is_anchor_milestone(progress.progress_percentage, True):
+                    progress.blockchain_record = None
+            
+            cls.objects.bulk_update(to_update, ['subject'] + update_fields, batch_size=batch_size)
+            cls.objects.bulk_create(to_insert, batch_size=batch_size)
+            if connection.features.supports_update_conflicts_with_target:
+                # INSERT ... ON CONFLICT covers rows created concurrently since the lookup
+                cls.objects.bulk_create(
+                    to_upsert,
+                    batch_size=batch_size,
+                    update_conflicts=True,
+                    unique_fields=['student', 'assignment'],
+                    update_fields=['subject'] + update_fields
+                )
+            else:
+                cls.objects.bulk_create(to_upsert, batch_size=batch_size)
+            
+            StudentGoal.apply_progress_events(goal_events)
+            LeaderboardEntry.refresh_students(student_ids)
+            Student.invalidate_voice_context(student_ids)
+        
+        return len(to_insert) + len(to_upsert), len(to_update)
+
+    @staticmethod
+    def upsert_key(student_id, subject_id, assignment_id):
+        """Identity of a progress row: (student, assignment) is unique, other rows are per subject"""
+        if assignment_id:
+            return (student_id, None, assignment_id)
+        return (student_id, subject_id, None)
 
     class Meta:
         unique_together = ['student', 'assignment']
         verbose_name_plural = "Student Progress"
+        indexes = [
+            models.Index(fields=['student', 'last_updated']),
+        ]
 
     def __str__(self):
         assignment_name = self.assignment.title if self.assignment else 'No Assignment'
@@ -475,10 +785,70 @@ class AssignmentStudent(models.Model):
     
     class Meta:
         unique_together = ['assignment', 'student']
-    
+
     def __str__(self):
         return f"{self.student.name} - {self.assignment.title}"
 
+    @classmethod
+    def bulk_apply_progress(cls, assignment, updates, batch_size=500):
+        """Upsert progress for many students of one assignment in a single transaction.
+
+        ``updates`` maps student id to a dict with optional ``completed``,
+        ``score`` and ``time_spent`` keys, using the same rules as
+        update_assignment_progress. Returns ``(created, updated)`` counts.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                row.student_id: row
+                for row in cls.objects.select_for_update().filter(
+                    assignment=assignment,
+                    student_id__in=list(updates)
+                )
+            }
+
+            to_create = []
+            to_update = []
+            for student_id, values in updates.items():
+                row = existing.get(student_id)
+                if row is None:
+                    row = cls(assignment=assignment, student_id=student_id)
+                    to_create.append(row)
+                else:
+                    to_update.append(row)
+
+                row.completed = values.get('completed', False)
+                if row.completed:
+                    row.completion_date = now
+                if values.get('score') is not None:
+                    row.score = values['score']
+                if values.get('time_spent') is not None:
+                    row.time_spent = values['time_spent']
+                row.last_updated = now
+
+            cls.objects.bulk_create(to_create, batch_size=batch_size)
+            cls.objects.bulk_update(
+                to_update,
+                ['completed', 'completion_date', 'score', 'time_spent', 'last_updated'],
+                batch_size=batch_size
+            )
+        return len(to_create), len(to_update)
+
+
+class AssignmentTargetGrade(models.Model):
+    """Grade levels an assignment is targeted at (one row per grade)"""
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='target_grades')
+    grade_level = models.CharField(max_length=2, choices=Student.GRADE_LEVELS)
+
+    class Meta:
+        unique_together = ['assignment', 'grade_level']
+        indexes = [
+            models.Index(fields=['grade_level', 'assignment']),
+        ]
+
+    def __str__(self):
+        return f"{self.assignment.title} - {self.get_grade_level_display()}"
+
 
 class ActivityLog(models.Model):
     ACTIVITY_TYPES = [
@@ -521,6 +891,11 @@ class VoiceInteraction(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     success = models.BooleanField(default=True)
     confidence_score = models.DecimalField(max_digits=4, decimal_places=2, default=0)
+    response_source = models.CharField(
+        max_length=60,
+        blank=True,
+        help_text="Where the reply came from, e.g. groq:<model>, cache or fallback"
+    )
     blockchain_record = models.ForeignKey(
             BlockchainRecord, 
             on_delete=models.SET_NULL, 
@@ -528,12 +903,8 @@ class VoiceInteraction(models.Model):
             blank=True
         )
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        # Record significant voice interactions on blockchain
-        if not self.blockchain_record and self.confidence_score > 0.8:
-            self.record_voice_interaction_on_blockchain()
+    # Interactions at or above this confidence are anchored on the blockchain
+    ANCHOR_CONFIDENCE = Decimal('0.8')
     
     def record_voice_interaction_on_blockchain(self):
         """Record significant voice interaction on blockchain"""
@@ -552,31 +923,43 @@ class VoiceInteraction(models.Model):
             'success': self.success,
         }
         
-        # Add to blockchain
-        block_index = blockchain.new_transaction(
-            student_id=self.student.blockchain_id,
-            action_type='voice',
-            data_hash=data_hash,
-            metadata=metadata
+        result = blockchain_service.record_student_progress(
+            self.student.blockchain_id,
+            {'data_hash': data_hash, 'action': 'voice', **metadata}
         )
         
-        # Mine the block
-        last_block = blockchain.last_block
-        proof = blockchain.proof_of_work(last_block['proof'])
-        blockchain.new_block(proof)
+        if not result['success']:
+            print(f"Failed to record voice interaction on blockchain: {result.get('error')}")
+            return False
         
-        # Store blockchain record
-        blockchain_record = BlockchainRecord.objects.create(
+        blockchain_record = BlockchainRecord.create_from_blockchain_result(
             student=self.student,
             transaction_type='voice',
-            block_index=block_index,
-            transaction_hash=blockchain.hash(blockchain.last_block),
+            result=result,
             data_hash=data_hash,
             metadata=metadata
         )
         
         self.blockchain_record = blockchain_record
-        self.save(update_fields=['blockchain_record'])
+        VoiceInteraction.objects.filter(pk=self.pk).update(blockchain_record=blockchain_record)
+        return True
+    
+    @classmethod
+    def anchor_pending(cls, limit=100, ids=None):
+        """Anchor significant interactions that have not been recorded on the blockchain yet"""
+        pending = cls.objects.filter(
+            blockchain_record__isnull=True,
+            confidence_score__gt=cls.ANCHOR_CONFIDENCE
+        )
+        if ids is not None:
+            pending = pending.filter(id__in=ids)
+        
+        anchored = 0
+        for interaction in pending.select_related('student').order_by('timestamp')[:limit]:
+            if interaction.record_voice_interaction_on_blockchain():
+                anchored += 1
+        return anchored
+    
     def __str__(self):
         return f"{self.student.name} - {self.timestamp}"
 
@@ -602,6 +985,21 @@ class LearningSession(models.Model):
     topics_covered = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_duration = instance.__dict__.get('duration_minutes', 0)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        minutes = (self.duration_minutes or 0) - (getattr(self, '_loaded_duration', 0) or 0)
+        super().save(*args, **kwargs)
+        self._loaded_duration = self.duration_minutes
+        
+        # Session time counts towards time goals
+        if minutes > 0:
+            StudentGoal.apply_progress_event(self.student_id, minutes=minutes)
+    
     @property
     def duration_hours(self):
         return round(self.duration_minutes / 60, 2)
@@ -653,6 +1051,44 @@ class VoiceResponse(models.Model):
     def __str__(self):
         return f"{self.student.name} - {self.timestamp}"
 
+
+class LessonContent(models.Model):
+    """Curated questions and explanations the voice assistant can answer offline.
+
+    Imported from content files with the import_lesson_content command and
+    indexed, together with Topic descriptions, by base/retrieval.py.
+    """
+    SUBJECT_AREAS = [
+        ('english', 'English'),
+        ('math', 'Mathematics'),
+        ('science', 'Science'),
+        ('general', 'General'),
+    ]
+    GRADE_BANDS = [
+        ('k-2', 'Kindergarten to Grade 2'),
+        ('3-5', 'Grades 3 to 5'),
+        ('6-8', 'Grades 6 to 8'),
+        ('9-12', 'Grades 9 to 12'),
+        ('any', 'Any grade'),
+    ]
+
+    subject_area = models.CharField(max_length=20, choices=SUBJECT_AREAS, default='general')
+    grade_band = models.CharField(max_length=5, choices=GRADE_BANDS, default='any')
+    question = models.CharField(max_length=300)
+    answer = models.TextField()
+    keywords = models.CharField(max_length=300, blank=True, help_text="Extra search words, space separated")
+    source = models.CharField(max_length=100, blank=True, help_text="Content file the entry was imported from")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['subject_area', 'grade_band', 'question']
+        constraints = [
+            models.UniqueConstraint(fields=['subject_area', 'grade_band', 'question'], name='unique_lesson_question'),
+        ]
+
+    def __str__(self):
+        return f"{self.question} ({self.get_subject_area_display()}, {self.grade_band})"
+
 # Add to models.py
 from django.db import models
 from django.utils import timezone
@@ -668,21 +1104,199 @@ class StudentGoal(models.Model):
         ('streak', 'Learning Streak'),
     ]
     
+    # Goal types kept up to date automatically (skill goals are set by hand)
+    TRACKED_GOAL_TYPES = ['assignment', 'subject', 'time', 'streak']
+    
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     goal_type = models.CharField(max_length=20, choices=GOAL_TYPES)
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Subject whose completed work counts towards a subject goal"
+    )
     target_value = models.DecimalField(max_digits=10, decimal_places=2)
     current_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     deadline = models.DateField(null=True, blank=True)
     completed = models.BooleanField(default=False)
     completed_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    baseline_minutes = models.IntegerField(
+        default=0,
+        help_text="Progress and session minutes the student already had when a time goal was set"
+    )
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'completed', 'goal_type']),
+        ]
+    
+    @staticmethod
+    def minutes_total(student):
+        """Expression for a student's progress time_spent plus session minutes"""
+        def total(model, field):
+            return Coalesce(models.Subquery(
+                model.objects.filter(student=student).order_by().values('student').annotate(
+                    total=models.Sum(field)
+                ).values('total')[:1]
+            ), 0)
+        return total(StudentProgress, 'time_spent') + total(LearningSession, 'duration_minutes')
+    
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        # Time goals count minutes added after they were set
+        if is_new and self.goal_type == 'time' and not self.baseline_minutes:
+            self.baseline_minutes = Student.objects.filter(pk=self.student_id).annotate(
+                minutes=self.minutes_total(models.OuterRef('pk'))
+            ).values_list('minutes', flat=True).first() or 0
+        super().save(*args, **kwargs)
+        
+        # Streak goals start from the current streak; the rest from zero
+        if is_new and self.goal_type in self.TRACKED_GOAL_TYPES and not self.current_value:
+            StudentGoal.reconcile(StudentGoal.objects.filter(pk=self.pk))
+            self.refresh_from_db(fields=['current_value', 'completed', 'completed_date'])
     
     def progress_percentage(self):
         if self.target_value == 0:
             return 0
         return min(100, float(self.current_value) / float(self.target_value) * 100)
     
+    @classmethod
+    def _completion_updates(cls, new_value):
+        """completed/completed_date expressions evaluated in the same UPDATE"""
+        reached = models.Q(target_value__lte=new_value)
+        return {
+            'completed': models.Case(
+                models.When(reached, then=models.Value(True)),
+                default=models.F('completed')
+            ),
+            'completed_date': models.Case(
+                models.When(reached, then=models.Value(timezone.now())),
+                default=models.F('completed_date')
+            ),
+        }
+    
+    @classmethod
+    def apply_progress_event(cls, student_id, subject_id=None, completed_assignments=0,
+                             completed_in_subject=0, minutes=0):
+        """Add progress deltas to the student's open goals with a single UPDATE"""
+        cases = []
+        if completed_assignments:
+            cases.append(models.When(goal_type='assignment', then=models.Value(Decimal(completed_assignments))))
+        if completed_in_subject and subject_id:
+            cases.append(models.When(goal_type='subject', subject_id=subject_id,
+                                     then=models.Value(Decimal(completed_in_subject))))
+        if minutes > 0:
+            cases.append(models.When(goal_type='time', then=models.Value(Decimal(minutes))))
+        if not cases:
+            return 0
+        
+        delta = models.Case(
+            *cases,
+            default=models.Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        )
+        new_value = models.F('current_value') + delta
+        return cls.objects.filter(
+            student_id=student_id,
+            completed=False,
+            goal_type__in=['assignment', 'subject', 'time']
+        ).update(current_value=new_value, **cls._completion_updates(new_value))
+    
+    @classmethod
+    def apply_progress_events(cls, events):
+        """Apply per-student deltas from a bulk write; students without open goals cost nothing.
+
+        ``events`` maps student id to a dict with ``assignments`` and
+        ``minutes`` totals and a ``subjects`` dict of subject id -> count.
+        """
+        if not events:
+            return 0
+        with_goals = set(cls.objects.filter(
+            student_id__in=list(events),
+            completed=False,
+            goal_type__in=['assignment', 'subject', 'time']
+        ).values_list('student_id', flat=True))
+        
+        updated = 0
+        for student_id in with_goals:
+            event = events[student_id]
+            updated += cls.apply_progress_event(
+                student_id,
+                completed_assignments=event.get('assignments', 0),
+                minutes=event.get('minutes', 0)
+            )
+            for subject_id, count in event.get('subjects', {}).items():
+                updated += cls.apply_progress_event(student_id, subject_id, completed_in_subject=count)
+        return updated
+    
+    @classmethod
+    def apply_streak_event(cls, student_id, current_streak):
+        """Set open streak goals to the student's current streak"""
+        new_value = models.Value(Decimal(current_streak), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+        return cls.objects.filter(
+            student_id=student_id,
+            completed=False,
+            goal_type='streak'
+        ).update(current_value=new_value, **cls._completion_updates(new_value))
+    
+    @classmethod
+    def reconcile(cls, goals=None, batch_size=500):
+        """Recompute tracked goals from the source tables in one query.
+
+        Only progress since each goal was created counts: assignment goals
+        count assignment progress completed since then, subject goals count
+        progress completed in their subject, and time goals count the
+        student's progress and session minutes above the ``baseline_minutes``
+        snapshot taken when the goal was set. Streak goals use the current
+        streak.
+        """
+        if goals is None:
+            goals = cls.objects.filter(completed=False)
+        
+        since = models.OuterRef('created_at')
+        completed_since = StudentProgress.objects.filter(
+            models.Q(completion_date__gte=since) | models.Q(completion_date__isnull=True, last_updated__gte=since),
+            student=models.OuterRef('student'),
+            completed=True
+        )
+        
+        def total(queryset, aggregate):
+            return Coalesce(models.Subquery(
+                queryset.order_by().values('student').annotate(total=aggregate).values('total')[:1]
+            ), 0)
+        
+        goals = list(goals.filter(goal_type__in=cls.TRACKED_GOAL_TYPES).annotate(
+            assignments_since=total(completed_since.filter(assignment__isnull=False), models.Count('id')),
+            subject_since=total(completed_since.filter(subject=models.OuterRef('subject')), models.Count('id')),
+            minutes=cls.minutes_total(models.OuterRef('student')),
+            streak=Coalesce(models.Subquery(
+                LearningStreak.objects.filter(student=models.OuterRef('student')).values('current_streak')[:1]
+            ), 0),
+        ))
+        if not goals:
+            return 0
+        
+        now = timezone.now()
+        for goal in goals:
+            if goal.goal_type == 'assignment':
+                value = goal.assignments_since
+            elif goal.goal_type == 'subject':
+                value = goal.subject_since if goal.subject_id else 0
+            elif goal.goal_type == 'time':
+                value = max(0, goal.minutes - goal.baseline_minutes)
+            else:
+                value = goal.streak
+            goal.current_value = Decimal(value)
+            if not goal.completed and goal.current_value >= goal.target_value:
+                goal.completed = True
+                goal.completed_date = now
+        
+        cls.objects.bulk_update(goals, ['current_value', 'completed', 'completed_date'], batch_size=batch_size)
+        return len(goals)
+    
     def __str__(self):
         return f"{self.student.name} - {self.title}"
 
@@ -694,6 +1308,13 @@ class Achievement(models.Model):
         ('platinum', 'Platinum'),
     ]
     
+    RULE_METRICS = [
+        ('progress', 'Average Progress (%)'),
+        ('streak', 'Longest Learning Streak (days)'),
+        ('voice_count', 'Voice Interactions'),
+        ('completed_assignments', 'Completed Assignments'),
+    ]
+    
     name = models.CharField(max_length=100)
     description = models.TextField()
     icon = models.CharField(max_length=50, default='trophy')
@@ -701,6 +1322,10 @@ class Achievement(models.Model):
     requirement = models.TextField(help_text="What's required to earn this achievement")
     points = models.IntegerField(default=10)
     
+    # Machine-readable rule: awarded when metric >= threshold
+    rule_metric = models.CharField(max_length=30, choices=RULE_METRICS, blank=True)
+    rule_threshold = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
     def __str__(self):
         return f"{self.name} ({self.get_level_display()})"
 
@@ -715,57 +1340,68 @@ class StudentAchievement(models.Model):
         null=True, 
         blank=True
     )
+    data_hash = models.CharField(max_length=64, blank=True)
     
     def save(self, *args, **kwargs):
+        # Anchoring is deferred to anchor_pending(); only the hash is prepared here
+        if not self.data_hash:
+            self.data_hash = self.calculate_achievement_hash(self.achievement, self.earned_date)
         super().save(*args, **kwargs)
-        
-        # Record achievement on blockchain
-        if not self.blockchain_record:
-            self.record_achievement_on_blockchain()
     
-    def record_achievement_on_blockchain(self):
-        """Record student achievement on blockchain"""
+    @staticmethod
+    def calculate_achievement_hash(achievement, earned_date):
+        """Calculate hash of achievement data for integrity verification"""
         achievement_data = {
-            'achievement_name': self.achievement.name,
-            'achievement_level': self.achievement.level,
-            'points': self.achievement.points,
-            'earned_date': self.earned_date.isoformat(),
+            'achievement_name': achievement.name,
+            'achievement_level': achievement.level,
+            'points': achievement.points,
+            'earned_date': earned_date.isoformat(),
         }
-        data_hash = hashlib.sha256(json.dumps(achievement_data, sort_keys=True).encode()).hexdigest()
-        
+        return hashlib.sha256(json.dumps(achievement_data, sort_keys=True).encode()).hexdigest()
+    
+    def record_achievement_on_blockchain(self):
+        """Record student achievement on blockchain"""
+        data_hash = self.data_hash or self.calculate_achievement_hash(self.achievement, self.earned_date)
         metadata = {
             'achievement_id': self.id,
             'achievement_name': self.achievement.name,
             'level': self.achievement.level,
         }
         
-        # Add to blockchain
-        block_index = blockchain.new_transaction(
-            student_id=self.student.blockchain_id,
-            action_type='achievement',
-            data_hash=data_hash,
-            metadata=metadata
+        result = blockchain_service.record_student_progress(
+            self.student.blockchain_id,
+            {'data_hash': data_hash, 'action': 'achievement', **metadata}
         )
         
-        # Mine the block
-        last_block = blockchain.last_block
-        proof = blockchain.proof_of_work(last_block['proof'])
-        blockchain.new_block(proof)
+        if not result['success']:
+            print(f"Failed to record achievement on blockchain: {result.get('error')}")
+            return False
         
-        # Store blockchain record
-        blockchain_record = BlockchainRecord.objects.create(
+        blockchain_record = BlockchainRecord.create_from_blockchain_result(
             student=self.student,
             transaction_type='achievement',
-            block_index=block_index,
-            transaction_hash=blockchain.hash(blockchain.last_block),
+            result=result,
             data_hash=data_hash,
             metadata=metadata
         )
         
         self.blockchain_record = blockchain_record
-        self.save(update_fields=['blockchain_record'])
-
+        StudentAchievement.objects.filter(pk=self.pk).update(blockchain_record=blockchain_record)
+        return True
     
+    @classmethod
+    def anchor_pending(cls, limit=100):
+        """Anchor awards that have not been recorded on the blockchain yet"""
+        pending = cls.objects.filter(
+            blockchain_record__isnull=True
+        ).select_related('student', 'achievement').order_by('earned_date')[:limit]
+        
+        anchored = 0
+        for student_achievement in pending:
+            if student_achievement.record_achievement_on_blockchain():
+                anchored += 1
+        return anchored
+
     class Meta:
         unique_together = ['student', 'achievement']
     
@@ -780,19 +1416,357 @@ class LearningStreak(models.Model):
     
     def update_streak(self):
         today = timezone.now().date()
+        if self.last_activity_date == today:
+            return
+        
+        LearningStreak.record_activity(self.student_id, today)
+        self.refresh_from_db(fields=['current_streak', 'longest_streak', 'last_activity_date'])
+    
+    @classmethod
+    def record_activity(cls, student_id, today=None):
+        """Advance the student's streak for today with one conditional UPDATE.
+
+        Does nothing when activity was already recorded today. The streak
+        continues from yesterday or restarts at 1 after a gap.
+        """
+        today = today or timezone.now().date()
+        # A read keeps repeat requests from taking the write lock
+        if cls.objects.filter(student_id=student_id, last_activity_date__gte=today).exists():
+            return False
+        
         yesterday = today - timedelta(days=1)
+        new_streak = models.Case(
+            models.When(last_activity_date=yesterday, then=models.F('current_streak') + 1),
+            default=models.Value(1),
+            output_field=models.IntegerField()
+        )
+        updated = cls.objects.filter(
+            student_id=student_id,
+            last_activity_date__lt=today
+        ).update(
+            current_streak=new_streak,
+            longest_streak=Greatest(models.F('longest_streak'), new_streak),
+            last_activity_date=today
+        )
+        
+        if not updated:
+            streak, created = cls.objects.get_or_create(
+                student_id=student_id,
+                defaults={'current_streak': 1, 'longest_streak': 1, 'last_activity_date': today}
+            )
+            if not created:
+                return False
         
-        if self.last_activity_date == yesterday:
-            self.current_streak += 1
-        elif self.last_activity_date < yesterday:
-            self.current_streak = 1
+        current = cls.objects.filter(student_id=student_id).aggregate(current=models.Max('current_streak'))['current']
+        StudentGoal.apply_streak_event(student_id, current or 0)
+        Student.invalidate_voice_context([student_id])
+        return True
+    
+    @classmethod
+    def activity_runs(cls, today=None):
+        """Per-student (current, longest, last active day) from one gaps-and-islands pass.
+
+        Activity days are the distinct dates of voice interactions and
+        progress updates. Consecutive days share the same ``day - row_number``
+        group, so each group is one run of daily activity.
+        """
+        today = today or timezone.now().date()
+        yesterday = today - timedelta(days=1)
+        if connection.vendor == 'sqlite':
+            day_number = 'julianday(day)'
+        else:
+            day_number = "(day - DATE '1970-01-01')"
         
-        if self.current_streak > self.longest_streak:
-            self.longest_streak = self.current_streak
+        sql = """
+            WITH days AS (
+                SELECT {voice_student} AS student_id, DATE({voice_time}) AS day FROM {voice_table}
+                UNION
+                SELECT {progress_student}, DATE({progress_time}) FROM {progress_table}
+            ),
+            islands AS (
+                SELECT student_id, day,
+                       {day_number} - ROW_NUMBER() OVER (PARTITION BY student_id ORDER BY day) AS grp
+                FROM days
+            ),
+            runs AS (
+                SELECT student_id, COUNT(*) AS length, MAX(day) AS last_day
+                FROM islands
+                GROUP BY student_id, grp
+            )
+            SELECT student_id,
+                   MAX(CASE WHEN last_day >= %s THEN length ELSE 0 END) AS current_streak,
+                   MAX(length) AS longest_streak,
+                   MAX(last_day) AS last_day
+            FROM runs
+            GROUP BY student_id
+        """.format(
+            day_number=day_number,
+            voice_table=VoiceInteraction._meta.db_table,
+            voice_student=VoiceInteraction._meta.get_field('student').column,
+            voice_time=VoiceInteraction._meta.get_field('timestamp').column,
+            progress_table=StudentProgress._meta.db_table,
+            progress_student=StudentProgress._meta.get_field('student').column,
+            progress_time=StudentProgress._meta.get_field('last_updated').column,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [yesterday.isoformat()])
+            rows = cursor.fetchall()
         
-        self.last_activity_date = today
-        self.save()
+        runs = {}
+        for student_id, current, longest, last_day in rows:
+            if isinstance(last_day, str):
+                last_day = datetime.date.fromisoformat(last_day)
+            runs[student_id] = (current, longest, last_day)
+        return runs
+    
+    @classmethod
+    def recompute_all(cls, today=None, batch_size=500):
+        """Rebuild every student's streak from activity history.
+
+        Returns (created, updated) counts of streak rows.
+        """
+        runs = cls.activity_runs(today)
+        
+        with transaction.atomic():
+            existing = list(cls.objects.select_for_update())
+            seen = set()
+            for streak in existing:
+                current, longest, last_day = runs.get(streak.student_id, (0, 0, streak.last_activity_date))
+                streak.current_streak = current
+                streak.longest_streak = longest
+                streak.last_activity_date = last_day
+                seen.add(streak.student_id)
+            cls.objects.bulk_update(
+                existing,
+                ['current_streak', 'longest_streak', 'last_activity_date'],
+                batch_size=batch_size
+            )
+            
+            student_ids = set(Student.objects.filter(id__in=list(set(runs) - seen)).values_list('id', flat=True))
+            new_rows = [
+                cls(student_id=student_id, current_streak=current, longest_streak=longest, last_activity_date=last_day)
+                for student_id, (current, longest, last_day) in runs.items()
+                if student_id in student_ids
+            ]
+            cls.objects.bulk_create(new_rows, batch_size=batch_size)
+        
+        Student.invalidate_voice_context(set(runs) | seen)
+        return len(new_rows), len(existing)
     
     def __str__(self):
         return f"{self.student.name} - {self.current_streak} day streak"
 
+
+
+class LeaderboardEntry(models.Model):
+    """Ranked average progress per student, kept up to date on write.
+
+    Each active student has one entry ranked within their teacher's class
+    (``teacher_rank``) and within their grade in that class
+    (``grade_rank``). Ranks use competition ranking (1, 2, 2, 4) on average
+    progress, so top-N and "rank of student X" are index lookups.
+    """
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='leaderboard_entry')
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    grade_level = models.CharField(max_length=2, choices=Student.GRADE_LEVELS)
+    avg_progress = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    teacher_rank = models.PositiveIntegerField(default=1)
+    grade_rank = models.PositiveIntegerField(default=1)
+    current_subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True)
+    last_activity = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['teacher', 'teacher_rank']),
+            models.Index(fields=['teacher', 'grade_level', 'grade_rank']),
+            models.Index(fields=['teacher', 'avg_progress']),
+            models.Index(fields=['teacher', 'grade_level', 'avg_progress']),
+        ]
+    
+    # Students and boards waiting for the current transaction to commit
+    _pending = threading.local()
+    
+    @classmethod
+    def top(cls, teacher, limit=5, grade_level=None):
+        """Top ``limit`` entries of a teacher's class, or of one grade in it"""
+        entries = cls.objects.filter(teacher=teacher).select_related('student', 'current_subject')
+        if grade_level:
+            return entries.filter(grade_level=grade_level).order_by('grade_rank', 'student__name')[:limit]
+        return entries.order_by('teacher_rank', 'student__name')[:limit]
+    
+    @classmethod
+    def _scopes(cls, teacher_id, grade_level):
+        return [
+            ('teacher_rank', models.Q(teacher_id=teacher_id)),
+            ('grade_rank', models.Q(teacher_id=teacher_id, grade_level=grade_level)),
+        ]
+    
+    @classmethod
+    def _shift(cls, scope, rank_field, student_id, old_score=None, new_score=None):
+        """Adjust the ranks of entries whose position changes when one student moves.
+
+        Joining at ``new_score`` pushes lower entries down, leaving from
+        ``old_score`` pulls them up, and a move within the same board only
+        touches entries between the two scores.
+        """
+        entries = cls.objects.filter(scope).exclude(student_id=student_id)
+        if old_score is None:
+            entries, delta = entries.filter(avg_progress__lt=new_score), 1
+        elif new_score is None:
+            entries, delta = entries.filter(avg_progress__lt=old_score), -1
+        elif new_score > old_score:
+            entries, delta = entries.filter(avg_progress__gte=old_score, avg_progress__lt=new_score), 1
+        elif new_score < old_score:
+            entries, delta = entries.filter(avg_progress__gte=new_score, avg_progress__lt=old_score), -1
+        else:
+            return
+        entries.update(**{rank_field: models.F(rank_field) + delta})
+    
+    @classmethod
+    def _student_rows(cls, student_ids):
+        latest_subject = StudentProgress.objects.filter(
+            student=models.OuterRef('pk')
+        ).order_by('-last_updated').values('subject')[:1]
+        return Student.objects.filter(id__in=student_ids).annotate(
+            avg=models.Avg('studentprogress__progress_percentage'),
+            last=models.Max('studentprogress__last_updated'),
+            latest_subject=models.Subquery(latest_subject)
+        ).values('id', 'created_by', 'grade_level', 'is_active', 'avg', 'last', 'latest_subject')
+    
+    @classmethod
+    def schedule_refresh(cls, student_ids=(), teacher_ids=()):
+        """Refresh students' entries and rerank boards once the transaction commits.
+
+        Saves inside one transaction are collected and applied together, so a
+        loop of progress saves goes through the bulk path once instead of
+        moving one entry per save. Outside a transaction this runs at once.
+        """
+        pending = cls._pending.__dict__.setdefault('work', (set(), set()))
+        pending[0].update(student_ids)
+        pending[1].update(teacher_ids)
+        # Every caller registers; the first callback to run does the work
+        transaction.on_commit(cls._run_pending)
+    
+    @classmethod
+    def _run_pending(cls):
+        student_ids, teacher_ids = cls._pending.__dict__.pop('work', (set(), set()))
+        if student_ids:
+            cls.refresh_students(student_ids)
+        if teacher_ids:
+            cls.rerank(teacher_ids)
+    
+    @classmethod
+    def refresh_students(cls, student_ids, batch_size=500):
+        """Recompute the entries of students whose aggregate progress changed.
+
+        A single student is moved in place; larger batches are written
+        together and their boards reranked once.
+        """
+        student_ids = list(student_ids)
+        if not student_ids:
+            return
+        if len(student_ids) == 1:
+            for row in cls._student_rows(student_ids):
+                cls.place(row)
+            return
+        
+        rows = {row['id']: row for row in cls._student_rows(student_ids)}
+        with transaction.atomic():
+            existing = {entry.student_id: entry for entry in cls.objects.select_for_update().filter(student_id__in=student_ids)}
+            teacher_ids = {entry.teacher_id for entry in existing.values()}
+            inactive = [student_id for student_id, row in rows.items() if not row['is_active']]
+            cls.objects.filter(student_id__in=inactive).delete()
+            
+            to_update, to_create = [], []
+            for student_id, row in rows.items():
+                if not row['is_active']:
+                    continue
+                entry = existing.get(student_id) or cls(student_id=student_id)
+                entry.teacher_id = row['created_by']
+                entry.grade_level = row['grade_level']
+                entry.avg_progress = Decimal(row['avg'] or 0).quantize(Decimal('0.01'))
+                entry.current_subject_id = row['latest_subject']
+                entry.last_activity = row['last']
+                teacher_ids.add(entry.teacher_id)
+                (to_update if entry.pk else to_create).append(entry)
+            
+            fields = ['teacher', 'grade_level', 'avg_progress', 'current_subject', 'last_activity']
+            cls.objects.bulk_update(to_update, fields, batch_size=batch_size)
+            cls.objects.bulk_create(to_create, batch_size=batch_size)
+            cls.rerank(teacher_ids, batch_size=batch_size)
+    
+    @classmethod
+    def place(cls, row):
+        """Move one student's entry to its new score, shifting only the affected ranks"""
+        with transaction.atomic():
+            entry = cls.objects.select_for_update().filter(student_id=row['id']).first()
+            score = Decimal(row['avg'] or 0).quantize(Decimal('0.01'))
+            
+            if entry and (not row['is_active'] or entry.teacher_id != row['created_by']
+                          or entry.grade_level != row['grade_level']):
+                entry.withdraw()
+                entry = None
+            if not row['is_active']:
+                return None
+            
+            old_score = entry.avg_progress if entry else None
+            if old_score == score:
+                # Same score on the same board: no rank moves
+                cls.objects.filter(pk=entry.pk).update(
+                    current_subject_id=row['latest_subject'], last_activity=row['last']
+                )
+                return entry
+            entry = entry or cls(student_id=row['id'], teacher_id=row['created_by'], grade_level=row['grade_level'])
+            for rank_field, scope in cls._scopes(entry.teacher_id, entry.grade_level):
+                cls._shift(scope, rank_field, entry.student_id, old_score=old_score, new_score=score)
+                above = cls.objects.filter(scope, avg_progress__gt=score).exclude(student_id=entry.student_id).count()
+                setattr(entry, rank_field, above + 1)
+            
+            entry.avg_progress = score
+            entry.current_subject_id = row['latest_subject']
+            entry.last_activity = row['last']
+            entry.save()
+            return entry
+    
+    def withdraw(self):
+        """Remove this entry and move everyone ranked below it up"""
+        for rank_field, scope in self._scopes(self.teacher_id, self.grade_level):
+            self._shift(scope, rank_field, self.student_id, old_score=self.avg_progress)
+        self._withdrawn = True  # Ranks are already closed up; see signals.py
+        self.delete()
+    
+    @classmethod
+    def rerank(cls, teacher_ids=None, batch_size=500):
+        """Recompute stored ranks for whole boards with window functions"""
+        entries = cls.objects.all()
+        if teacher_ids is not None:
+            entries = entries.filter(teacher_id__in=list(teacher_ids))
+        entries = list(entries.annotate(
+            new_teacher_rank=models.Window(
+                Rank(),
+                partition_by=[models.F('teacher')],
+                order_by=models.F('avg_progress').desc()
+            ),
+            new_grade_rank=models.Window(
+                Rank(),
+                partition_by=[models.F('teacher'), models.F('grade_level')],
+                order_by=models.F('avg_progress').desc()
+            )
+        ))
+        for entry in entries:
+            entry.teacher_rank = entry.new_teacher_rank
+            entry.grade_rank = entry.new_grade_rank
+        cls.objects.bulk_update(entries, ['teacher_rank', 'grade_rank'], batch_size=batch_size)
+        return len(entries)
+    
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """Rebuild every board from student progress"""
+        student_ids = list(Student.objects.values_list('id', flat=True))
+        for start in range(0, len(student_ids), batch_size):
+            cls.refresh_students(student_ids[start:start + batch_size], batch_size=batch_size)
+        cls.objects.exclude(student__is_active=True).delete()
+        return cls.rerank(batch_size=batch_size)
+    
+    def __str__(self):
+        return f"{self.student.name} - #{self.teacher_rank} ({self.avg_progress}%)"
@@ -0,0 +1,153 @@
+# base/response_cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+FILLER_WORDS = {'um', 'umm', 'uh', 'uhh', 'er', 'erm', 'hmm', 'please', 'hey', 'hi', 'okay', 'ok', 'so', 'well', 'assistant'}
+
+CONTRACTIONS = {
+    "what's": 'what is',
+    "whats": 'what is',
+    "who's": 'who is',
+    "where's": 'where is',
+    "how's": 'how is',
+    "it's": 'it is',
+    "that's": 'that is',
+    "can't": 'can not',
+    "don't": 'do not',
+}
+
+CONTRACTION_PATTERN = re.compile(r"\b(" + '|'.join(re.escape(contraction) for contraction in CONTRACTIONS) + r")\b")
+
+SYMBOLS = {'+': ' plus ', '-': ' minus ', '*': ' times ', 'x': ' times ', '×': ' times ', '/': ' divided by ', '÷': ' divided by ', '=': ' equals '}
+
+# Follow-ups that only make sense with the previous turn
+CONTEXT_WORDS = {'it', 'that', 'this', 'those', 'these', 'they', 'them', 'he', 'she', 'again', 'more', 'another', 'else', 'why', 'yes', 'no'}
+
+# Questions about the student themself are answered from their own data
+PERSONAL_WORDS = {'i', 'me', 'my', 'mine', 'myself', 'progress', 'streak', 'score', 'scores', 'grade', 'homework', 'assignment', 'assignments'}
+
+NAME_PLACEHOLDER = '{student_name}'
+
+
+def replace_name(text, name, replacement):
+    """Replace a name as a whole word, so 'Al' does not touch 'Also'"""
+    if not name:
+        return text
+    return re.sub(r'\b' + re.escape(name) + r'\b', lambda match: replacement, text)
+
+
+def normalize_message(message):
+    """Lower-case, expand contractions, spell out maths symbols and drop punctuation and filler"""
+    text = message.lower().strip()
+    text = CONTRACTION_PATTERN.sub(lambda match: CONTRACTIONS[match.group(1)], text)
+    text = re.sub(r'(?<=\d)\s*([x×*/÷+=-])\s*(?=\d)', lambda match: SYMBOLS[match.group(1)], text)
+    text = re.sub(r'[+×÷=]', lambda match: SYMBOLS[match.group(0)], text)
+    words = re.sub(r"[^\w\s]", ' ', text).split()
+    return ' '.join(word for word in words if word not in FILLER_WORDS)
+
+
+def grade_band(grade_level):
+    """Coarse grade band so answers are shared between similar ages"""
+    if grade_level in (None, ''):
+        return 'any'
+    if grade_level == 'K':
+        return 'k-2'
+    try:
+        grade = int(grade_level)
+    except (TypeError, ValueError):
+        return 'any'
+    if grade <= 2:
+        return 'k-2'
+    if grade <= 5:
+        return '3-5'
+    if grade <= 8:
+        return '6-8'
+    return '9-12'
+
+
+class ResponseCache:
+    """In-process LRU cache of voice answers to common questions.
+
+    Entries are keyed on the normalized question, grade band and subject,
+    expire after VOICE_CACHE_TTL seconds and count their hits. The student's
+    name is stored as a placeholder so answers can be shared across a class;
+    answers are generated without per-student data for the same reason
+    (see views.shared_reply_context).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'VOICE_CACHE_MAX_ENTRIES', 1000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'VOICE_CACHE_TTL', 86400)
+
+    def make_key(self, message, grade_level=None, subject=None):
+        normalized = normalize_message(message)
+        if not normalized:
+            return None
+        return (normalized, grade_band(grade_level), (subject or '').lower())
+
+    def is_cacheable(self, message, conversation_context=None):
+        """False for personal questions and for follow-ups that depend on earlier turns"""
+        words = set(normalize_message(message).split())
+        if not words or words & PERSONAL_WORDS:
+            return False
+        if conversation_context and (words & CONTEXT_WORDS or len(words) <= 2):
+            return False
+        return True
+
+    def get(self, key, student_name=None):
+        if key is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires'] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry['hits'] += 1
+            self.hits += 1
+            response = entry['response']
+        return response.replace(NAME_PLACEHOLDER, student_name or 'there')
+
+    def set(self, key, response, student_name=None):
+        if key is None or not response:
+            return
+        response = replace_name(response, student_name, NAME_PLACEHOLDER)
+        with self._lock:
+            self._entries[key] = {'response': response, 'expires': time.monotonic() + self.ttl, 'hits': 0}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            top = sorted(self._entries.items(), key=lambda item: item[1]['hits'], reverse=True)[:10]
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'top': [(key[0], entry['hits']) for key, entry in top],
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton instance
+response_cache = ResponseCache()
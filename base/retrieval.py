@@ -0,0 +1,257 @@
+# base/retrieval.py
+import csv
+import json
+import math
+import os
+import threading
+import uuid
+from array import array
+from django.conf import settings
+from django.core.cache import caches
+
+from .response_cache import grade_band, normalize_message
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'to', 'of', 'and', 'or', 'in', 'on', 'at', 'for',
+    'with', 'by', 'from', 'as', 'do', 'does', 'did', 'can', 'could', 'you', 'your', 'i', 'me', 'my', 'we',
+    'it', 'this', 'that', 'what', 'how', 'why', 'when', 'where', 'which', 'who', 'tell', 'about', 'explain',
+    'please', 'know', 'am', 'doing', 'get', 'go', 'going', 'have', 'has', 'had', 'there', 'some', 'should',
+    'would', 'will', 'not', 'if', 'so', 'but', 'all', 'into',
+    # Conversational filler that says nothing about the topic
+    'like', 'want', 'need', 'help', 'learn', 'understand', 'dont', 'many', 'much', 'more', 'made', 'make',
+}
+
+# Spelled-out operators; between numbers they are arithmetic, not a topic
+OPERATOR_WORDS = {'plus', 'minus', 'times', 'divided', 'equals'}
+
+CONTENT_FIELDS = ('subject_area', 'grade_band', 'question', 'answer', 'keywords')
+SUBJECT_AREAS = {'english', 'math', 'science', 'general'}
+GRADE_BANDS = {'k-2', '3-5', '6-8', '9-12', 'any'}
+
+
+def stem(word):
+    """Strip common English endings so 'fractions' and 'dividing' match 'fraction' and 'divide'"""
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith('e') and len(word) > 3 else word
+
+
+def tokenize(text):
+    """Search terms of a text; numbers are left to the maths helpers"""
+    words = normalize_message(text).split()
+    tokens = []
+    for position, word in enumerate(words):
+        if word in STOP_WORDS or word.isdigit():
+            continue
+        neighbours = words[max(0, position - 1):position] + words[position + 1:position + 2]
+        if word in OPERATOR_WORDS and any(neighbour.isdigit() for neighbour in neighbours):
+            continue
+        word = stem(word)
+        if word not in STOP_WORDS:
+            tokens.append(word)
+    return tokens
+
+
+def load_content_file(path):
+    """Lesson entries from a JSON list or a CSV file with a header row.
+
+    Each entry needs a question and an answer; subject_area and grade_band
+    default to 'general' and 'any'. Raises ValueError for entries that are
+    missing either or use an unknown subject area or grade band.
+    """
+    with open(path, encoding='utf-8') as content:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(content))
+        else:
+            rows = json.load(content)
+
+    entries = []
+    for number, row in enumerate(rows, start=1):
+        entry = {field: (row.get(field) or '').strip() for field in CONTENT_FIELDS}
+        entry['subject_area'] = entry['subject_area'].lower() or 'general'
+        entry['grade_band'] = entry['grade_band'].lower() or 'any'
+        if not entry['question'] or not entry['answer']:
+            raise ValueError(f"Entry {number} in {path} needs a question and an answer")
+        if entry['subject_area'] not in SUBJECT_AREAS:
+            raise ValueError(f"Entry {number} in {path} has unknown subject area '{entry['subject_area']}'")
+        if entry['grade_band'] not in GRADE_BANDS:
+            raise ValueError(f"Entry {number} in {path} has unknown grade band '{entry['grade_band']}'")
+        entries.append(entry)
+    return entries
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents.
+
+    Term weights are computed once at build time and stored as sparse
+    postings (parallel arrays of document numbers and weights per term), so
+    a query is a handful of array walks and additions.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.documents = [document for document, _ in documents]
+        self.postings = {}
+
+        term_counts = []
+        for _, tokens in documents:
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            term_counts.append(counts)
+
+        lengths = [sum(counts.values()) for counts in term_counts]
+        average_length = (sum(lengths) / len(lengths)) if lengths else 1
+        document_frequency = {}
+        for counts in term_counts:
+            for term in counts:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        total = len(term_counts)
+        for number, counts in enumerate(term_counts):
+            norm = k1 * (1 - b + b * lengths[number] / (average_length or 1))
+            for term, frequency in counts.items():
+                idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                numbers, weights = self.postings.setdefault(term, (array('I'), array('f')))
+                numbers.append(number)
+                weights.append(idf * frequency * (k1 + 1) / (frequency + norm))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def scores(self, query_tokens):
+        """{document number: score} for documents sharing a term with the query"""
+        scores = {}
+        for term in set(query_tokens):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            for number, weight in zip(*posting):
+                scores[number] = scores.get(number, 0.0) + weight
+        return scores
+
+
+class CurriculumIndex:
+    """In-memory retrieval over curriculum content for the offline fallback.
+
+    Indexes LessonContent entries (questions weighted above answers) and
+    Topic descriptions; when no lesson content has been imported yet, the
+    bundled LESSON_CONTENT_FILE is indexed instead. The index is built on
+    first use and rebuilt after content changes, which bump a version in
+    the VOICE_RETRIEVAL_CACHE cache so every worker notices.
+    """
+
+    VERSION_KEY = 'base:curriculum_index_version'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'VOICE_RETRIEVAL_CACHE', 'default')]
+
+    @property
+    def min_score(self):
+        return getattr(settings, 'VOICE_RETRIEVAL_MIN_SCORE', 3.0)
+
+    @property
+    def min_coverage(self):
+        return getattr(settings, 'VOICE_RETRIEVAL_MIN_COVERAGE', 0.5)
+
+    def invalidate(self):
+        self.cache.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+
+    def documents(self):
+        """(document, tokens) pairs for everything the assistant can answer from"""
+        from .models import LessonContent, Topic
+
+        entries = list(LessonContent.objects.values(*CONTENT_FIELDS))
+        if not entries:
+            path = getattr(settings, 'LESSON_CONTENT_FILE', '')
+            if path and os.path.exists(path):
+                entries = load_content_file(path)
+
+        documents = []
+        for entry in entries:
+            tokens = (
+                tokenize(entry['question']) * 2
+                + tokenize(entry.get('keywords', ''))
+                + tokenize(entry['answer'])
+            )
+            documents.append(({
+                'title': entry['question'],
+                'answer': entry['answer'],
+                'subject_area': entry['subject_area'],
+                'grade_band': entry['grade_band'],
+                'terms': frozenset(tokenize(entry['question']) + tokenize(entry.get('keywords', ''))),
+            }, tokens))
+
+        topics = Topic.objects.exclude(description='').values_list('name', 'description', 'subject__name')
+        for name, description, subject_name in topics:
+            documents.append(({
+                'title': name,
+                'answer': f"{name}: {description}",
+                'subject_area': (subject_name or '').lower(),
+                'grade_band': 'any',
+                'terms': frozenset(tokenize(name)),
+            }, tokenize(name) * 2 + tokenize(description)))
+        return documents
+
+    def ensure_loaded(self):
+        version = self.cache.get(self.VERSION_KEY)
+        if self._index is not None and version == self._version:
+            return self._index
+        with self._lock:
+            # Stamp the version read before building: content changed during
+            # the build bumps it again, so the next call rebuilds
+            version = self.cache.get(self.VERSION_KEY)
+            if self._index is None or version != self._version:
+                self._index = BM25Index(self.documents())
+                self._version = version
+                print(f"Built curriculum index with {len(self._index)} entries")
+        return self._index
+
+    def search(self, query, grade_level=None, limit=3):
+        """Best matching documents as (score, document), highest first.
+
+        Entries for the student's grade band are preferred over entries for
+        any grade, and those over other bands.
+        """
+        index = self.ensure_loaded()
+        band = grade_band(grade_level)
+        results = []
+        for number, score in index.scores(tokenize(query)).items():
+            document = index.documents[number]
+            if band != 'any' and document['grade_band'] != 'any':
+                score *= 1.2 if document['grade_band'] == band else 0.8
+            results.append((score, document))
+        results.sort(key=lambda result: result[0], reverse=True)
+        return results[:limit]
+
+    def best_answer(self, query, grade_level=None):
+        """Answer text for the best on-topic match, or None.
+
+        A match needs a score of at least VOICE_RETRIEVAL_MIN_SCORE, and its
+        question or keywords must hold at least VOICE_RETRIEVAL_MIN_COVERAGE
+        of the query's terms; a word that only turns up somewhere in an
+        answer ("I like football", "why is the sky blue") is not enough.
+        """
+        terms = set(tokenize(query))
+        try:
+            results = self.search(query, grade_level, limit=5)
+        except Exception as e:
+            print(f"Curriculum search failed: {e}")
+            return None
+        for score, document in results:
+            if score < self.min_score:
+                break
+            if len(terms & document['terms']) >= self.min_coverage * len(terms):
+                return document['answer']
+        return None
+
+
+# Singleton instance
+curriculum_index = CurriculumIndex()
@@ -0,0 +1,42 @@
+# base/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import LeaderboardEntry, LearningStreak, LessonContent, Student, StudentAchievement, StudentProgress, Topic
+from .retrieval import curriculum_index
+
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+@receiver(post_save, sender=LearningStreak)
+@receiver(post_delete, sender=LearningStreak)
+@receiver(post_save, sender=StudentAchievement)
+@receiver(post_delete, sender=StudentAchievement)
+def invalidate_voice_context(sender, instance, **kwargs):
+    """Rebuild the student's voice prompt context on their next message.
+
+    Bulk writes and queryset updates do not send signals; those paths call
+    Student.invalidate_voice_context() themselves.
+    """
+    Student.invalidate_voice_context([instance.student_id])
+
+
+@receiver(post_delete, sender=StudentProgress)
+def refresh_leaderboard_after_progress_delete(sender, instance, **kwargs):
+    """Deleted progress changes the student's average, including queryset deletes"""
+    LeaderboardEntry.schedule_refresh(student_ids=[instance.student_id])
+
+
+@receiver(post_delete, sender=LeaderboardEntry)
+def close_leaderboard_gap(sender, instance, **kwargs):
+    """Entries removed by cascades or queryset deletes leave a gap in their boards"""
+    if not getattr(instance, '_withdrawn', False):
+        LeaderboardEntry.schedule_refresh(teacher_ids=[instance.teacher_id])
+
+
+@receiver(post_save, sender=LessonContent)
+@receiver(post_delete, sender=LessonContent)
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def invalidate_curriculum_index(sender, instance, **kwargs):
+    """Rebuild the offline fallback index in every worker on next use"""
+    curriculum_index.invalidate()
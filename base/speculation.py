@@ -0,0 +1,167 @@
+# base/speculation.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+from .response_cache import normalize_message
+from .retrieval import tokenize
+from .spoken_math import grade, parse_numbers
+
+DONT_KNOW = ('do not know', 'dont know', 'no idea', 'not sure', 'i forgot', 'i give up')
+
+# Words that mark a reply as a request, question or greeting rather than an answer
+NOT_AN_ANSWER = {
+    'what', 'why', 'how', 'who', 'where', 'when', 'which', 'question', 'mean', 'means',
+    'can', 'could', 'would', 'will', 'repeat', 'again', 'say', 'tell', 'explain', 'show',
+    'help', 'hint', 'need', 'want', 'story', 'hello', 'bye', 'wait', 'stop', 'understand',
+}
+# "It's not twelve" names the number it rules out
+NEGATIONS = {'not', 'no', 'never', 'isnt', 'isn', 'wasnt', 'wasn', 'arent', 'aren'}
+# Longest reply to a word question still read as a short answer ("a naming word")
+MAX_ANSWER_WORDS = 4
+
+
+def classify_answer(answer, expected):
+    """'correct', 'incorrect', or None when a local check cannot tell.
+
+    Only replies that read as an attempt at the question are graded: a
+    number for a numeric answer, a short phrase for a word answer, and
+    nothing that asks for help, a repeat or something else ("say that
+    again", "tell me a story") or is negated ("it's not twelve").
+    Everything else is left to the model.
+    """
+    answer_text = normalize_message(answer)
+    if not answer_text or not expected:
+        return None
+    if any(phrase in answer_text for phrase in DONT_KNOW):
+        return 'incorrect'
+    words = answer_text.split()
+    if NOT_AN_ANSWER.intersection(words) or NEGATIONS.intersection(words):
+        return None
+
+    expected_numbers = parse_numbers(str(expected))
+    if expected_numbers:
+        return grade(answer, expected_numbers[-1])
+
+    expected_terms = set(tokenize(str(expected)))
+    given_terms = set(tokenize(answer_text))
+    if not expected_terms or not given_terms:
+        return None
+    overlap = len(expected_terms & given_terms) / len(expected_terms)
+    if overlap >= 0.6:
+        return 'correct'
+    if overlap == 0 and len(words) <= MAX_ANSWER_WORDS and not parse_numbers(answer_text):
+        return 'incorrect'
+    return None
+
+
+class SpeculativeFollowUps:
+    """Follow-ups pre-generated while the student is listening to a question.
+
+    When a reply ends by asking the student something, a background call
+    prepares the expected answer and the next turn for a correct and an
+    incorrect answer. The student's reply is checked locally with
+    classify_answer(); if it is clearly right or wrong, the matching
+    follow-up is served at once. Entries belong to one conversation, cover
+    only its next turn and expire after VOICE_SPECULATION_TTL seconds.
+    Hits, misses and the generation time saved are counted for stats().
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='voice-speculate')
+        self.scheduled = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_ready = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'VOICE_SPECULATION', True)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'VOICE_SPECULATION_TTL', 120)
+
+    @staticmethod
+    def asks_question(response_text):
+        """True when the reply ends by asking the student something"""
+        return (response_text or '').rstrip().rstrip('"\')').endswith('?')
+
+    def schedule(self, key, generate):
+        """Run generate() in the background for the conversation's next turn.
+
+        ``generate`` returns {'expected_answer', 'correct', 'incorrect'} or None.
+        """
+        if not self.enabled or key is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._entries = {k: entry for k, entry in self._entries.items() if entry['expires'] > now}
+            self._entries[key] = {'status': 'pending', 'expires': now + self.ttl}
+            self.scheduled += 1
+        self._executor.submit(self._run, key, generate)
+        return True
+
+    def _run(self, key, generate):
+        started = time.monotonic()
+        try:
+            result = generate()
+        except Exception as e:
+            print(f"Speculative follow-up failed: {e}")
+            result = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['status'] != 'pending':
+                return  # Already answered or replaced
+            if not isinstance(result, dict) or any(result.get(field) in (None, '') for field in ('expected_answer', 'correct', 'incorrect')):
+                del self._entries[key]
+                return
+            entry.update(result, status='ready', seconds=time.monotonic() - started)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def take(self, key, user_message):
+        """(follow-up, branch) if one was prepared and the answer is clearly right or wrong"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry['expires'] <= time.monotonic():
+                return None
+            if entry['status'] != 'ready':
+                self.not_ready += 1
+                return None
+            branch = classify_answer(user_message, str(entry['expected_answer']))
+            if branch is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry['seconds']
+        print(f"Serving speculative follow-up ({branch}), hit rate {self.hit_rate():.0%}")
+        return entry[branch], branch
+
+    def hit_rate(self):
+        attempts = self.hits + self.misses + self.not_ready
+        return self.hits / attempts if attempts else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'scheduled': self.scheduled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_ready': self.not_ready,
+                'hit_rate': round(self.hit_rate(), 3),
+                'saved_seconds': round(self.saved_seconds, 2),
+                'pending': len(self._entries),
+            }
+
+
+# Singleton instance
+speculative_followups = SpeculativeFollowUps()
@@ -0,0 +1,260 @@
+# base/spoken_math.py
+"""Spoken arithmetic: number words, simple questions and local grading.
+
+Only the standard library is used, so the same code grades answers in the
+Django voice API and on the offline ShuleVoice device (shulevoice.py).
+"""
+import random
+import re
+
+UNITS = {
+    'zero': 0, 'nought': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fourty': 40, 'fifty': 50, 'sixty': 60,
+    'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+SCALES = {'thousand': 1000, 'million': 1000000}
+
+OPERATOR_WORDS = {
+    'plus': '+', 'add': '+', 'added': '+',
+    'minus': '-', 'subtract': '-', 'less': '-',
+    'times': '*', 'multiplied': '*', 'x': '*',
+    'divided': '/', 'over': '/',
+}
+OPERATOR_SYMBOLS = {'+': '+', '-': '-', '*': '*', '×': '*', '/': '/', '÷': '/'}
+SPOKEN_OPERATORS = {'+': 'plus', '-': 'minus', '*': 'times', '/': 'divided by'}
+
+# Phrases folded into single operator words before parsing
+PHRASES = (
+    ('take away', 'minus'),
+    ('multiplied by', 'times'),
+    ('times by', 'times'),
+    ('divided by', 'divided'),
+    ('shared between', 'divided'),
+    ('added to', 'plus'),
+)
+
+TOKEN_PATTERN = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?|[a-z]+|[+\-*/×÷=?]")
+SENTENCE_PATTERN = re.compile(r"[^.!?]*\?")
+TOLERANCE = 1e-9
+
+
+def tokenize(text):
+    text = (text or '').lower().replace("'", '')
+    # "twenty-three" is one number; "9-4" is a subtraction
+    text = re.sub(r'(?<=[a-z])-(?=[a-z])', ' ', text)
+    for phrase, replacement in PHRASES:
+        text = text.replace(phrase, replacement)
+    # "7x5" is seven times five
+    text = re.sub(r'(?<=\d)\s*x\s*(?=\d)', ' x ', text)
+    return TOKEN_PATTERN.findall(text)
+
+
+def read_number(tokens, start):
+    """(value, next index) for a number starting at tokens[start], or (None, start).
+
+    Accepts digits ("23", "1,000", "3.5") and words ("twenty three",
+    "one hundred and five", "three point five", "negative four").
+    """
+    index = start
+    sign = 1
+    if index < len(tokens) and tokens[index] == 'negative':
+        sign = -1
+        index += 1
+    if index >= len(tokens):
+        return None, start
+
+    token = tokens[index]
+    if token[0].isdigit():
+        return sign * float(token.replace(',', '')), index + 1
+
+    total = 0
+    current = None
+    last = None  # 'unit', 'teen', 'tens' or 'hundred'
+    while index < len(tokens):
+        token = tokens[index]
+        if token in UNITS:
+            value = UNITS[token]
+            kind = 'unit' if value < 10 else 'teen'
+            # "three four" is two numbers and "twenty twelve" is not one
+            if last in ('unit', 'teen') or (last == 'tens' and kind == 'teen'):
+                break
+            current = (current or 0) + value
+            last = kind
+        elif token in TENS:
+            if last in ('unit', 'teen', 'tens'):
+                break
+            current = (current or 0) + TENS[token]
+            last = 'tens'
+        elif token == 'hundred':
+            if last == 'hundred':
+                break
+            current = (current or 1) * 100
+            last = 'hundred'
+        elif token in SCALES and (current is not None or total):
+            total += (current or 1) * SCALES[token]
+            current = None
+            last = None
+        elif token == 'a' and index + 1 < len(tokens) and tokens[index + 1] in ('hundred', 'thousand', 'million') and current is None:
+            # "a thousand" is one thousand
+            current = 1
+        elif token == 'and' and (last == 'hundred' or (last is None and total)) and index + 1 < len(tokens) and (
+                tokens[index + 1] in UNITS or tokens[index + 1] in TENS):
+            pass
+        elif token == 'point' and (current is not None or total) and index + 1 < len(tokens) and tokens[index + 1] in UNITS:
+            digits = ''
+            index += 1
+            while index < len(tokens) and tokens[index] in UNITS and UNITS[tokens[index]] < 10:
+                digits += str(UNITS[tokens[index]])
+                index += 1
+            return sign * (total + (current or 0) + float('0.' + digits)), index
+        else:
+            break
+        index += 1
+
+    if current is None and not total:
+        return None, start
+    return sign * (total + (current or 0)), index
+
+
+def parse_numbers(text):
+    """Every number said in an utterance, in order"""
+    tokens = tokenize(text)
+    numbers = []
+    index = 0
+    while index < len(tokens):
+        value, following = read_number(tokens, index)
+        if value is None:
+            index += 1
+        else:
+            numbers.append(value)
+            index = following
+    return numbers
+
+
+def format_number(value):
+    """7.0 -> '7', 3.5 -> '3.5'"""
+    if abs(value - round(value)) < TOLERANCE:
+        return str(int(round(value)))
+    return f"{value:.4f}".rstrip('0').rstrip('.')
+
+
+def grade(answer_text, expected):
+    """'correct' or 'incorrect' for a spoken answer to a numeric question, None if no number was said.
+
+    The last number said counts, so "seven plus five is twelve" and
+    "um, twelve" are both read as 12.
+    """
+    numbers = parse_numbers(answer_text)
+    if not numbers:
+        return None
+    return 'correct' if abs(numbers[-1] - float(expected)) < TOLERANCE else 'incorrect'
+
+
+class ArithmeticQuestion:
+    """One early-grade arithmetic question, ``left operator right``"""
+
+    # Difficulty levels: operators and operand ranges
+    LEVELS = {
+        1: (('+',), 0, 10),
+        2: (('+', '-'), 0, 20),
+        3: (('+', '-', '*'), 2, 50),
+        4: (('+', '-', '*', '/'), 2, 100),
+    }
+
+    def __init__(self, left, operator, right):
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+    @classmethod
+    def generate(cls, level=1, rng=random):
+        """A random question for the level; no negative or fractional answers"""
+        operators, low, high = cls.LEVELS[max(1, min(level, max(cls.LEVELS)))]
+        operator = rng.choice(operators)
+        if operator in ('*', '/'):
+            left, right = rng.randint(2, 12), rng.randint(2, 10 if level < 4 else 12)
+            if operator == '/':
+                left = left * right
+            return cls(left, operator, right)
+        left, right = rng.randint(low, high), rng.randint(low, high)
+        if operator == '-' and right > left:
+            left, right = right, left
+        return cls(left, operator, right)
+
+    @property
+    def answer(self):
+        if self.operator == '+':
+            return self.left + self.right
+        if self.operator == '-':
+            return self.left - self.right
+        if self.operator == '*':
+            return self.left * self.right
+        return self.left / self.right
+
+    @property
+    def expression(self):
+        return f"{format_number(self.left)} {SPOKEN_OPERATORS[self.operator]} {format_number(self.right)}"
+
+    @property
+    def text(self):
+        return f"What is {self.expression}?"
+
+    def check(self, answer_text):
+        return grade(answer_text, self.answer)
+
+    def praise(self):
+        return f"That's right! {self.expression} is {format_number(self.answer)}. Well done!"
+
+    def explanation(self):
+        """Short spoken explanation used when no AI model is available"""
+        left, right, answer = (format_number(value) for value in (self.left, self.right, self.answer))
+        if self.operator == '+':
+            hint = f"Start at {left} and count on {right} more."
+        elif self.operator == '-':
+            hint = f"Start at {left} and count back {right}."
+        elif self.operator == '*':
+            hint = f"That is {right} groups of {left}."
+        else:
+            hint = f"Share {left} into {right} equal groups."
+        return f"Not quite. {hint} {self.expression} is {answer}."
+
+
+def parse_question(text):
+    """The arithmetic question asked in a reply ("... What is 7 plus 5?"), or None.
+
+    Question sentences are tried from the last one back; the first holding
+    exactly ``number operator number`` wins. "2 less than 5" is 5 minus 2.
+    """
+    for sentence in reversed(SENTENCE_PATTERN.findall(text or '')):
+        tokens = tokenize(sentence)
+        parts = []
+        swapped = False
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            operator = OPERATOR_SYMBOLS.get(token) or OPERATOR_WORDS.get(token)
+            if operator and parts and not isinstance(parts[-1], str):
+                if token == 'less' and index + 1 < len(tokens) and tokens[index + 1] == 'than':
+                    swapped = True
+                    index += 1
+                parts.append(operator)
+                index += 1
+                continue
+            value, following = read_number(tokens, index)
+            if value is not None:
+                parts.append(value)
+                index = following
+            else:
+                index += 1
+        if len(parts) == 3 and isinstance(parts[1], str) and not isinstance(parts[2], str):
+            left, operator, right = parts
+            if swapped:
+                left, right = right, left
+            if operator == '/' and right == 0:
+                continue
+            return ArithmeticQuestion(left, operator, right)
+    return None
@@ -1,3 +1,1386 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import requests
+
+from . import views
+from .achievements import evaluate_achievements
+from .admission import AdmissionController
+from .conversations import ConversationStore, ConversationSummarizer
+from .llm import (
+    LLMClientRegistry, ModelCatalog, OllamaProvider, ProviderCandidate, ProviderHealth, ProviderRacer,
+    RequestCoalescer, SentenceBuffer,
+)
+from .models import (
+    Achievement, Assignment, AssignmentStudent, AssignmentTargetGrade, LeaderboardEntry, LearningSession, LearningStreak, Student, StudentGoal, StudentProgress, Subject,
+    LessonContent, StudentAchievement, VoiceInteraction,
+)
+from .response_cache import ResponseCache, normalize_message
+from .retrieval import BM25Index, CurriculumIndex, curriculum_index, tokenize
+from .speculation import SpeculativeFollowUps, classify_answer
+from .spoken_math import grade, parse_numbers, parse_question
+from .write_behind import VoiceLogQueue, try_lock, voice_log_queue
+
+
+# Keep the shared file cache and voice log journals out of the project directory
+TEST_DIR = tempfile.mkdtemp(prefix='shule-voice-tests-')
+test_storage = override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(TEST_DIR, 'cache'),
+        },
+    },
+    VOICE_WRITE_BEHIND_DIR=os.path.join(TEST_DIR, 'voice_log'),
+)
+
+
+def setUpModule():
+    test_storage.enable()
+    os.makedirs(settings.VOICE_WRITE_BEHIND_DIR, exist_ok=True)
+
+
+def tearDownModule():
+    test_storage.disable()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+def make_student(teacher, student_id, grade_level='3', **fields):
+    return Student.objects.create(
+        name=fields.pop('name', f"Student {student_id}"),
+        student_id=student_id,
+        grade_level=grade_level,
+        created_by=teacher,
+        **fields
+    )
+
+
+class ProgressUpdateTests(TestCase):
+    """/api/progress-update/ polling from the progress dashboard"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.other_teacher = User.objects.create_user('other', password='pass')
+        self.child = User.objects.create_user('child', password='pass')
+        self.student = make_student(self.teacher, 'S1', user_account=self.child, can_login=True)
+        self.subject = Subject.objects.create(name='Math', code='MATH')
+        StudentProgress.objects.create(student=self.student, subject=self.subject, progress_percentage=50)
+        self.url = reverse('api_progress_update')
+
+    def test_student_polls_own_progress(self):
+        self.client.login(username='child', password='pass')
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['progress'], 50.0)
+
+    def test_teacher_polls_their_student(self):
+        self.client.login(username='teacher', password='pass')
+        response = self.client.get(self.url, {'student_id': self.student.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['progress'], 50.0)
+
+    def test_unrelated_teacher_is_refused(self):
+        self.client.login(username='other', password='pass')
+        response = self.client.get(self.url, {'student_id': self.student.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_unchanged_version_is_not_modified(self):
+        self.client.login(username='teacher', password='pass')
+        version = self.client.get(self.url, {'student_id': self.student.id}).json()['version']
+        response = self.client.get(self.url, {'student_id': self.student.id, 'since': version})
+        self.assertEqual(response.status_code, 304)
+
+
+class BulkProgressTests(TestCase):
+    """/api/progress/bulk/ upserts"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+        self.math = Subject.objects.create(name='Math', code='MATH')
+        self.science = Subject.objects.create(name='Science', code='SCI')
+        self.assignment = Assignment.objects.create(
+            title='Sums', subject=self.math, created_by=self.teacher,
+            due_date=timezone.now() + datetime.timedelta(days=7)
+        )
+        self.client.login(username='teacher', password='pass')
+        self.url = reverse('bulk_update_student_progress')
+
+    def post(self, rows):
+        return self.client.post(self.url, json.dumps(rows), content_type='application/json').json()
+
+    def test_unknown_subject_is_reported_and_other_rows_saved(self):
+        result = self.post([
+            {'student_id': self.student.id, 'subject_id': 999999, 'progress_percentage': 10},
+            {'student_id': self.student.id, 'subject_id': self.science.id, 'progress_percentage': 20},
+        ])
+        self.assertTrue(result['success'])
+        self.assertEqual(result['errors'], [{'index': 0, 'error': 'Subject not found'}])
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(StudentProgress.objects.filter(student=self.student).count(), 1)
+
+    def test_existing_assignment_row_is_updated_not_created(self):
+        StudentProgress.objects.create(
+            student=self.student, subject=self.math, assignment=self.assignment, completed=True
+        )
+        goal = StudentGoal.objects.create(
+            student=self.student, title='Two assignments', goal_type='assignment', target_value=2
+        )
+        result = self.post([{
+            'student_id': self.student.id, 'subject_id': self.science.id,
+            'assignment_id': self.assignment.id, 'completed': True,
+        }])
+        self.assertEqual((result['created'], result['updated']), (0, 1))
+        progress = StudentProgress.objects.get(student=self.student, assignment=self.assignment)
+        self.assertEqual(progress.subject_id, self.science.id)
+        goal.refresh_from_db()
+        self.assertFalse(goal.completed)
+
+
+class BatchAssignmentProgressTests(TestCase):
+    """Grading many students of one assignment at once"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.students = [make_student(self.teacher, f"S{number}") for number in range(4)]
+        self.stranger = make_student(User.objects.create_user('other', password='pass'), 'S9')
+        self.assignment = Assignment.objects.create(
+            title='Sums', subject=Subject.objects.create(name='Math', code='MATH'), created_by=self.teacher,
+            due_date=timezone.now() + datetime.timedelta(days=7)
+        )
+        AssignmentStudent.objects.create(assignment=self.assignment, student=self.students[0], score=40)
+
+    def test_bulk_apply_progress_upserts_in_a_fixed_number_of_queries(self):
+        updates = {
+            student.id: {'completed': True, 'score': 90, 'time_spent': 12} for student in self.students[:2]
+        }
+        updates[self.students[2].id] = {'completed': False}
+        with self.assertNumQueries(5):
+            created, updated = AssignmentStudent.bulk_apply_progress(self.assignment, updates)
+        self.assertEqual((created, updated), (2, 1))
+
+        rows = {row.student_id: row for row in AssignmentStudent.objects.filter(assignment=self.assignment)}
+        self.assertEqual(set(rows), {student.id for student in self.students[:3]})
+        self.assertTrue(rows[self.students[0].id].completed)
+        self.assertEqual(rows[self.students[0].id].score, 90)
+        self.assertEqual(rows[self.students[1].id].time_spent, 12)
+        self.assertIsNotNone(rows[self.students[1].id].completion_date)
+        self.assertFalse(rows[self.students[2].id].completed)
+        self.assertIsNone(rows[self.students[2].id].completion_date)
+
+    def test_view_grades_own_students_and_reports_the_rest(self):
+        self.client.login(username='teacher', password='pass')
+        response = self.client.post(
+            reverse('batch_update_assignment_progress', args=[self.assignment.pk]),
+            json.dumps({'updates': [
+                {'student_id': self.students[0].id, 'completed': 'true', 'score': '75.5'},
+                {'student_id': self.students[3].id, 'time_spent': 20},
+                {'student_id': self.stranger.id, 'completed': True},
+                {'score': 10},
+            ]}),
+            content_type='application/json'
+        ).json()
+
+        self.assertTrue(response['success'])
+        self.assertEqual((response['created'], response['updated']), (1, 1))
+        self.assertEqual(response['errors'], [
+            {'index': 3, 'error': 'Invalid progress values'},
+            {'student_id': self.stranger.id, 'error': 'Student not found'},
+        ])
+        self.assertEqual(
+            AssignmentStudent.objects.get(assignment=self.assignment, student=self.students[0]).score, Decimal('75.5')
+        )
+        self.assertEqual(AssignmentStudent.objects.get(student=self.students[3]).time_spent, 20)
+        self.assertFalse(AssignmentStudent.objects.filter(student=self.stranger).exists())
+
+
+class SingleProgressTests(TestCase):
+    """Progress updates for one student from the student page"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.other_teacher = User.objects.create_user('other', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+        self.math = Subject.objects.create(name='Math', code='MATH')
+        self.other_assignment = Assignment.objects.create(
+            title='Not mine', subject=self.math, created_by=self.other_teacher,
+            due_date=timezone.now() + datetime.timedelta(days=7)
+        )
+        self.client.login(username='teacher', password='pass')
+        self.url = reverse('update_progress', args=[self.student.id])
+
+    def post(self, **data):
+        return self.client.post(
+            self.url, {'progress_percentage': 40, **data}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+
+    def test_subject_progress_is_saved(self):
+        response = self.post(subject_id=self.math.id)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(StudentProgress.objects.get(student=self.student).progress_percentage, 40)
+
+    def test_unknown_subject_is_rejected(self):
+        response = self.post(subject_id=999999)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Subject not found')
+
+    def test_another_teachers_assignment_is_rejected(self):
+        response = self.post(assignment_id=self.other_assignment.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Assignment not found')
+        self.assertFalse(StudentProgress.objects.exists())
+
+
+class TargetGradeTests(TestCase):
+    """Assignments targeted at grades and fanned out to their students"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.other_teacher = User.objects.create_user('other', password='pass')
+        self.third = make_student(self.teacher, 'S1', '3')
+        self.fourth = make_student(self.teacher, 'S2', '4')
+        make_student(self.teacher, 'S3', '5')
+        make_student(self.teacher, 'S4', '3', is_active=False)
+        make_student(self.other_teacher, 'S5', '3')
+        self.assignment = Assignment.objects.create(
+            title='Sums', subject=Subject.objects.create(name='Math', code='MATH'), created_by=self.teacher,
+            due_date=timezone.now() + datetime.timedelta(days=7)
+        )
+
+    def test_fan_out_reaches_active_students_in_the_targeted_grades_once(self):
+        self.assertEqual(self.assignment.set_target_grades(['3', 'Grade 4', '3']), ['3', '4'])
+        self.assertEqual(self.assignment.fan_out_to_students(), 2)
+        self.assertEqual(self.assignment.fan_out_to_students(), 0)
+        self.assertEqual(
+            set(AssignmentStudent.objects.filter(assignment=self.assignment).values_list('student_id', flat=True)),
+            {self.third.id, self.fourth.id}
+        )
+
+    def test_invalid_grades_leave_the_targets_alone(self):
+        self.assignment.set_target_grades(['3'])
+        with self.assertRaises(ValueError):
+            self.assignment.set_target_grades(['Grade 99', ''])
+        self.assertEqual(self.assignment.get_target_grades(), ['3'])
+
+        self.client.login(username='teacher', password='pass')
+        response = self.client.post(
+            reverse('assign_assignment_to_grades', args=[self.assignment.pk]),
+            {'target_grade_levels': ['Grade 99']}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.assignment.get_target_grades(), ['3'])
+        self.assertFalse(AssignmentStudent.objects.exists())
+
+    def test_backfill_migration_splits_the_grade_list(self):
+        migration = importlib.import_module('base.migrations.0008_assignmenttargetgrade')
+        Assignment.objects.filter(pk=self.assignment.pk).update(target_grade_levels='Grade 3, 4,bogus,3')
+        untargeted = Assignment.objects.create(
+            title='Reading', subject=self.assignment.subject, created_by=self.teacher,
+            due_date=self.assignment.due_date
+        )
+
+        migration.copy_target_grade_levels(apps, None)
+        self.assertEqual(sorted(self.assignment.get_target_grades()), ['3', '4'])
+        self.assertEqual(untargeted.get_target_grades(), [])
+        self.assertEqual(AssignmentTargetGrade.objects.count(), 2)
+
+
+class SubjectBreakdownTests(TestCase):
+    """Per-subject progress summaries on the student pages"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+        self.math = Subject.objects.create(name='Mathematics', code='MATH')
+        self.science = Subject.objects.create(name='Science', code='SCI')
+        Subject.objects.create(name='Reading', code='READ')
+        for subject, percentage, completed in (
+            (self.math, 40, True), (self.math, 80, False), (self.science, 100, True),
+        ):
+            StudentProgress.objects.create(
+                student=self.student, subject=subject, progress_percentage=percentage, completed=completed
+            )
+        StudentProgress.objects.create(
+            student=make_student(self.teacher, 'S2'), subject=self.math, progress_percentage=10
+        )
+
+    def test_breakdown_matches_hand_computed_aggregates(self):
+        with self.assertNumQueries(2):
+            breakdown = views.get_student_subject_breakdown(self.student)
+        self.assertEqual(
+            [(row['name'], row['progress'], row['completed'], row['total']) for row in breakdown],
+            [('Mathematics', 60, 1, 2), ('Science', 100, 1, 1)]
+        )
+        self.assertEqual(breakdown[0]['subject'], self.math)
+        self.assertEqual(breakdown[0]['color'], views.get_subject_color('Mathematics'))
+
+        # The subject table is cached after the first call
+        with self.assertNumQueries(1):
+            limited = views.get_student_subject_breakdown(self.student, limit=1)
+        self.assertEqual([row['name'] for row in limited], ['Mathematics'])
+
+    def test_subject_table_is_rebuilt_when_a_subject_is_missing(self):
+        self.assertEqual(
+            [row['name'] for row in views.get_subject_table().values()], ['Mathematics', 'Science', 'Reading']
+        )
+        # Bulk inserts skip Subject.save(), so the cached table goes stale
+        art = Subject.objects.bulk_create([Subject(name='Arts', code='ART')])[0]
+        StudentProgress.objects.create(student=self.student, subject=art, progress_percentage=30)
+
+        breakdown = views.get_student_subject_breakdown(self.student)
+        self.assertEqual([row['name'] for row in breakdown], ['Mathematics', 'Science', 'Arts'])
+        self.assertIn(art.id, views.get_subject_table())
+
+
+class GoalTests(TestCase):
+    """Tracked goals and the goal update endpoint"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+        self.math = Subject.objects.create(name='Math', code='MATH')
+        self.client.login(username='teacher', password='pass')
+
+    def make_goal(self, goal_type, target_value, **fields):
+        return StudentGoal.objects.create(
+            student=self.student, title=goal_type, goal_type=goal_type, target_value=target_value, **fields
+        )
+
+    def test_new_goal_ignores_earlier_progress(self):
+        StudentProgress.objects.create(student=self.student, subject=self.math, completed=True, time_spent=90)
+        goal = self.make_goal('subject', 1, subject=self.math)
+        self.assertEqual(goal.current_value, 0)
+        self.assertFalse(goal.completed)
+
+    def test_progress_after_creation_counts_once(self):
+        goal = self.make_goal('time', 60)
+        StudentProgress.objects.create(student=self.student, subject=self.math, time_spent=45)
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_value, 45)
+        StudentGoal.reconcile(StudentGoal.objects.filter(pk=goal.pk))
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_value, 45)
+
+    def test_time_goal_counts_only_minutes_added_after_it_was_set(self):
+        progress = StudentProgress.objects.create(student=self.student, subject=self.math, time_spent=30)
+        goal = self.make_goal('time', 60)
+        self.assertEqual(goal.baseline_minutes, 30)
+        progress = StudentProgress.objects.get(pk=progress.pk)
+        progress.time_spent = 40
+        progress.save()
+        session = LearningSession.objects.create(
+            student=self.student, subject=self.math, duration_minutes=15, created_by=self.teacher
+        )
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_value, 25)
+        StudentGoal.reconcile(StudentGoal.objects.filter(pk=goal.pk))
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_value, 25)
+        session.duration_minutes = 50
+        session.save()
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_value, 60)
+        self.assertTrue(goal.completed)
+
+    def test_completed_string_is_parsed(self):
+        goal = self.make_goal('skill', 1)
+        url = reverse('update_goal_progress', args=[goal.id])
+        response = self.client.post(url, json.dumps({'completed': 'false'}), content_type='application/json')
+        self.assertFalse(response.json()['completed'])
+        response = self.client.post(url, json.dumps({'completed': 'true'}), content_type='application/json')
+        self.assertTrue(response.json()['completed'])
+        response = self.client.post(url, json.dumps({'completed': 'maybe'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class StreakTests(TestCase):
+    """Daily streak updates and the gaps-and-islands recompute"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+        self.today = datetime.date(2026, 3, 10)
+
+    def test_record_activity_continues_and_restarts(self):
+        day = datetime.timedelta(days=1)
+        self.assertTrue(LearningStreak.record_activity(self.student.id, self.today - 3 * day))
+        self.assertTrue(LearningStreak.record_activity(self.student.id, self.today - 2 * day))
+        self.assertFalse(LearningStreak.record_activity(self.student.id, self.today - 2 * day))
+        self.assertTrue(LearningStreak.record_activity(self.student.id, self.today))
+        streak = LearningStreak.objects.get(student=self.student)
+        self.assertEqual((streak.current_streak, streak.longest_streak), (1, 2))
+
+    def add_activity(self, *days_ago):
+        for days in days_ago:
+            interaction = VoiceInteraction.objects.create(
+                student=self.student, voice_command='hi', system_response='hello'
+            )
+            moment = timezone.make_aware(datetime.datetime.combine(
+                self.today - datetime.timedelta(days=days), datetime.time(12)
+            ))
+            VoiceInteraction.objects.filter(pk=interaction.pk).update(timestamp=moment)
+
+    def test_activity_runs(self):
+        # Runs of 3 (ending yesterday) and 4 days, with a repeat day
+        self.add_activity(1, 2, 3, 3, 6, 7, 8, 9)
+        runs = LearningStreak.activity_runs(self.today)
+        self.assertEqual(runs[self.student.id][:2], (3, 4))
+
+    def test_run_ending_before_yesterday_is_not_current(self):
+        self.add_activity(3, 4)
+        LearningStreak.recompute_all(self.today)
+        streak = LearningStreak.objects.get(student=self.student)
+        self.assertEqual((streak.current_streak, streak.longest_streak), (0, 2))
+
+
+class AchievementTests(TestCase):
+    """Rule-based achievements awarded in bulk and anchored later"""
+
+    def setUp(self):
+        teacher = User.objects.create_user('teacher', password='pass')
+        subject = Subject.objects.create(name='Math', code='MATH')
+        self.achiever = make_student(teacher, 'S1')
+        self.learner = make_student(teacher, 'S2')
+        self.inactive = make_student(teacher, 'S3', is_active=False)
+        for student, percentage in ((self.achiever, 80), (self.learner, 20), (self.inactive, 90)):
+            StudentProgress.objects.create(student=student, subject=subject, progress_percentage=percentage)
+        for command in ('hello', 'what is a noun'):
+            VoiceInteraction.objects.create(student=self.achiever, voice_command=command, system_response='Hi')
+        self.half_way = Achievement.objects.create(
+            name='Half way', description='', requirement='', rule_metric='progress', rule_threshold=50
+        )
+        Achievement.objects.create(
+            name='Chatty', description='', requirement='', rule_metric='voice_count', rule_threshold=2
+        )
+        Achievement.objects.create(name='Hand picked', description='', requirement='')
+
+    def test_awards_are_made_once(self):
+        self.assertEqual(evaluate_achievements(chunk_size=1), 2)
+        self.assertEqual(evaluate_achievements(), 0)
+        self.assertEqual(
+            set(StudentAchievement.objects.values_list('student__student_id', 'achievement__name')),
+            {('S1', 'Half way'), ('S1', 'Chatty')}
+        )
+
+        StudentProgress.objects.filter(student=self.learner).update(progress_percentage=60)
+        self.assertEqual(evaluate_achievements(student_ids=[self.learner.id, self.inactive.id]), 1)
+        award = StudentAchievement.objects.get(student=self.learner)
+        self.assertEqual(award.achievement, self.half_way)
+        self.assertEqual(award.data_hash, StudentAchievement.calculate_achievement_hash(self.half_way, award.earned_date))
+
+    def test_pending_awards_are_anchored_until_recorded(self):
+        evaluate_achievements()
+        record = mock.patch(
+            'base.models.blockchain_service.record_student_progress',
+            return_value={'success': False, 'error': 'offline'}
+        )
+        with record:
+            self.assertEqual(StudentAchievement.anchor_pending(), 0)
+        self.assertEqual(StudentAchievement.objects.filter(blockchain_record__isnull=True).count(), 2)
+
+        transactions = iter(range(2))
+        with record as record_progress:
+            record_progress.side_effect = lambda *args: {
+                'success': True, 'transaction_hash': f"0x{next(transactions)}", 'block_number': 7,
+            }
+            self.assertEqual(StudentAchievement.anchor_pending(limit=1), 1)
+            self.assertEqual(StudentAchievement.anchor_pending(), 1)
+            self.assertEqual(StudentAchievement.anchor_pending(), 0)
+        self.assertEqual(record_progress.call_count, 2)
+        self.assertFalse(StudentAchievement.objects.filter(blockchain_record__isnull=True).exists())
+        self.assertEqual(
+            sorted(StudentAchievement.objects.values_list('blockchain_record__transaction_hash', flat=True)),
+            ['0x0', '0x1']
+        )
+
+
+@override_settings(VOICE_CONTEXT_CACHE='default')
+class VoiceContextCacheTests(TestCase):
+    """Bulk writes, which send no signals, still drop cached voice contexts"""
+
+    def setUp(self):
+        caches['default'].clear()
+        teacher = User.objects.create_user('teacher', password='pass')
+        self.subject = Subject.objects.create(name='Math', code='MATH')
+        self.student = make_student(teacher, 'S1')
+        self.bystander = make_student(teacher, 'S2')
+
+    def cached(self, student):
+        return caches['default'].get(Student.VOICE_CONTEXT_KEY.format(student.id)) is not None
+
+    def assert_invalidates(self, change):
+        for student in (self.student, self.bystander):
+            views.get_student_context_data(student)
+            self.assertTrue(self.cached(student))
+        change()
+        self.assertFalse(self.cached(self.student))
+        self.assertTrue(self.cached(self.bystander))
+
+    def test_context_is_cached_with_current_progress(self):
+        StudentProgress.objects.create(student=self.student, subject=self.subject, progress_percentage=40)
+        views.get_student_context_data(self.student)
+        with self.assertNumQueries(0):
+            context = views.get_student_context_data(self.student)
+        self.assertEqual(context['progress']['avg_progress'], 40)
+
+    def test_bulk_progress_upsert(self):
+        self.assert_invalidates(lambda: StudentProgress.bulk_upsert([
+            {'student_id': self.student.id, 'subject_id': self.subject.id, 'progress_percentage': 70},
+        ]))
+        self.assertEqual(views.get_student_context_data(self.student)['progress']['avg_progress'], 70)
+
+    def test_streak_activity_and_recompute(self):
+        tomorrow = timezone.now().date() + datetime.timedelta(days=1)
+        self.assert_invalidates(lambda: LearningStreak.record_activity(self.student.id, tomorrow))
+
+        # A full recompute rewrites every streak row, so every context goes
+        VoiceInteraction.objects.create(student=self.student, voice_command='hi', system_response='Hello')
+        for student in (self.student, self.bystander):
+            views.get_student_context_data(student)
+        LearningStreak.recompute_all()
+        self.assertFalse(self.cached(self.student))
+        self.assertFalse(self.cached(self.bystander))
+
+    def test_bulk_achievement_awards(self):
+        StudentProgress.objects.create(student=self.student, subject=self.subject, progress_percentage=90)
+        Achievement.objects.create(
+            name='Half way', description='', requirement='', rule_metric='progress', rule_threshold=50
+        )
+        self.assert_invalidates(evaluate_achievements)
+
+
+class LeaderboardTests(TestCase):
+    """Rank shifts on the per-teacher leaderboards"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.math = Subject.objects.create(name='Math', code='MATH')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students = [make_student(self.teacher, f"S{number}") for number in range(3)]
+        for student, progress in zip(self.students, (90, 60, 30)):
+            self.set_progress(student, progress)
+
+    def set_progress(self, student, progress):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.objects.update_or_create(
+                student=student, subject=self.math, defaults={'progress_percentage': progress}
+            )
+
+    def ranks(self):
+        entries = LeaderboardEntry.objects.filter(teacher=self.teacher)
+        return {entry.student_id: entry.teacher_rank for entry in entries}
+
+    def test_initial_ranks(self):
+        first, second, third = self.students
+        self.assertEqual(self.ranks(), {first.id: 1, second.id: 2, third.id: 3})
+
+    def test_moving_up_shifts_the_students_passed(self):
+        first, second, third = self.students
+        self.set_progress(third, 75)
+        self.assertEqual(self.ranks(), {first.id: 1, second.id: 3, third.id: 2})
+
+    def test_ties_share_a_rank(self):
+        first, second, third = self.students
+        self.set_progress(third, 60)
+        self.assertEqual(self.ranks(), {first.id: 1, second.id: 2, third.id: 2})
+
+    def test_queryset_deletes_leave_no_gaps(self):
+        first, second, third = self.students
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.filter(pk=first.pk).delete()
+        self.assertEqual(self.ranks(), {second.id: 1, third.id: 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            StudentProgress.objects.filter(student=second).delete()
+        self.assertEqual(self.ranks(), {second.id: 2, third.id: 1})
+
+
+@override_settings(VOICE_WRITE_BEHIND=False, VOICE_CONVERSATION_CACHE='default', VOICE_RETRIEVAL_CACHE='default')
+class AsyncVoiceTests(TransactionTestCase):
+    """The ASGI voice endpoint keeps cache and database work off the event loop"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+
+    async def test_fallback_answer_without_providers(self):
+        await self.async_client.aforce_login(self.teacher)
+        with mock.patch.object(views, 'get_provider_candidates', return_value=[]):
+            response = await self.async_client.post(
+                reverse('voice_assistant_async'),
+                json.dumps({'message': 'what is seven plus five'}),
+                content_type='application/json'
+            )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['response'], '7 plus 5 is 12.')
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """Answers shared between students through the response cache"""
+
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.key = self.cache.make_key('What is photosynthesis?', '3')
+
+    def test_name_placeholder_round_trip(self):
+        self.cache.set(self.key, 'Also, Al, plants make food. Great question Al!', 'Al')
+        self.assertEqual(
+            self.cache.get(self.key, 'Tom'),
+            'Also, Tom, plants make food. Great question Tom!'
+        )
+
+    def test_name_inside_words_is_kept(self):
+        self.cache.set(self.key, 'Tomorrow we can learn more, Tom.', 'Tom')
+        self.assertEqual(self.cache.get(self.key, 'Ann'), 'Tomorrow we can learn more, Ann.')
+
+    def test_contractions_expand_only_whole_words(self):
+        self.assertEqual(normalize_message("What's a habit's shape?"), 'what is a habit s shape')
+
+    def test_shared_reply_has_no_progress_in_prompt(self):
+        student_context = {
+            'student_name': 'Al', 'grade_level': '3',
+            'progress': {'avg_progress': 42, 'completed': 7}, 'streak': {'current_streak': 9},
+        }
+        personal = views.render_voice_system_prompt(student_context)
+        shared = views.render_voice_system_prompt(views.shared_reply_context(student_context, self.key))
+        self.assertIn('42', personal)
+        self.assertNotIn('42', shared)
+        self.assertNotIn('Learning Streak', shared)
+
+
+class VoiceLogQueueTests(TestCase):
+    """Write-behind voice logging"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.student = make_student(self.teacher, 'S1')
+
+    @override_settings(VOICE_WRITE_BEHIND=False)
+    def test_synchronous_write_does_not_anchor(self):
+        with mock.patch.object(VoiceInteraction, 'anchor_pending') as anchor_pending:
+            voice_log_queue.submit(self.student.id, 'what is a noun', 'A naming word.')
+        anchor_pending.assert_not_called()
+        self.assertEqual(VoiceInteraction.objects.filter(student=self.student).count(), 1)
+        self.assertEqual(LearningStreak.objects.get(student=self.student).current_streak, 1)
+
+    def write_journal(self, name):
+        path = os.path.join(settings.VOICE_WRITE_BEHIND_DIR, f'voice-{name}.jsonl')
+        entry = {
+            'student_id': self.student.id, 'voice_command': 'what is a verb', 'system_response': 'A doing word.',
+            'timestamp': timezone.now().isoformat(),
+        }
+        with open(path, 'w') as journal:
+            journal.write(json.dumps(entry) + '\n')
+        return path
+
+    def test_journals_of_dead_processes_are_replayed(self):
+        path = self.write_journal('999991')
+        open(VoiceLogQueue.lock_path(path), 'w').close()
+        VoiceLogQueue().replay_orphaned_journals()
+        self.assertEqual(VoiceInteraction.objects.filter(student=self.student).count(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(VoiceLogQueue.lock_path(path)))
+
+    def test_journals_of_running_processes_are_left_alone(self):
+        path = self.write_journal('999992')
+        with open(VoiceLogQueue.lock_path(path), 'a+') as lock_file:
+            self.assertTrue(try_lock(lock_file))
+            VoiceLogQueue().replay_orphaned_journals()
+        self.assertFalse(VoiceInteraction.objects.exists())
+        self.assertTrue(os.path.exists(path))
+
+
+@override_settings(VOICE_CONVERSATION_CACHE='default')
+class ConversationStoreTests(SimpleTestCase):
+    """Server-side conversations shared between worker processes"""
+
+    def test_workers_see_each_others_turns(self):
+        first_worker, second_worker = ConversationStore(), ConversationStore()
+        conversation_id = first_worker.resolve(None)
+        first_worker.append(1, conversation_id, 'What is a noun?', 'A naming word.')
+        second_worker.get(1, conversation_id)
+        first_worker.append(1, conversation_id, 'Give an example', 'Dog is a noun.')
+        second_worker.append(1, conversation_id, 'And a verb?', 'Run is a verb.')
+        history = first_worker.get(1, conversation_id)['history']
+        self.assertEqual([exchange['user'] for exchange in history], ['What is a noun?', 'Give an example', 'And a verb?'])
+
+    @override_settings(VOICE_CONVERSATION_LOCAL_MAX=10)
+    def test_local_copies_are_checked_against_the_cache(self):
+        first_worker, second_worker = ConversationStore(), ConversationStore()
+        conversation_id = first_worker.resolve(None)
+        first_worker.append(1, conversation_id, 'What is a noun?', 'A naming word.')
+        self.assertEqual(len(second_worker.get(1, conversation_id)['history']), 1)
+        first_worker.append(1, conversation_id, 'Give an example', 'Dog is a noun.')
+        self.assertEqual(len(second_worker.get(1, conversation_id)['history']), 2)
+        with mock.patch.object(second_worker, '_load') as load:
+            self.assertEqual(len(second_worker.get(1, conversation_id)['history']), 2)
+        load.assert_not_called()
+
+    def test_concurrent_turns_are_all_kept(self):
+        workers = [ConversationStore(), ConversationStore()]
+        conversation_id = workers[0].resolve(None)
+
+        def talk(worker, number):
+            for turn in range(4):
+                worker.append(1, conversation_id, f"question {number}.{turn}", 'answer')
+
+        threads = [threading.Thread(target=talk, args=(workers[number % 2], number)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(workers[0].get(1, conversation_id)['history']), 16)
+
+
+@override_settings(VOICE_CONVERSATION_CACHE='default', VOICE_SUMMARY_THRESHOLD=80, VOICE_SUMMARY_KEEP_TURNS=2)
+class ConversationSummarizerTests(SimpleTestCase):
+    """Older turns folded into a running summary carried in the prompt"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.store = ConversationStore()
+        self.summarizer = ConversationSummarizer(self.store)
+        self.addCleanup(self.summarizer._executor.shutdown)
+        self.conversation_id = self.store.resolve(None)
+
+    def talk(self, *questions):
+        state = None
+        for question in questions:
+            state = self.store.append(1, self.conversation_id, question, 'Here is a short explanation for you.')
+        return state
+
+    def test_short_conversations_are_not_folded(self):
+        state = self.talk('What is a noun?', 'What is a verb?', 'What is an adjective?')
+        self.assertFalse(self.summarizer.schedule(1, self.conversation_id, state))
+
+    def test_fold_keeps_recent_turns_and_summarizes_the_rest(self):
+        state = self.talk('What is a noun?', 'What is a verb?', 'What is an adjective?', 'What is an adverb?')
+        with mock.patch('base.conversations.llm_clients.get_groq_client', return_value=None):
+            self.assertTrue(self.summarizer.schedule(1, self.conversation_id, state))
+            self.summarizer._executor.shutdown(wait=True)
+
+        state = self.store.get(1, self.conversation_id)
+        self.assertEqual(state['summary'], 'The student asked about: What is a noun; What is a verb.')
+        self.assertEqual([exchange['user'] for exchange in state['history']], ['What is an adjective?', 'What is an adverb?'])
+
+        messages = views.build_conversation_messages(
+            'And a pronoun?', {'system_prompt': 'You are a tutor.'}, self.store.context(1, self.conversation_id)
+        )
+        self.assertEqual(messages[0], {
+            'role': 'system',
+            'content': 'You are a tutor.\n\nEarlier in this conversation: ' + state['summary'],
+        })
+        self.assertEqual(
+            [message['content'] for message in messages[1::2]], ['What is an adjective?', 'What is an adverb?', 'And a pronoun?']
+        )
+
+    def test_one_fold_at_a_time_per_conversation(self):
+        state = self.talk('What is a noun?', 'What is a verb?', 'What is an adjective?', 'What is an adverb?')
+        with mock.patch.object(self.summarizer, '_executor') as executor:
+            self.assertTrue(self.summarizer.schedule(1, self.conversation_id, state))
+            self.assertFalse(self.summarizer.schedule(1, self.conversation_id, state))
+        self.assertEqual(executor.submit.call_count, 1)
+
+    def test_summary_comes_from_the_model_when_available(self):
+        client = mock.MagicMock()
+        client.chat.completions.create.return_value.choices = [mock.Mock(message=mock.Mock(content=' Nouns and verbs. '))]
+        with mock.patch('base.conversations.llm_clients.get_groq_client', return_value=client), \
+                mock.patch('base.conversations.model_catalog.get_models', return_value=['small']):
+            summary = self.summarizer.summarize('', [{'user': 'What is a noun?', 'assistant': 'A naming word.'}])
+        self.assertEqual(summary, 'Nouns and verbs.')
+        prompt = client.chat.completions.create.call_args.kwargs['messages'][1]['content']
+        self.assertIn('Student: What is a noun?\nAssistant: A naming word.', prompt)
+
+
+class AdmissionKeyTests(TestCase):
+    """Which rate-limit buckets a voice request draws from"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', password='pass')
+        self.child = User.objects.create_user('child', password='pass')
+        self.first = make_student(self.teacher, 'S1')
+        self.student = make_student(self.teacher, 'S2', user_account=self.child, can_login=True)
+
+    def test_student_login_uses_own_student_and_teacher(self):
+        student = views.get_voice_student(self.child)
+        self.assertEqual(student, self.student)
+        self.assertEqual(views.admission_keys(student, self.child.pk), (f"student:{self.student.id}", self.teacher.pk))
+
+    def test_teacher_login_is_limited_as_the_teacher(self):
+        student = views.get_voice_student(self.teacher)
+        self.assertEqual(student, self.first)
+        self.assertEqual(views.admission_keys(student, self.teacher.pk), (f"user:{self.teacher.pk}", self.teacher.pk))
+
+    def test_students_share_their_teachers_bucket(self):
+        admission = AdmissionController()
+        with override_settings(VOICE_TEACHER_RATE=0, VOICE_TEACHER_BURST=1):
+            self.assertTrue(admission.admit(*views.admission_keys(self.student, self.child.pk)))
+            self.assertFalse(admission.admit(*views.admission_keys(self.first, self.teacher.pk)))
+
+
+@override_settings(VOICE_RETRIEVAL_CACHE='default')
+class CurriculumIndexTests(TestCase):
+    """Offline answers come only from lesson content that is on topic"""
+
+    def setUp(self):
+        self.index = CurriculumIndex()
+
+    def test_on_topic_questions_are_answered(self):
+        for query, title_word in (
+            ('tell me about fractions', 'fraction'),
+            ('what are the states of matter', 'solid'),
+            ('how do plants make food', 'plants'),
+            ('can you help me with fractions', 'fraction'),
+        ):
+            with self.subTest(query=query):
+                answer = self.index.best_answer(query, '3')
+                self.assertIsNotNone(answer)
+                self.assertIn(title_word, answer.lower())
+
+    def test_off_topic_questions_are_left_to_the_other_fallbacks(self):
+        for query in (
+            'I like football',
+            'why is the sky blue',
+            'how many legs does a spider have',
+            'can you help me',
+            'hello',
+        ):
+            with self.subTest(query=query):
+                self.assertIsNone(self.index.best_answer(query, '3'))
+
+    def test_tokenize_drops_filler_and_arithmetic(self):
+        self.assertEqual(tokenize('Can you tell me about the fractions?'), ['fraction'])
+        self.assertEqual(tokenize('what is 7 plus 5'), [])
+        self.assertEqual(tokenize('plus and minus signs'), ['plu', 'minu', 'sign'])
+
+    def test_bm25_ranks_the_closest_document_first(self):
+        index = BM25Index([
+            ({'title': 'plants'}, tokenize('plants make food from sunlight')),
+            ({'title': 'fractions'}, tokenize('fractions fractions numerator denominator')),
+            ({'title': 'halves'}, tokenize('a half is one of two equal parts, a fraction')),
+        ])
+        scores = index.scores(tokenize('fractions numerator'))
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        self.assertEqual([index.documents[number]['title'] for number in ranked], ['fractions', 'halves'])
+
+    def test_content_changed_during_a_build_is_picked_up_next_time(self):
+        documents = self.index.documents
+
+        def documents_changing():
+            built = documents()
+            self.index.invalidate()  # Content edited while the index was being built
+            return built
+
+        with mock.patch.object(self.index, 'documents', side_effect=documents_changing) as build:
+            self.index.ensure_loaded()
+            self.index.ensure_loaded()
+        self.assertEqual(build.call_count, 2)
+
+    def test_import_lesson_content_creates_updates_and_replaces(self):
+        content_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, content_dir, True)
+        path = os.path.join(content_dir, 'volcanoes.json')
+        entries = [
+            {'subject_area': 'science', 'grade_band': '3-5', 'question': 'What is a volcano?',
+             'answer': 'A volcano is an opening where melted rock comes out.', 'keywords': 'lava magma'},
+            {'subject_area': 'science', 'grade_band': '3-5', 'question': 'What is lava?',
+             'answer': 'Lava is melted rock on the surface.'},
+        ]
+        with open(path, 'w', encoding='utf-8') as content:
+            json.dump(entries, content)
+
+        call_command('import_lesson_content', path, stdout=mock.MagicMock())
+        self.assertEqual(LessonContent.objects.filter(source='volcanoes.json').count(), 2)
+        self.assertEqual(curriculum_index.search('volcano lava', '4')[0][1]['title'], 'What is a volcano?')
+
+        entries[0]['answer'] = 'A volcano is a mountain that lets out lava and ash.'
+        with open(path, 'w', encoding='utf-8') as content:
+            json.dump(entries[:1], content)
+
+        call_command('import_lesson_content', path, stdout=mock.MagicMock())
+        self.assertEqual(LessonContent.objects.filter(source='volcanoes.json').count(), 2)
+        call_command('import_lesson_content', path, replace=True, stdout=mock.MagicMock())
+        self.assertEqual(
+            list(LessonContent.objects.filter(source='volcanoes.json').values_list('question', 'answer')),
+            [('What is a volcano?', 'A volcano is a mountain that lets out lava and ash.')]
+        )
+        self.assertEqual(
+            [document['answer'] for _, document in curriculum_index.search('volcano lava', '4')],
+            ['A volcano is a mountain that lets out lava and ash.']
+        )
+
+
+class ClassifyAnswerTests(SimpleTestCase):
+    """Local grading of replies to a question the assistant asked"""
+
+    def test_requests_and_greetings_are_not_graded(self):
+        for reply in ('can you repeat the question', 'I need help', 'say that again', 'tell me a story', 'hello'):
+            for expected in ('12', 'a naming word'):
+                with self.subTest(reply=reply, expected=expected):
+                    self.assertIsNone(classify_answer(reply, expected))
+
+    def test_numeric_answers(self):
+        self.assertEqual(classify_answer('twelve', '12'), 'correct')
+        self.assertEqual(classify_answer('seven plus five is twelve', '12'), 'correct')
+        self.assertEqual(classify_answer('um, 13', '12'), 'incorrect')
+        self.assertIsNone(classify_answer('a naming word', '12'))
+
+    def test_word_answers(self):
+        self.assertEqual(classify_answer('a naming word', 'a naming word'), 'correct')
+        self.assertEqual(classify_answer('verb', 'noun'), 'incorrect')
+        self.assertIsNone(classify_answer('five', 'noun'))
+        self.assertIsNone(classify_answer('I like football and I am happy today', 'noun'))
+
+    def test_negated_numbers_are_not_graded(self):
+        self.assertIsNone(classify_answer("it's not twelve", '12'))
+        self.assertIsNone(classify_answer("isn't it twelve", '12'))
+        self.assertIsNone(classify_answer('not a noun', 'noun'))
+
+    def test_not_knowing_is_incorrect(self):
+        self.assertEqual(classify_answer("I don't know", '12'), 'incorrect')
+
+
+@override_settings(VOICE_CONVERSATION_CACHE='default')
+class FollowUpTests(SimpleTestCase):
+    """Speculative follow-ups: prepared while a question is spoken, served on a clear answer"""
+
+    def setUp(self):
+        patcher = mock.patch.object(views, 'speculative_followups', SpeculativeFollowUps())
+        self.followups = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wait_until_ready(self, key):
+        for _ in range(100):
+            with self.followups._lock:
+                if self.followups._entries.get(key, {}).get('status') == 'ready':
+                    return
+            time.sleep(0.01)
+        self.fail('Follow-up was never prepared')
+
+    def test_word_questions_are_raced_like_replies(self):
+        reply = '{"expected_answer": "noun", "correct": "Well done!", "incorrect": "It is a noun."}'
+        with mock.patch.object(views, 'get_groq_client', return_value=object()), \
+                mock.patch.object(views, 'get_current_groq_models', return_value=['model-a', 'model-b', 'model-c']), \
+                mock.patch.object(views.provider_racer, 'race', return_value=(reply, 'groq:model-a')) as race, \
+                mock.patch.object(views.conversation_store, 'context', return_value=[]), \
+                mock.patch.object(self.followups, 'schedule') as schedule:
+            views.prepare_follow_ups(None, 1, 'conversation', 'What do we call a naming word?')
+            result = schedule.call_args[0][1]()
+
+        candidates = race.call_args[0][0]
+        self.assertEqual([candidate.name for candidate in candidates], ['groq:model-a', 'groq:model-b'])
+        self.assertEqual(result['incorrect'], 'It is a noun.')
+
+    def test_no_model_call_when_upstream_is_busy(self):
+        with mock.patch.object(views, 'get_groq_client', return_value=object()), \
+                mock.patch.object(views.voice_admission, 'acquire_spare', return_value=False), \
+                mock.patch.object(views.provider_racer, 'race') as race, \
+                mock.patch.object(self.followups, 'schedule') as schedule:
+            views.prepare_follow_ups(None, 1, 'conversation', 'What do we call a naming word?')
+            self.assertIsNone(schedule.call_args[0][1]())
+        race.assert_not_called()
+
+    def test_arithmetic_follow_up_is_served_without_a_model(self):
+        with mock.patch.object(views.provider_racer, 'race') as race:
+            views.prepare_follow_ups(None, 1, 'conversation', 'Good try! What is 7 plus 5?')
+            self.wait_until_ready((1, 'conversation'))
+            text, source = views.take_follow_up(1, 'conversation', 'twelve')
+        race.assert_not_called()
+        self.assertEqual(source, 'speculative:correct')
+        self.assertIn('7 plus 5 is 12', text)
+        stats = self.followups.stats()
+        self.assertEqual((stats['scheduled'], stats['hits'], stats['misses']), (1, 1, 0))
+        self.assertGreaterEqual(stats['saved_seconds'], 0)
+
+    def test_unclear_answer_is_a_miss(self):
+        views.prepare_follow_ups(None, 1, 'conversation', 'What is 7 plus 5?')
+        self.wait_until_ready((1, 'conversation'))
+        self.assertEqual(views.take_follow_up(1, 'conversation', "it's not twelve"), (None, None))
+        self.assertEqual(self.followups.stats()['misses'], 1)
+        # The entry is spent either way
+        self.assertEqual(views.take_follow_up(1, 'conversation', 'twelve'), (None, None))
+
+
+class SpokenMathTests(SimpleTestCase):
+    """Number words and local grading of spoken arithmetic answers"""
+
+    def test_parse_numbers(self):
+        for text, numbers in (
+            ('twenty three', [23]),
+            ('23', [23]),
+            ('twenty-three', [23]),
+            ('three four', [3, 4]),
+            ('twenty twelve', [20, 12]),
+            ('one hundred and five', [105]),
+            ('two thousand and one', [2001]),
+            ('three point five', [3.5]),
+            ('negative four', [-4]),
+            ('1,000', [1000]),
+            ('a thousand', [1000]),
+            ('a million', [1000000]),
+            ('a hundred and five', [105]),
+            ('incorrect', []),
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(parse_numbers(text), numbers)
+
+    def test_grade_uses_the_last_number_said(self):
+        self.assertEqual(grade('seven plus five is twelve', 12), 'correct')
+        self.assertEqual(grade('um, twelve', 12), 'correct')
+        self.assertEqual(grade('twelve, no, thirteen', 12), 'incorrect')
+        self.assertEqual(grade('three four', 4), 'correct')
+        self.assertIsNone(grade('incorrect', 12))
+
+    def test_parse_question(self):
+        question = parse_question('Great job! What is 9-4?')
+        self.assertEqual((question.expression, question.answer), ('9 minus 4', 5))
+        self.assertEqual(parse_question('Now, what is twenty-three plus seven?').answer, 30)
+        self.assertIsNone(parse_question('What is 8 divided by 0?'))
+        question = parse_question('What is 2 less than 5?')
+        self.assertEqual((question.expression, question.answer), ('5 minus 2', 3))
+        self.assertEqual(question.check('three'), 'correct')
+        self.assertIsNone(parse_question('What is 9 minus 4'))
+
+
+@override_settings(GROQ_API_KEY='test-key', GROQ_MODELS=['large', 'small', 'retired'])
+class LLMClientTests(SimpleTestCase):
+    """Shared LLM clients and the Groq model catalog"""
+
+    def setUp(self):
+        self.registry = LLMClientRegistry()
+        self.addCleanup(self.registry.close)
+
+    def test_clients_are_reused_until_closed(self):
+        client = self.registry.get_groq_client()
+        session = self.registry.get_session()
+        self.assertIs(self.registry.get_groq_client(), client)
+        self.assertIs(self.registry.get_session(), session)
+
+        self.registry.close()
+        self.assertIsNot(self.registry.get_groq_client(), client)
+        self.assertIsNot(self.registry.get_session(), session)
+        with override_settings(GROQ_API_KEY=''):
+            self.assertIsNone(LLMClientRegistry().get_groq_client())
+
+    def test_async_clients_belong_to_their_event_loop(self):
+        async def clients():
+            return self.registry.get_async_http_client(), self.registry.get_async_http_client()
+
+        first, again = asyncio.run(clients())
+        self.assertIs(first, again)
+        self.assertIsNot(asyncio.run(clients())[0], first)
+
+    def catalog(self, models=None, error=None):
+        client = mock.MagicMock()
+        if error:
+            client.models.list.side_effect = error
+        else:
+            client.models.list.return_value.data = [mock.Mock(id=model) for model in models]
+        registry = mock.Mock(get_groq_client=mock.Mock(return_value=client))
+        catalog = ModelCatalog(registry)
+        catalog._refreshed_at = time.monotonic()  # Fresh, so get_models starts no background refresh
+        return catalog, client
+
+    def test_catalog_filters_preferred_models(self):
+        catalog, _ = self.catalog(['small', 'large', 'whisper'])
+        self.assertEqual(catalog.get_models(), ['large', 'small', 'retired'])
+
+        self.assertTrue(catalog.refresh())
+        self.assertEqual(catalog.get_models(), ['large', 'small'])
+        catalog.mark_unavailable('large')
+        self.assertEqual(catalog.get_models(), ['small'])
+
+    def test_catalog_falls_back_to_preferred_models(self):
+        catalog, _ = self.catalog(['whisper'])
+        catalog.refresh()
+        self.assertEqual(catalog.get_models(), ['large', 'small', 'retired'])
+
+        catalog, _ = self.catalog(error=RuntimeError('down'))
+        self.assertFalse(catalog.refresh())
+        self.assertEqual(catalog.get_models(), ['large', 'small', 'retired'])
+
+    def test_stale_catalog_refreshes_in_the_background(self):
+        catalog, client = self.catalog(['small'])
+        catalog._refreshed_at = 0
+        release, refreshed = threading.Event(), threading.Event()
+        refresh = catalog.refresh
+
+        def slow_refresh():
+            release.wait(5)
+            refresh()
+            refreshed.set()
+
+        with mock.patch.object(catalog, 'refresh', side_effect=slow_refresh):
+            # Served from the last known catalog without waiting for the API
+            self.assertEqual(catalog.get_models(), ['large', 'small', 'retired'])
+            self.assertEqual(catalog.get_models(), ['large', 'small', 'retired'])
+            release.set()
+            self.assertTrue(refreshed.wait(5))
+        self.assertEqual(catalog.get_models(), ['small'])
+        self.assertEqual(client.models.list.call_count, 1)
+
+
+class OllamaContextTests(SimpleTestCase):
+    """Ollama context tokens are only reused by the conversation that produced them"""
+
+    def setUp(self):
+        self.ollama = OllamaProvider(registry=None)
+        self.history = [{'user': 'What is a noun?', 'assistant': 'A naming word.'}]
+        self.context = {'student_name': 'Amina', 'progress': {'avg_progress': 40}}
+
+    def remember(self, scope):
+        self.ollama.remember_context(scope, 'What is a noun?', 'A naming word.', [1, 2, 3])
+
+    def test_context_is_kept_per_conversation(self):
+        scope = views.ollama_scope(self.context, (1, 'conversation-a'))
+        self.remember(scope)
+        self.assertEqual(self.ollama.previous_context(scope, self.history), [1, 2, 3])
+        other = views.ollama_scope(self.context, (2, 'conversation-b'))
+        self.assertIsNone(self.ollama.previous_context(other, self.history))
+
+    def test_unscoped_calls_keep_nothing(self):
+        self.assertIsNone(views.ollama_scope(self.context, (1, None)))
+        self.remember(None)
+        self.assertIsNone(self.ollama.previous_context(None, self.history))
+        self.assertEqual(len(self.ollama._contexts), 0)
+
+    def test_updated_progress_starts_a_fresh_prompt(self):
+        self.remember(views.ollama_scope(self.context, (1, 'conversation-a')))
+        updated = {'student_name': 'Amina', 'progress': {'avg_progress': 55}}
+        scope = views.ollama_scope(updated, (1, 'conversation-a'))
+        self.assertIsNone(self.ollama.previous_context(scope, self.history))
+        prompt = views.build_ollama_prompt('What is a verb?', updated, self.history)
+        self.assertIn('Overall Progress: 55%', prompt)
+
+
+@override_settings(LLM_HEALTH_CACHE='default', LLM_BREAKER_FAILURES=3)
+class ProviderHealthTests(SimpleTestCase):
+    """Model failures and provider circuits"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.health = ProviderHealth()
+
+    def routed(self, *names):
+        return [candidate.name for candidate in self.health.route([ProviderCandidate(name, None) for name in names])]
+
+    def test_one_failing_model_leaves_the_provider_open(self):
+        for _ in range(3):
+            self.health.record('groq:retired', False, 0.1, RuntimeError('model overloaded'))
+        self.assertEqual(self.routed('groq:retired', 'groq:healthy'), ['groq:healthy'])
+
+    def test_several_failing_models_open_the_provider(self):
+        for model in ('a', 'b', 'c'):
+            self.health.record(f"groq:{model}", False, 0.1, RuntimeError('model overloaded'))
+        self.assertEqual(self.routed('groq:d', 'ollama'), ['ollama'])
+
+    def test_connection_errors_count_against_the_provider(self):
+        for model in ('a', 'a', 'b'):
+            self.health.record(f"groq:{model}", False, 0.1, requests.ConnectionError('refused'))
+        self.assertEqual(self.routed('groq:d'), [])
+
+    def test_calls_are_cut_off_at_the_slow_call_limit(self):
+        timeouts = []
+        candidate = ProviderCandidate('ollama', lambda timeout: timeouts.append(timeout) or 'answer')
+        racer = ProviderRacer(max_workers=2)
+        with override_settings(LLM_BREAKER_SLOW_CALL=3):
+            self.assertEqual(racer.race([candidate], deadline=8), ('answer', 'ollama'))
+        self.assertLessEqual(timeouts[0], 3)
+
+
+@override_settings(LLM_HEDGE_DELAY=0.2)
+class RaceAsyncTests(SimpleTestCase):
+    """Async hedged races cancel the requests that lost"""
+
+    def setUp(self):
+        self.health = mock.Mock(route=lambda candidates: list(candidates))
+        self.racer = ProviderRacer(health=self.health, max_workers=2)
+        self.cancelled = []
+
+    def slow(self, name, answer=None, seconds=5):
+        async def call(timeout):
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                self.cancelled.append(name)
+                raise
+            return answer
+        return ProviderCandidate(name, None, acall=call)
+
+    def fast(self, name, answer=None, error=None):
+        async def call(timeout):
+            if error:
+                raise error
+            return answer
+        return ProviderCandidate(name, None, acall=call)
+
+    def race(self, candidates, deadline=None):
+        async def run():
+            result = await self.racer.race_async(candidates, deadline)
+            await asyncio.sleep(0)  # Let cancelled losers unwind before the loop closes
+            return result
+        return asyncio.run(run())
+
+    def recorded(self):
+        return [(call.args[0], call.args[1]) for call in self.health.record.call_args_list]
+
+    def test_hedge_wins_and_the_slow_request_is_cancelled(self):
+        started = time.monotonic()
+        result = self.race([self.slow('groq', 'late'), self.fast('ollama', 'quick')])
+        self.assertEqual(result, ('quick', 'ollama'))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(self.cancelled, ['groq'])
+        # Losing the race is not a provider failure
+        self.assertEqual(self.recorded(), [('ollama', True)])
+
+    def test_failure_starts_the_next_candidate_at_once(self):
+        started = time.monotonic()
+        result = self.race([
+            self.fast('groq', error=RuntimeError('boom')), self.fast('ollama', 'answer'),
+            self.slow('huggingface', 'unused'),
+        ])
+        self.assertEqual(result, ('answer', 'ollama'))
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(self.recorded(), [('groq', False), ('ollama', True)])
+        self.assertEqual(self.cancelled, [])
+
+    def test_deadline_cancels_everything_still_running(self):
+        result = self.race(
+            [self.slow('groq', 'late'), self.slow('ollama', 'late'), ProviderCandidate('sync', lambda timeout: 'x')],
+            deadline=0.5
+        )
+        self.assertEqual(result, (None, None))
+        self.assertEqual(sorted(self.cancelled), ['groq', 'ollama'])
+
+
+class VoiceStreamTests(SimpleTestCase):
+    """NDJSON events of the streaming voice endpoint"""
+
+    def test_sentence_buffer_releases_complete_sentences(self):
+        buffer = SentenceBuffer()
+        self.assertEqual(buffer.feed('Hello there! How are'), ['Hello there!'])
+        self.assertEqual(buffer.feed(' you? I said "fine." Then'), ['How are you?', 'I said "fine."'])
+        self.assertEqual(buffer.feed(' 3.5 is'), [])
+        self.assertEqual(buffer.flush(), 'Then 3.5 is')
+        self.assertIsNone(buffer.flush())
+
+    def events(self, candidates, message='tell me a story'):
+        with mock.patch.object(views, 'get_provider_candidates', return_value=candidates), \
+                mock.patch.object(views, 'provider_racer', ProviderRacer(max_workers=2)):
+            lines = list(views.stream_voice_events(None, message, {'student_name': 'Amina'}, []))
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        return [json.loads(line) for line in lines]
+
+    def test_streamed_tokens_are_grouped_into_sentences(self):
+        candidate = ProviderCandidate(
+            'groq:test', None, stream=lambda timeout: iter(['Once upon', ' a time. The', ' end.'])
+        )
+        events = self.events([candidate])
+        self.assertEqual(
+            [(event['type'], event.get('text')) for event in events[:-1]],
+            [
+                ('token', 'Once upon'), ('token', ' a time. The'), ('sentence', 'Once upon a time.'),
+                ('token', ' end.'), ('sentence', 'The end.'),
+            ]
+        )
+        self.assertEqual(events[-1], {
+            'type': 'done', 'success': True, 'response': 'Once upon a time. The end.', 'conversation_id': None,
+        })
+
+    def test_reply_without_streaming_comes_in_one_piece(self):
+        events = self.events([], message='what is 7 plus 5')
+        self.assertEqual([event['type'] for event in events], ['token', 'sentence', 'done'])
+        self.assertEqual(events[1]['text'], '7 plus 5 is 12.')
+        self.assertEqual(events[2]['response'], '7 plus 5 is 12.')
+
+
+class RequestCoalescerTests(SimpleTestCase):
+    """Identical requests in flight together share one upstream call"""
+
+    def setUp(self):
+        self.coalescer = RequestCoalescer()
+
+    def test_followers_get_the_leaders_result(self):
+        release = threading.Event()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            release.wait(5)
+            return 'A noun is a naming word.'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.coalescer.do('noun', upstream, 5)))
+        leader.start()
+        while not calls:
+            time.sleep(0.01)
+        followers = [
+            threading.Thread(target=lambda: results.append(self.coalescer.do('noun', upstream, 5)))
+            for _ in range(3)
+        ]
+        for follower in followers:
+            follower.start()
+        while self.coalescer.stats()['saved'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(led for _, led in results), [False, False, False, True])
+        self.assertEqual({result for result, _ in results}, {'A noun is a naming word.'})
+        self.assertEqual(self.coalescer.stats(), {'in_flight': 0, 'leaders': 1, 'saved': 3, 'timeouts': 0})
+
+    def test_follower_gives_up_after_its_own_timeout(self):
+        future, leader = self.coalescer.join('noun')
+        self.assertTrue(leader)
+        started = time.monotonic()
+        self.assertEqual(self.coalescer.do('noun', lambda: 'unused', 0.05), (None, False))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.coalescer.stats()['timeouts'], 1)
+
+        # Once the leader lands, the next request leads a new flight
+        self.coalescer.land('noun', future, 'late')
+        self.assertEqual(self.coalescer.do('noun', lambda: 'fresh', 1), ('fresh', True))
+        self.assertEqual(self.coalescer.stats()['leaders'], 2)
+
+    def test_leader_failure_releases_the_followers(self):
+        future, _ = self.coalescer.join('noun')
+        self.coalescer.land('noun', future, error=RuntimeError('upstream down'))
+        self.assertIsNone(self.coalescer.wait(future, 1))
+        with self.assertRaises(RuntimeError):
+            self.coalescer.do('noun', mock.Mock(side_effect=RuntimeError('still down')), 1)
+        self.assertEqual(self.coalescer.stats()['in_flight'], 0)
+
+    def test_async_followers_share_one_call(self):
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'shared'
+
+        async def run():
+            return await asyncio.gather(*(self.coalescer.do_async('noun', upstream, 1) for _ in range(3)))
+
+        self.assertEqual(sorted(asyncio.run(run())), [('shared', False), ('shared', False), ('shared', True)])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.coalescer.stats()['saved'], 2)
@@ -24,11 +24,17 @@ urlpatterns = [
     path('assignments/create/', views.create_assignment, name='create_assignment'),
     path('assignments/<int:pk>/', views.assignment_detail, name='assignment_detail'),
     path('assignments/<int:pk>/update-progress/', views.update_assignment_progress, name='update_assignment_progress'),
+    path('assignments/<int:pk>/batch-progress/', views.batch_update_assignment_progress, name='batch_update_assignment_progress'),
+    path('assignments/<int:pk>/assign/', views.assign_assignment_to_grades, name='assign_assignment_to_grades'),
 
     path('progress/', views.student_progress_view, name='student_progress'),
     path('progress/<int:student_id>/', views.student_progress_view, name='student_progress_detail'),
     path('api/voice-assistant/', views.voice_assistant_api, name='voice_assistant_api'),
-    # path('goals/<int:goal_id>/update/', views.update_student_progress, name='update_goal_progress'),
+    path('api/voice-assistant/stream/', views.voice_assistant_stream, name='voice_assistant_stream'),
+    path('api/voice-assistant/async/', views.voice_assistant_async, name='voice_assistant_async'),
+    path('api/progress/bulk/', views.bulk_update_student_progress, name='bulk_update_student_progress'),
+    path('api/progress-update/', views.api_progress_update, name='api_progress_update'),
+    path('goals/<int:goal_id>/update/', views.update_goal, name='update_goal_progress'),
 
     path('schedule/', views.schedule_view, name='schedule'),
     path('reports/', views.reports_view, name='reports'),
@@ -91,71 +91,20 @@ def dashboard(request):
                 'timestamp': timezone.now()
             })
         
-        # Real top performers based on actual progress
+        # Top performers from the precomputed class leaderboard
         top_performers = []
-        
-        # Always show students even if they have no progress data
-        if total_students > 0:
-            # First, try to get students with progress data
-            students_with_progress = StudentProgress.objects.filter(
-                student__created_by=request.user
-            ).values(
-                'student__id', 
-                'student__name', 
-                'student__grade_level'
-            ).annotate(
-                avg_progress=Avg('progress_percentage'),
-                last_activity=Max('last_updated')
-            ).order_by('-avg_progress')[:5]
-            
-            for data in students_with_progress:
-                # Get most recent subject for this student
-                latest_progress = StudentProgress.objects.filter(
-                    student__id=data['student__id']
-                ).order_by('-last_updated').first()
-                
-                current_subject = "No recent activity"
-                if latest_progress and latest_progress.subject:
-                    current_subject = latest_progress.subject.name
-                
-                top_performers.append({
-                    'name': data['student__name'],
-                    'grade_level': data['student__grade_level'],
-                    'progress': round(data['avg_progress'] or 0, 1),
-                    'current_subject': current_subject,
-                    'last_activity': data['last_activity']
-                })
-            
-            # If we have fewer than 5 students with progress, add students without progress data
-            if len(top_performers) < 5:
-                # Get students that don't have progress records yet
-                students_without_progress = Student.objects.filter(
-                    created_by=request.user, 
-                    is_active=True
-                ).exclude(
-                    id__in=[s['student__id'] for s in students_with_progress]
-                )[:5 - len(top_performers)]
-                
-                for student in students_without_progress:
-                    top_performers.append({
-                        'name': student.name,
-                        'grade_level': student.grade_level,
-                        'progress': 0.0,
-                        'current_subject': "No progress data yet",
-                        'last_activity': student.updated_at
-                    })
-            
-            # If still no students (no progress data at all), show all students
-            if not top_performers:
-                all_students = Student.objects.filter(created_by=request.user, is_active=True)[:5]
-                for student in all_students:
-                    top_performers.append({
-                        'name': student.name,
-                        'grade_level': student.grade_level,
-                        'progress': 0.0,
-                        'current_subject': "No progress data yet",
-                        'last_activity': student.updated_at
-                    })
+        for entry in LeaderboardEntry.top(request.user, limit=5):
+            has_progress = entry.last_activity is not None
+            top_performers.append({
+                'name': entry.student.name,
+                'grade_level': entry.grade_level,
+                'rank': entry.teacher_rank,
+                'progress': round(float(entry.avg_progress), 1),
+                'current_subject': entry.current_subject.name if entry.current_subject else (
+                    "No recent activity" if has_progress else "No progress data yet"
+                ),
+                'last_activity': entry.last_activity if has_progress else entry.student.updated_at
+            })
         
         # Real new students this week
         one_week_ago = timezone.now() - timedelta(days=7)
@@ -541,17 +490,30 @@ def update_student_progress(request, pk):
         student = get_object_or_404(Student, pk=pk, created_by=request.user)
         progress_percentage = request.POST.get('progress_percentage')
         
+        # The row is keyed on a subject or one of the teacher's assignments
+        try:
+            subject_id = int(request.POST['subject_id']) if request.POST.get('subject_id') else None
+            assignment_id = int(request.POST['assignment_id']) if request.POST.get('assignment_id') else None
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid subject or assignment id'}, status=400)
+        if not subject_id and not assignment_id:
+            return JsonResponse({'success': False, 'error': 'A subject or assignment is required'}, status=400)
+        if subject_id and not Subject.objects.filter(pk=subject_id).exists():
+            return JsonResponse({'success': False, 'error': 'Subject not found'}, status=400)
+        if assignment_id and not Assignment.objects.filter(pk=assignment_id, created_by=request.user).exists():
+            return JsonResponse({'success': False, 'error': 'Assignment not found'}, status=400)
+        
         try:
             progress_percentage = float(progress_percentage)
             if 0 <= progress_percentage <= 100:
-                # Update or create progress record
-                progress, created = StudentProgress.objects.get_or_create(
-                    student=student,
-                    defaults={'progress_percentage': progress_percentage}
-                )
-                if not created:
-                    progress.progress_percentage = progress_percentage
-                    progress.save()
+                # Upsert the (student, subject, assignment) row instead of guessing
+                # between the student's progress rows
+                StudentProgress.bulk_upsert([{
+                    'student_id': student.id,
+                    'subject_id': subject_id,
+                    'assignment_id': assignment_id,
+                    'progress_percentage': Decimal(str(progress_percentage)),
+                }])
                 
                 return JsonResponse({
                     'success': True,
@@ -563,7 +525,7 @@ def update_student_progress(request, pk):
                     'success': False,
                     'error': 'Progress must be between 0 and 100'
                 })
-        except ValueError:
+        except (TypeError, ValueError):
             return JsonResponse({
                 'success': False,
                 'error': 'Invalid progress value'
@@ -571,6 +533,108 @@ def update_student_progress(request, pk):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+def bulk_update_student_progress(request):
+    """Upsert many progress values in one request.
+
+    Expects a JSON body that is either a list of rows or an object with the
+    list under ``updates``. Each row identifies the student by ``student_id``
+    (database id) or ``student_code`` (school student ID), optionally the
+    subject by ``subject_id`` or ``subject_code`` and the ``assignment_id``,
+    and carries any of ``progress_percentage``, ``score``, ``time_spent``,
+    ``completed`` and ``notes``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request'})
+    
+    try:
+        data = json.loads(request.body.decode('utf-8') or '[]')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    
+    rows = data.get('updates', []) if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        return JsonResponse({'success': False, 'error': 'No progress updates supplied'}, status=400)
+    
+    # Resolve identifiers with one query per table, scoped to the teacher
+    students = Student.objects.filter(created_by=request.user)
+    student_codes = dict(students.filter(
+        student_id__in={str(row.get('student_code')).upper() for row in rows if isinstance(row, dict) and row.get('student_code')}
+    ).values_list('student_id', 'id'))
+    student_ids = set(students.filter(
+        id__in={row.get('student_id') for row in rows if isinstance(row, dict) and str(row.get('student_id', '')).isdigit()}
+    ).values_list('id', flat=True))
+    subject_codes = dict(Subject.objects.values_list('code', 'id'))
+    subject_ids = set(Subject.objects.filter(
+        id__in={row.get('subject_id') for row in rows if isinstance(row, dict) and str(row.get('subject_id', '')).isdigit()}
+    ).values_list('id', flat=True))
+    assignment_ids = set(Assignment.objects.filter(
+        created_by=request.user,
+        id__in={row.get('assignment_id') for row in rows if isinstance(row, dict) and str(row.get('assignment_id', '')).isdigit()}
+    ).values_list('id', flat=True))
+    
+    updates = []
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            if row.get('student_code'):
+                student_id = student_codes.get(str(row['student_code']).upper())
+            else:
+                student_id = int(row['student_id'])
+            if student_id is None or (not row.get('student_code') and student_id not in student_ids):
+                errors.append({'index': index, 'error': 'Student not found'})
+                continue
+            
+            assignment_id = int(row['assignment_id']) if row.get('assignment_id') else None
+            if assignment_id and assignment_id not in assignment_ids:
+                errors.append({'index': index, 'error': 'Assignment not found'})
+                continue
+            
+            subject_id = int(row['subject_id']) if row.get('subject_id') else subject_codes.get(row.get('subject_code'))
+            if (row.get('subject_code') and subject_id is None) or (row.get('subject_id') and subject_id not in subject_ids):
+                errors.append({'index': index, 'error': 'Subject not found'})
+                continue
+            
+            progress_percentage = row.get('progress_percentage')
+            if progress_percentage is not None:
+                progress_percentage = Decimal(str(progress_percentage))
+                if not 0 <= progress_percentage <= 100:
+                    errors.append({'index': index, 'error': 'Progress must be between 0 and 100'})
+                    continue
+            
+            completed = row.get('completed')
+            if isinstance(completed, str):
+                completed = completed.lower() == 'true'
+            
+            updates.append({
+                'student_id': student_id,
+                'subject_id': subject_id,
+                'assignment_id': assignment_id,
+                'progress_percentage': progress_percentage,
+                'score': Decimal(str(row['score'])) if row.get('score') not in (None, '') else None,
+                'time_spent': int(row['time_spent']) if row.get('time_spent') not in (None, '') else None,
+                'completed': bool(completed) if completed is not None else None,
+                'notes': row.get('notes'),
+            })
+        except (AttributeError, KeyError, TypeError, ValueError, ArithmeticError):
+            errors.append({'index': index, 'error': 'Invalid progress values'})
+    
+    if not updates:
+        return JsonResponse({'success': False, 'error': 'No valid progress updates', 'errors': errors}, status=400)
+    
+    try:
+        created, updated = StudentProgress.bulk_upsert(updates)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e), 'errors': errors})
+    
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'updated': updated,
+        'errors': errors,
+        'message': f'Progress saved for {created + updated} records'
+    })
+
 @login_required
 def export_students(request):
     """Export students data"""
@@ -932,7 +996,8 @@ def assignments_view(request):
                 assignments = assignments.filter(status='active', due_date__lt=timezone.now())
         
         if grade_filter and grade_filter != 'All Grades':
-            assignments = assignments.filter(target_grade_levels__icontains=grade_filter)
+            grade_code = Student.normalize_grade_level(grade_filter)
+            assignments = assignments.filter(target_grades__grade_level=grade_code).distinct()
         
         if assignment_type and assignment_type != 'all':
             assignments = assignments.filter(assignment_type=assignment_type)
@@ -1033,7 +1098,7 @@ def create_assignment(request):
             max_score = request.POST.get('max_score', 100)
             estimated_duration = request.POST.get('estimated_duration', 30)
             due_date = request.POST.get('due_date')
-            target_grade_levels = request.POST.get('target_grade_levels', '')
+            target_grades = Student.normalize_grade_levels(request.POST.getlist('target_grade_levels'))
             
             # Voice-specific fields
             voice_prompt = request.POST.get('voice_prompt', '').strip()
@@ -1049,6 +1114,8 @@ def create_assignment(request):
                 errors['instructions'] = 'Instructions are required'
             if not due_date:
                 errors['due_date'] = 'Due date is required'
+            if request.POST.getlist('target_grade_levels') and not target_grades:
+                errors['grades'] = 'Choose valid grade levels'
             
             if not errors:
                 subject = Subject.objects.get(id=subject_id)
@@ -1061,7 +1128,6 @@ def create_assignment(request):
                     max_score=int(max_score),
                     estimated_duration=int(estimated_duration),
                     due_date=due_date,
-                    target_grade_levels=target_grade_levels,
                     voice_prompt=voice_prompt,
                     created_by=request.user,
                     status='active'
@@ -1074,7 +1140,13 @@ def create_assignment(request):
                     assignment.expected_responses = responses_list
                     assignment.save()
                 
-                messages.success(request, f'Assignment "{title}" created successfully!')
+                # Assign to every active student in the targeted grades
+                assigned_count = 0
+                if target_grades:
+                    assignment.set_target_grades(target_grades)
+                    assigned_count = assignment.fan_out_to_students()
+                
+                messages.success(request, f'Assignment "{title}" created and assigned to {assigned_count} students!')
                 return redirect('assignments')
             else:
                 for field, error in errors.items():
@@ -1086,6 +1158,7 @@ def create_assignment(request):
     subjects = Subject.objects.all()
     context = {
         'subjects': subjects,
+        'selected_grades': Student.normalize_grade_levels(request.POST.getlist('target_grade_levels')),
     }
     return render(request, 'create_assignment.html', context)
 
@@ -1156,6 +1229,103 @@ def update_assignment_progress(request, pk):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+def batch_update_assignment_progress(request, pk):
+    """Apply progress for many students of one assignment in one request.
+
+    Expects a JSON body that is either a list of
+    ``{student_id, completed, score, time_spent}`` objects or an object with
+    that list under ``updates``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request'})
+    
+    assignment = get_object_or_404(Assignment, pk=pk, created_by=request.user)
+    
+    try:
+        data = json.loads(request.body.decode('utf-8') or '[]')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    
+    rows = data.get('updates', []) if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        return JsonResponse({'success': False, 'error': 'No progress updates supplied'}, status=400)
+    
+    # Validate every row before touching the database
+    updates = {}
+    errors = []
+    for index, row in enumerate(rows):
+        try:
+            student_id = int(row['student_id'])
+            completed = row.get('completed', False)
+            if isinstance(completed, str):
+                completed = completed.lower() == 'true'
+            score = row.get('score')
+            time_spent = row.get('time_spent')
+            updates[student_id] = {
+                'completed': bool(completed),
+                'score': Decimal(str(score)) if score not in (None, '') else None,
+                'time_spent': int(time_spent) if time_spent not in (None, '') else None,
+            }
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            errors.append({'index': index, 'error': 'Invalid progress values'})
+    
+    # Only the teacher's own students may be graded
+    allowed_ids = set(Student.objects.filter(
+        id__in=list(updates), created_by=request.user
+    ).values_list('id', flat=True))
+    for student_id in set(updates) - allowed_ids:
+        errors.append({'student_id': student_id, 'error': 'Student not found'})
+        del updates[student_id]
+    
+    try:
+        created, updated = AssignmentStudent.bulk_apply_progress(assignment, updates)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    stats = assignment.get_progress_stats()
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'updated': updated,
+        'errors': errors,
+        'completion_rate': stats['completion_rate'],
+        'stats': stats,
+        'message': f'Progress updated for {created + updated} students'
+    })
+
+@login_required
+def assign_assignment_to_grades(request, pk):
+    """Fan an assignment out to every active student in its targeted grades via AJAX"""
+    if request.method == 'POST' and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        assignment = get_object_or_404(Assignment, pk=pk, created_by=request.user)
+        
+        try:
+            grades = request.POST.getlist('target_grade_levels')
+            if grades:
+                try:
+                    assignment.set_target_grades(grades)
+                except ValueError as e:
+                    return JsonResponse({'success': False, 'error': str(e)}, status=400)
+            
+            assigned_count = assignment.fan_out_to_students()
+            
+            return JsonResponse({
+                'success': True,
+                'assigned': assigned_count,
+                'target_grades': assignment.get_target_grades(),
+                'assigned_students_count': assignment.assignmentstudent_set.count(),
+                'message': f'Assigned to {assigned_count} new students'
+            })
+            
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            })
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request'})
+
 @login_required
 def schedule_view(request):
     """Schedule view"""
@@ -1417,6 +1587,9 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponseNotModified
 from .models import *
 import json
 
@@ -1467,7 +1640,8 @@ def student_progress_view(request, student_id=None):
             total_assignments=Count('id'),
             completed_assignments=Count('id', filter=Q(completed=True)),
             avg_score=Avg('score'),
-            total_time=Sum('time_spent')
+            total_time=Sum('time_spent'),
+            last_updated=Max('last_updated')
         )
         
         overall_progress = progress_data['avg_progress'] or 0
@@ -1477,28 +1651,7 @@ def student_progress_view(request, student_id=None):
         total_time_minutes = progress_data['total_time'] or 0
         
         # Calculate subject-wise progress
-        subjects_progress = []
-        subjects = Subject.objects.all()
-        
-        for subject in subjects:
-            subject_progress = StudentProgress.objects.filter(
-                student=student, 
-                subject=subject
-            ).aggregate(
-                avg_progress=Avg('progress_percentage'),
-                completed=Count('id', filter=Q(completed=True)),
-                total=Count('id')
-            )
-            
-            if subject_progress['total'] > 0:
-                progress_percent = subject_progress['avg_progress'] or 0
-                subjects_progress.append({
-                    'subject': subject,
-                    'progress': progress_percent,
-                    'completed': subject_progress['completed'],
-                    'total': subject_progress['total'],
-                    'color': get_subject_color(subject.name)
-                })
+        subjects_progress = get_student_subject_breakdown(student)
         
         # Get recent activities
         recent_activities = StudentProgress.objects.filter(
@@ -1506,27 +1659,7 @@ def student_progress_view(request, student_id=None):
         ).select_related('assignment', 'subject').order_by('-last_updated')[:10]
         
         # Format activities for display
-        formatted_activities = []
-        for activity in recent_activities:
-            if activity.assignment:
-                activity_type = 'assignment'
-                title = f"Completed: {activity.assignment.title}"
-                description = f"Score: {activity.score or 'N/A'}% • Time: {activity.time_spent}min"
-                icon = get_subject_icon(activity.subject.name if activity.subject else 'general')
-            else:
-                activity_type = 'progress'
-                title = "Progress Update"
-                description = f"Updated {activity.subject.name if activity.subject else 'general'} progress"
-                icon = 'chart-line'
-            
-            formatted_activities.append({
-                'type': activity_type,
-                'title': title,
-                'description': description,
-                'icon': icon,
-                'timestamp': activity.last_updated,
-                'subject_color': get_subject_color(activity.subject.name if activity.subject else 'general')
-            })
+        formatted_activities = [format_progress_activity(activity) for activity in recent_activities]
         
         # Get student goals
         current_goals = StudentGoal.objects.filter(
@@ -1547,6 +1680,9 @@ def student_progress_view(request, student_id=None):
         # Get learning streak
         streak, created = LearningStreak.objects.get_or_create(student=student)
         
+        # Class and grade rank from the precomputed leaderboard
+        leaderboard_entry = LeaderboardEntry.objects.filter(student=student).first()
+        
         # Get voice interactions for this student (for conversation recording)
         voice_interactions = VoiceInteraction.objects.filter(
             student=student
@@ -1601,6 +1737,13 @@ def student_progress_view(request, student_id=None):
             # Assignment data
             'pending_assignments': pending_assignments,
             'overdue_assignments': overdue_assignments,
+            
+            # Leaderboard position
+            'class_rank': leaderboard_entry.teacher_rank if leaderboard_entry else '-',
+            'grade_rank': leaderboard_entry.grade_rank if leaderboard_entry else None,
+            
+            # Version token for /api/progress-update/ polling
+            'progress_version': get_progress_version(progress_data['last_updated'], total_assignments),
         }
         
         return render(request, template_name, context)
@@ -1625,6 +1768,147 @@ def get_subject_color(subject_name):
     }
     return color_map.get(subject_name, '#4361ee')
 
+def format_progress_activity(activity):
+    """Format a StudentProgress row for the recent activity list"""
+    if activity.assignment:
+        activity_type = 'assignment'
+        title = f"Completed: {activity.assignment.title}"
+        description = f"Score: {activity.score or 'N/A'}% • Time: {activity.time_spent}min"
+        icon = get_subject_icon(activity.subject.name if activity.subject else 'general')
+    else:
+        activity_type = 'progress'
+        title = "Progress Update"
+        description = f"Updated {activity.subject.name if activity.subject else 'general'} progress"
+        icon = 'chart-line'
+    
+    return {
+        'type': activity_type,
+        'title': title,
+        'description': description,
+        'icon': icon,
+        'timestamp': activity.last_updated,
+        'subject_color': get_subject_color(activity.subject.name if activity.subject else 'general')
+    }
+
+def get_progress_version(last_updated, total_records):
+    """Version token for a student's progress: newest change plus row count"""
+    if not last_updated:
+        return f"0-{total_records}"
+    return f"{int(last_updated.timestamp() * 1000000)}-{total_records}"
+
+def parse_progress_version(token):
+    """Return the timestamp encoded in a progress version token, or None"""
+    try:
+        micros = int(str(token).split('-', 1)[0])
+    except (TypeError, ValueError):
+        return None
+    if micros <= 0:
+        return None
+    return datetime.datetime.fromtimestamp(micros / 1000000, tz=datetime.timezone.utc)
+
+@login_required
+def api_progress_update(request):
+    """Progress changes for a student since a version token.
+
+    Without ``student_id`` this is the logged-in student's own progress.
+    With it, the viewer must be that student, their teacher or staff (the
+    same viewers as student_progress_view); anyone else gets a 404.
+    Returns 304 when nothing changed. Otherwise returns overall progress,
+    stats and the activities updated after ``since``. A poll costs one
+    aggregate query, plus one for new activities when something changed.
+    """
+    student_id = request.GET.get('student_id')
+    if student_id:
+        try:
+            student_id = int(student_id)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid student_id'}, status=400)
+        students = Student.objects.filter(id=student_id)
+        if not (request.user.is_staff or request.user.is_superuser):
+            students = students.filter(
+                Q(user_account_id=request.user.id, can_login=True) | Q(created_by_id=request.user.id)
+            )
+        if not students.exists():
+            return JsonResponse({'success': False, 'error': 'Student not found'}, status=404)
+        progress_rows = StudentProgress.objects.filter(student_id=student_id)
+    else:
+        progress_rows = StudentProgress.objects.filter(
+            student__user_account_id=request.user.id,
+            student__can_login=True
+        )
+    progress_data = progress_rows.aggregate(
+        avg_progress=Avg('progress_percentage'),
+        total_records=Count('id'),
+        completed_assignments=Count('id', filter=Q(completed=True)),
+        avg_score=Avg('score'),
+        total_time=Sum('time_spent'),
+        last_updated=Max('last_updated')
+    )
+    
+    version = get_progress_version(progress_data['last_updated'], progress_data['total_records'])
+    since = request.GET.get('since')
+    if since == version:
+        return HttpResponseNotModified()
+    
+    activities = progress_rows.select_related('assignment', 'subject').order_by('-last_updated')
+    since_time = parse_progress_version(since)
+    if since_time:
+        activities = activities.filter(last_updated__gt=since_time)
+    
+    new_activities = []
+    for activity in activities[:10]:
+        formatted = format_progress_activity(activity)
+        formatted['timestamp'] = formatted['timestamp'].isoformat()
+        new_activities.append(formatted)
+    
+    return JsonResponse({
+        'success': True,
+        'version': version,
+        'progress': round(float(progress_data['avg_progress'] or 0), 1),
+        'stats': {
+            'completed_assignments': progress_data['completed_assignments'] or 0,
+            'avg_score': round(float(progress_data['avg_score'] or 0), 1),
+            'total_time_hours': round((progress_data['total_time'] or 0) / 60, 1),
+        },
+        'activities': new_activities,
+    })
+
+@login_required
+@require_http_methods(["POST"])
+def update_goal(request, goal_id):
+    """Mark a goal complete or reopen it (student or their teacher)"""
+    goal = get_object_or_404(
+        StudentGoal.objects.select_related('student'),
+        Q(student__user_account=request.user) | Q(student__created_by=request.user),
+        id=goal_id
+    )
+    
+    try:
+        data = json.loads(request.body.decode('utf-8') or '{}')
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    
+    completed = data.get('completed', not goal.completed)
+    if isinstance(completed, str) and completed.lower() in ('true', 'false'):
+        completed = completed.lower() == 'true'
+    if not isinstance(completed, bool):
+        return JsonResponse({'success': False, 'error': 'completed must be true or false'}, status=400)
+    goal.completed = completed
+    goal.completed_date = timezone.now() if completed else None
+    goal.save(update_fields=['completed', 'completed_date'])
+    
+    # Reopened tracked goals pick up their current totals again
+    if not completed and goal.goal_type in StudentGoal.TRACKED_GOAL_TYPES:
+        StudentGoal.reconcile(StudentGoal.objects.filter(pk=goal.pk))
+        goal.refresh_from_db(fields=['current_value', 'completed', 'completed_date'])
+    
+    return JsonResponse({
+        'success': True,
+        'completed': goal.completed,
+        'current_value': float(goal.current_value),
+        'progress': round(goal.progress_percentage(), 1),
+    })
+
 def get_motivational_message(progress, streak):
     """Generate motivational message based on progress and streak"""
     if progress >= 90:
@@ -1649,9 +1933,59 @@ def get_subject_icon(subject_name):
     }
     return icon_map.get(subject_name, 'book')
 
+def get_subject_table():
+    """Subject id -> subject, name and colour, cached until a Subject changes"""
+    table = cache.get(Subject.TABLE_CACHE_KEY)
+    if table is None:
+        table = {
+            subject.id: {
+                'subject': subject,
+                'name': subject.name,
+                'color': get_subject_color(subject.name)
+            }
+            for subject in Subject.objects.order_by('id')
+        }
+        cache.set(Subject.TABLE_CACHE_KEY, table, 60 * 60)
+    return table
+
+def get_student_subject_breakdown(student, limit=None):
+    """Per-subject average progress, completed and total counts in one query"""
+    rows = StudentProgress.objects.filter(
+        student=student,
+        subject__isnull=False
+    ).values('subject').annotate(
+        avg_progress=Avg('progress_percentage'),
+        completed=Count('id', filter=Q(completed=True)),
+        total=Count('id')
+    ).order_by('subject')
+    
+    subject_table = get_subject_table()
+    if any(row['subject'] not in subject_table for row in rows):
+        # Subject added in another process since the table was cached
+        cache.delete(Subject.TABLE_CACHE_KEY)
+        subject_table = get_subject_table()
+    
+    breakdown = []
+    for row in rows:
+        subject_info = subject_table.get(row['subject'])
+        if subject_info is None:
+            continue
+        breakdown.append({
+            'subject': subject_info['subject'],
+            'name': subject_info['name'],
+            'progress': row['avg_progress'] or 0,
+            'completed': row['completed'] or 0,
+            'total': row['total'] or 0,
+            'color': subject_info['color']
+        })
+        if limit and len(breakdown) >= limit:
+            break
+    return breakdown
+
 
 # views.py - Replace the voice_assistant_api function
 # views.py - Replace the voice_assistant_api function
+import hashlib
 import json
 import random
 import groq
@@ -1659,7 +1993,18 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
-import requests
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from .llm import ProviderCandidate, SentenceBuffer, is_model_unavailable_error, llm_clients, model_catalog, ollama, provider_racer, request_coalescer
+from .admission import voice_admission
+from .conversations import conversation_store, conversation_summarizer, conversation_summary, estimate_tokens, trim_history
+from .response_cache import normalize_message, replace_name, response_cache
+from .retrieval import curriculum_index
+from .speculation import speculative_followups
+from .spoken_math import format_number, parse_question
+from .write_behind import voice_log_queue
 
 @login_required
 @csrf_exempt
@@ -1669,74 +2014,49 @@ def voice_assistant_api(request):
 
     if request.method == 'POST':
         try:
-            # Debug: Print raw request body
-            body = request.body.decode('utf-8')
-            print(f"Raw request body: {body}")
-
-            # Handle empty body
-            if not body.strip():
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'Empty request body',
-                    'response': "I didn't receive any message. Please try again."
-                })
-
-            try:
-                data = json.loads(body)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'Invalid JSON format',
-                    'response': "There was an issue with your request. Please try again."
-                })
+            data, error_response = parse_voice_request(request)
+            if error_response:
+                return error_response
 
             user_message = data.get('message', '').strip()
-            conversation_context = data.get('context', [])
+            conversation_id, conversation_context = get_voice_conversation(request.user.pk, data)
 
             print(f"Voice Assistant - User message: '{user_message}'")
 
-            # Safe student access
-            student = None
-            try:
-                student = Student.objects.filter(created_by=request.user).first()
-                if student:
-                    print(f"Using student: {student.name}")
-            except Exception as e:
-                print(f"Error accessing student: {e}")
-
-            # Get student context data for AI
-            student_context = get_student_context_data(student) if student else {}
-
-            # Generate intelligent response using Groq AI
-            response_text = generate_groq_response(
-                user_message, 
-                student_context,
-                conversation_context
-            )
-            print(f"Generated response: {response_text[:100]}...")
-
-            # Update learning streak for activity if student exists
-            if student:
-                update_student_activity(student)
+            student = get_voice_student(request.user)
+            if not admit_voice_request(request.user.pk, student):
+                return voice_rate_limited_response()
+
+            # A follow-up prepared while the student listened, else common questions from the response cache
+            cache_key = None
+            response_text, source = take_follow_up(request.user.pk, conversation_id, user_message)
+            if not response_text:
+                cache_key, response_text = lookup_cached_reply(student, user_message, conversation_context, data.get('subject'))
+                source = 'cache'
+            if not response_text:
+                # Get student context data for AI
+                student_context = get_student_context_data(student) if student else {}
+
+                # Generate intelligent response using Groq AI, shared with identical requests in flight
+                response_text, source = generate_coalesced_response(
+                    student,
+                    user_message, 
+                    student_context,
+                    conversation_context,
+                    cache_key,
+                    owner_id=request.user.pk,
+                    conversation_id=conversation_id
+                )
+                store_cached_reply(cache_key, student, response_text, source)
+            print(f"Generated response ({source}): {response_text[:100]}...")
 
-                # Log the interaction
-                try:
-                    VoiceInteraction.objects.create(
-                        student=student,
-                        voice_command=user_message[:500],
-                        system_response=response_text[:500],
-                        success=True,
-                        confidence_score=0.9
-                    )
-                    print("Voice interaction logged successfully")
-                except Exception as e:
-                    print(f"Error logging interaction: {e}")
+            log_voice_interaction(student, user_message, response_text, source)
+            record_voice_turn(request.user.pk, conversation_id, user_message, response_text, student)
 
             response_data = {
                 'success': True,
                 'response': response_text,
-                'context': conversation_context[-5:] + [{'user': user_message, 'assistant': response_text}]
+                'conversation_id': conversation_id
             }
 
             print(f"Returning response: {json.dumps(response_data)[:200]}...")
@@ -1759,116 +2079,518 @@ def voice_assistant_api(request):
         'response': 'Please use POST method for voice assistant requests.'
     })
 
-def get_groq_client():
-    """Initialize Groq client with API key"""
+@login_required
+@csrf_exempt
+def voice_assistant_stream(request):
+    """Streaming voice assistant.
+
+    Sends newline-delimited JSON events: ``token`` for each text delta as
+    it arrives, ``sentence`` whenever a sentence is complete so the browser
+    can start speaking it, and a final ``done`` event with the full
+    response and conversation id. The interaction is logged once the
+    stream ends.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid request method',
+            'response': 'Please use POST method for voice assistant requests.'
+        })
+
+    data, error_response = parse_voice_request(request)
+    if error_response:
+        return error_response
+
+    user_message = data.get('message', '').strip()
+    conversation_id, conversation_context = get_voice_conversation(request.user.pk, data)
+    student = get_voice_student(request.user)
+    if not admit_voice_request(request.user.pk, student):
+        return voice_rate_limited_response()
+    cache_key = None
+    cached_text, cached_source = take_follow_up(request.user.pk, conversation_id, user_message)
+    if not cached_text:
+        cache_key, cached_text = lookup_cached_reply(student, user_message, conversation_context, data.get('subject'))
+        cached_source = 'cache'
+    student_context = {}
+    if not cached_text:
+        student_context = get_student_context_data(student) if student else {}
+
+    response = StreamingHttpResponse(
+        stream_voice_events(
+            student, user_message, student_context, conversation_context, cache_key, cached_text,
+            cached_source=cached_source, owner_id=request.user.pk, conversation_id=conversation_id,
+            flight_key=coalesce_key(student, user_message, conversation_context, cache_key)
+        ),
+        content_type='application/x-ndjson'
+    )
+    # Ask proxies not to buffer, so each sentence reaches the browser at once
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Bounded pool for the ORM work of async voice requests, so concurrent
+# speakers cannot open more database connections than this
+voice_db_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'VOICE_DB_THREADS', 4),
+    thread_name_prefix='voice-db'
+)
+
+def run_voice_db(func):
+    """sync_to_async on the bounded voice database pool"""
+    return sync_to_async(func, thread_sensitive=False, executor=voice_db_executor)
+
+@login_required
+@csrf_exempt
+async def voice_assistant_async(request):
+    """Async voice assistant for ASGI deployments.
+
+    Same request and response as voice_assistant_api, but the worker is
+    free while providers answer: LLM calls use async clients and database
+    work runs on a small bounded thread pool.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid request method',
+            'response': 'Please use POST method for voice assistant requests.'
+        })
+
+    try:
+        data, error_response = parse_voice_request(request)
+        if error_response:
+            return error_response
+
+        user_message = data.get('message', '').strip()
+
+        user = await request.auser()
+        # Conversation, admission and cache lookups do cache IO and take locks; keep them off the loop
+        conversation_id, conversation_context = await run_voice_db(get_voice_conversation)(user.pk, data)
+        student = await run_voice_db(get_voice_student)(user)
+        if not await run_voice_db(admit_voice_request)(user.pk, student):
+            return voice_rate_limited_response()
+
+        cache_key = None
+        response_text, source = await run_voice_db(take_follow_up)(user.pk, conversation_id, user_message)
+        if not response_text:
+            cache_key, response_text = await run_voice_db(lookup_cached_reply)(
+                student, user_message, conversation_context, data.get('subject')
+            )
+            source = 'cache'
+        if not response_text:
+            student_context = await run_voice_db(get_student_context_data)(student) if student else {}
+            response_text, source = await generate_coalesced_response_async(
+                student, user_message, student_context, conversation_context, cache_key, owner_id=user.pk,
+                conversation_id=conversation_id
+            )
+            await run_voice_db(store_cached_reply)(cache_key, student, response_text, source)
+        await run_voice_db(log_voice_interaction)(student, user_message, response_text, source)
+        await run_voice_db(record_voice_turn)(user.pk, conversation_id, user_message, response_text, student)
+
+        return JsonResponse({
+            'success': True,
+            'response': response_text,
+            'conversation_id': conversation_id
+        })
+    except Exception as e:
+        print(f"Async voice assistant error: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'response': "I encountered an unexpected error. Please try again in a moment."
+        })
+
+def stream_voice_events(student, user_message, student_context, conversation_context,
+                        cache_key=None, cached_text=None, cached_source='cache', owner_id=None,
+                        conversation_id=None, flight_key=None):
+    """Generate the NDJSON events for voice_assistant_stream"""
+    def event(kind, **fields):
+        return json.dumps({'type': kind, **fields}) + '\n'
+
+    sentences = SentenceBuffer()
+    parts = []
+    source = cached_source if cached_text else None
+
+    # Identical requests in flight share one upstream call; followers get the answer in one piece
+    flight = None
+    if flight_key and user_message and not cached_text:
+        future, leader = request_coalescer.join(flight_key)
+        if leader:
+            flight = future
+        else:
+            cached_text, source = share_coalesced_reply(
+                request_coalescer.wait(future, provider_racer.deadline),
+                student, user_message, student_context, conversation_context
+            )
+
+    slot_held = False
     try:
-        # Add your Groq API key in settings.py
-        api_key = getattr(settings, 'GROQ_API_KEY', 'your-groq-api-key-here')
-        if api_key == 'your-groq-api-key-here':
-            print("Warning: Using default Groq API key. Please set GROQ_API_KEY in settings.py")
+        try:
+            candidates = []
+            if user_message and not cached_text:
+                slot_held = voice_admission.acquire(admission_keys(student, owner_id)[0])
+                if slot_held:
+                    candidates = get_provider_candidates(
+                        user_message, shared_reply_context(student_context, cache_key), conversation_context,
+                        conversation_scope=(owner_id, conversation_id)
+                    )
+                else:
+                    print("No upstream slot free, answering locally")
+            for source, delta in provider_racer.stream(candidates):
+                parts.append(delta)
+                yield event('token', text=delta)
+                for sentence in sentences.feed(delta):
+                    yield event('sentence', text=sentence)
+
+            # Nothing streamed: answer in one piece from the cache, the other providers or locally
+            if not parts:
+                text = cached_text
+                if not text and not user_message:
+                    text, source = get_greeting_response(student_context), 'greeting'
+                elif not text and any(not candidate.stream for candidate in candidates):
+                    text, source = provider_racer.race([c for c in candidates if not c.stream])
+                if not text:
+                    text, source = get_intelligent_fallback_response(user_message, student_context, conversation_context), 'fallback'
+                parts.append(text)
+                yield event('token', text=text)
+                for sentence in sentences.feed(text):
+                    yield event('sentence', text=sentence)
+
+            tail = sentences.flush()
+            if tail:
+                yield event('sentence', text=tail)
+        except Exception as e:
+            print(f"Voice stream error: {e}")
+            if not parts:
+                parts.append("I encountered an unexpected error. Please try again in a moment.")
+                source = 'error'
+                yield event('sentence', text=parts[0])
+
+        response_text = ''.join(parts).strip()
+        if flight:
+            request_coalescer.land(flight_key, flight, (response_text, source, student.name if student else None))
+        if source != 'cache':
+            store_cached_reply(cache_key, student, response_text, source)
+        log_voice_interaction(student, user_message, response_text, source)
+        record_voice_turn(owner_id, conversation_id, user_message, response_text, student)
+        yield event(
+            'done',
+            success=True,
+            response=response_text,
+            conversation_id=conversation_id
+        )
+    finally:
+        if slot_held:
+            voice_admission.release()
+        # A client that disconnects mid-stream must not leave its followers waiting
+        if flight and not flight.done():
+            request_coalescer.land(flight_key, flight, None)
+
+def parse_voice_request(request):
+    """(data, None) for a valid JSON body, or (None, error JsonResponse)"""
+    # Debug: Print raw request body
+    body = request.body.decode('utf-8')
+    print(f"Raw request body: {body}")
+
+    # Handle empty body
+    if not body.strip():
+        return None, JsonResponse({
+            'success': False, 
+            'error': 'Empty request body',
+            'response': "I didn't receive any message. Please try again."
+        })
+
+    try:
+        return json.loads(body), None
+    except json.JSONDecodeError as e:
+        print(f"JSON decode error: {e}")
+        return None, JsonResponse({
+            'success': False, 
+            'error': 'Invalid JSON format',
+            'response': "There was an issue with your request. Please try again."
+        })
+
+def admission_keys(student, user_id):
+    """(requester key, teacher key) the voice admission controller limits on.
+
+    A student asking for themselves is limited as that student; a teacher
+    trying the assistant is limited as themselves, not as one of their
+    students. Either way the teacher's bucket is the student's teacher.
+    """
+    if student and student.user_account_id == user_id:
+        return f"student:{student.id}", student.created_by_id
+    return f"user:{user_id}", student.created_by_id if student else user_id
+
+def admit_voice_request(user_id, student):
+    """Take a token from the student's and teacher's buckets; False when over the limit"""
+    student_key, teacher_key = admission_keys(student, user_id)
+    if voice_admission.admit(student_key, teacher_key):
+        return True
+    print(f"Voice request from {student_key} over the rate limit")
+    return False
+
+def voice_rate_limited_response():
+    return JsonResponse({
+        'success': False,
+        'error': 'Too many requests',
+        'response': "You're asking questions very quickly! Please wait a few seconds and try again."
+    })
+
+def get_voice_conversation(owner_id, data):
+    """(conversation id, history) for a voice request; unknown ids start a new conversation"""
+    conversation_id = conversation_store.resolve(data.get('conversation_id'))
+    conversation_context = conversation_store.context(owner_id, conversation_id)
+    # Pages loaded before the server kept history still send it themselves
+    if not conversation_context and isinstance(data.get('context'), list):
+        conversation_context = data['context']
+    return conversation_id, conversation_context
+
+def record_voice_turn(owner_id, conversation_id, user_message, response_text, student=None):
+    """Add the exchange to the server-side conversation, fold old turns once it grows
+    and prepare the next turn if the reply asked the student something"""
+    if not conversation_id or not user_message or not response_text:
+        return
+    state = conversation_store.append(owner_id, conversation_id, user_message, response_text)
+    conversation_summarizer.schedule(owner_id, conversation_id, state)
+    prepare_follow_ups(student, owner_id, conversation_id, response_text)
+
+SPECULATION_PROMPT = (
+    "Your last message asked me a question. Before I answer, reply with a JSON object only, with keys: "
+    "\"expected_answer\" (the correct answer in a few words), \"correct\" (what you would say if I answer "
+    "correctly: brief praise and the next small step or question) and \"incorrect\" (what you would say "
+    "if I answer wrongly: a gentle correction that explains the right answer simply and tries again)."
+)
+
+def prepare_follow_ups(student, owner_id, conversation_id, response_text):
+    """While the reply is being spoken, pre-generate the next turn for a right and a wrong answer"""
+    key = (owner_id, conversation_id)
+    if not speculative_followups.asks_question(response_text):
+        speculative_followups.discard(key)
+        return
+    # Arithmetic questions are graded and followed up locally, without a model call
+    question = parse_question(response_text)
+    if question:
+        speculative_followups.schedule(key, lambda: {
+            'expected_answer': format_number(question.answer),
+            'correct': question.praise(),
+            'incorrect': question.explanation(),
+        })
+        return
+    client = get_groq_client()
+    if not client:
+        return
+
+    def generate():
+        # Speculation only uses spare upstream capacity
+        if not voice_admission.acquire_spare(getattr(settings, 'VOICE_SPECULATION_MAX_LOAD', 0.5)):
             return None
-        return groq.Groq(api_key=api_key)
+        try:
+            student_context = get_student_context_data(student) if student else {}
+            messages = build_conversation_messages(
+                SPECULATION_PROMPT, student_context, conversation_store.context(owner_id, conversation_id)
+            )
+            # Same routing as replies, so open circuits are skipped and outcomes feed provider health
+            candidates = [
+                ProviderCandidate(
+                    f"groq:{model}",
+                    lambda timeout, model=model: try_groq_follow_ups(client, model, messages, timeout)
+                )
+                for model in get_current_groq_models()[:2]
+            ]
+            text, provider = provider_racer.race(candidates, deadline=getattr(settings, 'LLM_REQUEST_TIMEOUT', 15))
+            if not text:
+                return None
+            try:
+                return json.loads(text)
+            except ValueError:
+                print(f"Speculative follow-up from {provider} was not JSON")
+                return None
+        finally:
+            voice_admission.release()
+            close_old_connections()
+
+    speculative_followups.schedule(key, generate)
+
+def take_follow_up(owner_id, conversation_id, user_message):
+    """(follow-up, source) prepared for this answer, or (None, None)"""
+    if not user_message or not conversation_id:
+        return None, None
+    follow_up = speculative_followups.take((owner_id, conversation_id), user_message)
+    if not follow_up:
+        return None, None
+    text, branch = follow_up
+    return text, f"speculative:{branch}"
+
+def get_voice_student(user):
+    """Student the voice assistant talks to: the logged-in student, else the teacher's first student"""
+    try:
+        student = (
+            Student.objects.filter(user_account_id=user.pk).first()
+            or Student.objects.filter(created_by_id=user.pk).first()
+        )
+        if student:
+            print(f"Using student: {student.name}")
+        return student
     except Exception as e:
-        print(f"Error initializing Groq client: {e}")
+        print(f"Error accessing student: {e}")
         return None
 
-def get_current_groq_models():
-    """Get current available Groq models by checking their API"""
+def lookup_cached_reply(student, user_message, conversation_context, subject=None):
+    """(cache key, cached answer) for a question; the key is None when it must not be cached"""
+    if not user_message or not response_cache.is_cacheable(user_message, conversation_context):
+        return None, None
+    cache_key = response_cache.make_key(user_message, student.grade_level if student else None, subject)
+    return cache_key, response_cache.get(cache_key, student.name if student else None)
+
+def shared_reply_context(student_context, cache_key):
+    """Context for the prompt; cacheable answers go to other students, so they get no progress data"""
+    if not cache_key:
+        return student_context
+    return {
+        'student_name': student_context.get('student_name', 'Student'),
+        'grade_level': student_context.get('grade_level'),
+    }
+
+def store_cached_reply(cache_key, student, response_text, source):
+    """Keep answers that came from an AI provider for the next student who asks"""
+    if cache_key and source and source.split(':')[0] in ('groq', 'huggingface', 'ollama'):
+        response_cache.set(cache_key, response_text, student.name if student else None)
+
+def log_voice_interaction(student, user_message, response_text, source=''):
+    """Queue the exchange for logging; the streak update and anchoring happen in the background"""
+    if not student:
+        return
+
+    # Log the interaction
     try:
-        # These are known current models as of 2024
-        current_models = [
-            "llama-3.1-70b-versatile",  # Most capable model
-            "llama-3.1-8b-instant",     # Fast, efficient model
-            "mixtral-8x7b-32768",       # Mixture of Experts (check if updated)
-            "gemma2-9b-it",             # Latest Gemma model
-            "llama3-70b-8192",          # Try the original naming pattern
-            "llama3-8b-8192",           # Try the original naming pattern
-        ]
-        
-        # Also try to fetch available models from Groq API
-        try:
-            client = get_groq_client()
-            if client:
-                models = client.models.list()
-                available_models = [model.id for model in models.data]
-                print(f"Available models from API: {available_models}")
-                return available_models
-        except:
-            pass
-            
-        return current_models
+        voice_log_queue.submit(
+            student.id,
+            user_message,
+            response_text,
+            response_source=source,
+            confidence_score=0.9
+        )
     except Exception as e:
-        print(f"Error getting current models: {e}")
-        return ["llama-3.1-70b-versatile", "llama-3.1-8b-instant", "mixtral-8x7b-32768"]
+        print(f"Error logging interaction: {e}")
+
+def get_groq_client():
+    """Shared Groq client (connections are reused across requests)"""
+    return llm_clients.get_groq_client()
+
+def get_current_groq_models():
+    """Groq models to try, from the background-refreshed catalog"""
+    return model_catalog.get_models()
 
-def generate_groq_response(user_message, student_context, conversation_context):
-    """Generate intelligent response using Groq AI"""
+def generate_groq_response(user_message, student_context, conversation_context, conversation_scope=None):
+    """(response, source) from racing the configured AI providers"""
     
     # If no message, return greeting
     if not user_message:
-        return get_greeting_response(student_context)
+        return get_greeting_response(student_context), 'greeting'
     
-    # First, try Groq API with current models
-    groq_response = try_groq_models(user_message, student_context, conversation_context)
-    if groq_response:
-        return groq_response
+    # Race Groq models, then Hugging Face and Ollama as hedges, within one deadline
+    candidates = get_provider_candidates(user_message, student_context, conversation_context, conversation_scope)
+    response_text, provider = provider_racer.race(candidates)
+    if response_text:
+        print(f"Answered by {provider}")
+        return response_text, provider
     
-    # If Groq fails, try alternative free AI APIs
-    alternative_response = try_alternative_apis(user_message, student_context, conversation_context)
-    if alternative_response:
-        return alternative_response
-    
-    # Final fallback to intelligent local responses
-    return get_intelligent_fallback_response(user_message, student_context, conversation_context)
+    # Deadline passed or every provider failed: answer locally right away
+    return get_intelligent_fallback_response(user_message, student_context, conversation_context), 'fallback'
 
-def try_groq_models(user_message, student_context, conversation_context):
-    """Try different Groq models"""
-    client = get_groq_client()
-    if not client:
-        return None
-    
-    # Get current available models
-    available_models = get_current_groq_models()
-    messages = build_conversation_messages(user_message, student_context, conversation_context)
-    
-    for model in available_models:
-        try:
-            print(f"Trying Groq model: {model}")
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                top_p=1,
-                stream=False
-            )
-            response_text = response.choices[0].message.content.strip()
-            print(f"Success with Groq model: {model}")
-            return response_text
-            
-        except Exception as model_error:
-            print(f"Groq model {model} failed: {str(model_error)[:100]}...")
-            continue
-    
-    return None
+def get_provider_candidates(user_message, student_context, conversation_context, conversation_scope=None):
+    """Providers in preference order: Groq models, then Hugging Face, then Ollama.
 
-def try_alternative_apis(user_message, student_context, conversation_context):
-    """Try alternative free AI APIs if Groq fails"""
-    print("Trying alternative AI APIs...")
+    ``conversation_scope`` is (owner id, conversation id); without it Ollama
+    does not reuse context tokens between turns.
+    """
+    candidates = []
     
-    # Try Hugging Face Inference API (free tier)
-    hf_response = try_huggingface_api(user_message, student_context, conversation_context)
-    if hf_response:
-        return hf_response
-    
-    # Try OpenAI-compatible local models
-    local_response = try_local_ai_api(user_message, student_context, conversation_context)
-    if local_response:
-        return local_response
-    
-    return None
+    client = get_groq_client()
+    if client:
+        messages = build_conversation_messages(user_message, student_context, conversation_context)
+        for model in get_current_groq_models():
+            candidates.append(ProviderCandidate(
+                f"groq:{model}",
+                lambda timeout, model=model: try_groq_model(client, model, messages, timeout),
+                stream=lambda timeout, model=model: stream_groq_model(client, model, messages, timeout),
+                acall=lambda timeout, model=model: try_groq_model_async(model, messages, timeout)
+            ))
+    
+    if getattr(settings, 'HUGGINGFACE_API_TOKEN', None):
+        candidates.append(ProviderCandidate(
+            'huggingface',
+            lambda timeout: try_huggingface_api(user_message, student_context, conversation_context, timeout),
+            acall=lambda timeout: try_huggingface_api_async(user_message, student_context, conversation_context, timeout)
+        ))
+    
+    candidates.append(ProviderCandidate(
+        'ollama',
+        lambda timeout: try_ollama_api(user_message, student_context, conversation_context, timeout, conversation_scope),
+        stream=lambda timeout: stream_ollama_api(
+            user_message, student_context, conversation_context, timeout, conversation_scope
+        ),
+        acall=lambda timeout: try_ollama_api_async(
+            user_message, student_context, conversation_context, timeout, conversation_scope
+        )
+    ))
+    return candidates
 
-def try_huggingface_api(user_message, student_context, conversation_context):
+def try_groq_model(client, model, messages, timeout):
+    """Ask one Groq model; errors are raised so the racer can move on"""
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            top_p=1,
+            stream=False,
+            timeout=timeout
+        )
+    except Exception as model_error:
+        if is_model_unavailable_error(model_error):
+            model_catalog.mark_unavailable(model)
+        raise
+    return response.choices[0].message.content.strip()
+
+def try_groq_follow_ups(client, model, messages, timeout):
+    """Ask one Groq model for speculative follow-ups as a JSON object"""
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=400,
+            response_format={"type": "json_object"},
+            timeout=timeout
+        )
+    except Exception as model_error:
+        if is_model_unavailable_error(model_error):
+            model_catalog.mark_unavailable(model)
+        raise
+    return response.choices[0].message.content
+
+def stream_groq_model(client, model, messages, timeout):
+    """Yield text deltas from one Groq model as they are generated"""
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            top_p=1,
+            stream=True,
+            timeout=timeout
+        )
+    except Exception as model_error:
+        if is_model_unavailable_error(model_error):
+            model_catalog.mark_unavailable(model)
+        raise
+    for chunk in stream:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ''
+
+def try_huggingface_api(user_message, student_context, conversation_context, timeout=10):
     """Try Hugging Face Inference API as fallback"""
     try:
         # You can use free Hugging Face inference API
@@ -1883,7 +2605,7 @@ def try_huggingface_api(user_message, student_context, conversation_context):
         # Build prompt
         prompt = build_huggingface_prompt(user_message, student_context, conversation_context)
         
-        response = requests.post(API_URL, headers=headers, json={"inputs": prompt})
+        response = llm_clients.get_session().post(API_URL, headers=headers, json={"inputs": prompt}, timeout=timeout)
         if response.status_code == 200:
             result = response.json()
             if isinstance(result, list) and len(result) > 0:
@@ -1893,57 +2615,226 @@ def try_huggingface_api(user_message, student_context, conversation_context):
     
     return None
 
-def try_local_ai_api(user_message, student_context, conversation_context):
-    """Try local AI APIs like Ollama or LM Studio"""
+def try_ollama_api(user_message, student_context, conversation_context, timeout=10, conversation_scope=None):
+    """Try Ollama local API (OLLAMA_URL), continuing the conversation's context when it has one"""
     try:
-        # Try Ollama local API (if running locally)
-        ollama_response = try_ollama_api(user_message, student_context, conversation_context)
-        if ollama_response:
-            return ollama_response
+        scope = ollama_scope(student_context, conversation_scope)
+        context = ollama.previous_context(scope, conversation_context)
+        prompt = build_ollama_prompt(user_message, student_context, conversation_context, continuing=bool(context))
+        return ollama.generate(user_message, prompt, context, timeout, scope)
     except Exception as e:
-        print(f"Local AI API error: {e}")
+        print(f"Ollama API not available: {e}")
     
     return None
 
-def try_ollama_api(user_message, student_context, conversation_context):
-    """Try Ollama local API"""
+def stream_ollama_api(user_message, student_context, conversation_context, timeout=10, conversation_scope=None):
+    """Yield text deltas from the local Ollama model"""
+    scope = ollama_scope(student_context, conversation_scope)
+    context = ollama.previous_context(scope, conversation_context)
+    prompt = build_ollama_prompt(user_message, student_context, conversation_context, continuing=bool(context))
+    yield from ollama.stream(user_message, prompt, context, timeout, scope)
+
+def ollama_scope(student_context, conversation_scope):
+    """Key Ollama context tokens are kept under, or None when they must not be reused.
+
+    Tokens encode the earlier prompt, student details included, so they are
+    only reused within the same conversation of the same user, and only while
+    the student context they were built from is unchanged; fresher progress
+    starts a new context with the full prompt.
+    """
+    owner_id, conversation_id = conversation_scope or (None, None)
+    if owner_id is None or not conversation_id:
+        return None
+    instruction = student_context.get('system_prompt') or render_voice_system_prompt(student_context)
+    return f"{owner_id}:{conversation_id}:{hashlib.sha1(instruction.encode()).hexdigest()}"
+
+def coalesce_key(student, user_message, conversation_context, cache_key=None):
+    """Key shared by concurrent requests that would send the same prompt upstream.
+
+    Cacheable questions share their response-cache key across students;
+    anything else is only coalesced with the same student asking the same
+    thing after the same turns (double submits, retries).
+    """
+    if not user_message:
+        return None
+    if cache_key:
+        return ('shared',) + tuple(cache_key)
+    fingerprint = json.dumps(
+        [student.id if student else None, normalize_message(user_message), conversation_context[-2:]],
+        sort_keys=True,
+        default=str
+    )
+    return ('student', hashlib.sha1(fingerprint.encode()).hexdigest())
+
+def share_coalesced_reply(result, student, user_message, student_context, conversation_context):
+    """A follower's (response, source) from the leader's (text, source, student name)"""
+    text, source, leader_name = result or (None, None, None)
+    # Local answers depend on the asker, and a failed leader leaves nothing to share
+    if not text or source in ('fallback', 'greeting', 'error'):
+        return get_intelligent_fallback_response(user_message, student_context, conversation_context), 'fallback'
+    if leader_name and student and leader_name != student.name:
+        text = replace_name(text, leader_name, student.name)
+    return text, f"coalesced:{source}"[:60]
+
+def generate_coalesced_response(student, user_message, student_context, conversation_context, cache_key=None,
+                                owner_id=None, conversation_id=None):
+    """generate_groq_response(), with one upstream call shared between identical concurrent requests"""
+    key = coalesce_key(student, user_message, conversation_context, cache_key)
+    if key is None:
+        return generate_groq_response(user_message, student_context, conversation_context, (owner_id, conversation_id))
+
+    def lead():
+        with voice_admission.slot(admission_keys(student, owner_id)[0]) as admitted:
+            if not admitted:
+                print("No upstream slot free, answering locally")
+                return get_intelligent_fallback_response(user_message, student_context, conversation_context), 'fallback', None
+            text, source = generate_groq_response(
+                user_message, shared_reply_context(student_context, cache_key), conversation_context,
+                (owner_id, conversation_id)
+            )
+        return text, source, student.name if student else None
+
+    result, led = request_coalescer.do(key, lead, provider_racer.deadline)
+    if led:
+        return result[0], result[1]
+    return share_coalesced_reply(result, student, user_message, student_context, conversation_context)
+
+async def generate_coalesced_response_async(student, user_message, student_context, conversation_context,
+                                            cache_key=None, owner_id=None, conversation_id=None):
+    """Async generate_coalesced_response() for voice_assistant_async"""
+    key = coalesce_key(student, user_message, conversation_context, cache_key)
+    if key is None:
+        return await generate_groq_response_async(
+            user_message, student_context, conversation_context, (owner_id, conversation_id)
+        )
+
+    async def lead():
+        if not await voice_admission.acquire_async(admission_keys(student, owner_id)[0]):
+            print("No upstream slot free, answering locally")
+            text = await run_voice_db(get_intelligent_fallback_response)(user_message, student_context, conversation_context)
+            return text, 'fallback', None
+        try:
+            text, source = await generate_groq_response_async(
+                user_message, shared_reply_context(student_context, cache_key), conversation_context,
+                (owner_id, conversation_id)
+            )
+        finally:
+            voice_admission.release()
+        return text, source, student.name if student else None
+
+    result, led = await request_coalescer.do_async(key, lead, provider_racer.deadline)
+    if led:
+        return result[0], result[1]
+    # The fallback may build the curriculum index from the database
+    return await run_voice_db(share_coalesced_reply)(result, student, user_message, student_context, conversation_context)
+
+async def generate_groq_response_async(user_message, student_context, conversation_context, conversation_scope=None):
+    """Async generate_groq_response() for voice_assistant_async"""
+    if not user_message:
+        return get_greeting_response(student_context), 'greeting'
+    
+    candidates = get_provider_candidates(user_message, student_context, conversation_context, conversation_scope)
+    response_text, provider = await provider_racer.race_async(candidates)
+    if response_text:
+        print(f"Answered by {provider}")
+        return response_text, provider
+    
+    text = await run_voice_db(get_intelligent_fallback_response)(user_message, student_context, conversation_context)
+    return text, 'fallback'
+
+async def try_groq_model_async(model, messages, timeout):
+    """Ask one Groq model on the shared async client"""
+    client = llm_clients.get_async_groq_client()
+    if not client:
+        return None
     try:
-        # This requires Ollama to be installed and running locally
-        API_URL = "http://localhost:11434/api/generate"
-        
-        prompt = build_ollama_prompt(user_message, student_context, conversation_context)
-        
-        data = {
-            "model": "llama2",  # or any model you have installed
-            "prompt": prompt,
-            "stream": False
-        }
-        
-        response = requests.post(API_URL, json=data, timeout=30)
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', '').strip()
-    except Exception as e:
-        print(f"Ollama API not available: {e}")
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            top_p=1,
+            stream=False,
+            timeout=timeout
+        )
+    except Exception as model_error:
+        if is_model_unavailable_error(model_error):
+            model_catalog.mark_unavailable(model)
+        raise
+    return response.choices[0].message.content.strip()
+
+async def try_huggingface_api_async(user_message, student_context, conversation_context, timeout=10):
+    """Async Hugging Face Inference API call"""
+    api_token = getattr(settings, 'HUGGINGFACE_API_TOKEN', None)
+    if not api_token:
+        return None
     
+    API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-large"
+    prompt = build_huggingface_prompt(user_message, student_context, conversation_context)
+    response = await llm_clients.get_async_http_client().post(
+        API_URL,
+        headers={"Authorization": f"Bearer {api_token}"},
+        json={"inputs": prompt},
+        timeout=timeout
+    )
+    if response.status_code == 200:
+        result = response.json()
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get('generated_text', '').replace(prompt, '').strip()
     return None
 
+async def try_ollama_api_async(user_message, student_context, conversation_context, timeout=10,
+                               conversation_scope=None):
+    """Async Ollama local API call"""
+    scope = ollama_scope(student_context, conversation_scope)
+    context = ollama.previous_context(scope, conversation_context)
+    prompt = build_ollama_prompt(user_message, student_context, conversation_context, continuing=bool(context))
+    return await ollama.agenerate(user_message, prompt, context, timeout, scope)
+
 def build_conversation_messages(user_message, student_context, conversation_context):
     """Build messages array for Groq API with proper context"""
     
+    # Cached student contexts carry their prompt pre-rendered
+    system_prompt = student_context.get('system_prompt') or render_voice_system_prompt(student_context)
+
+    # Older turns are carried as a running summary
+    summary = conversation_summary(conversation_context)
+    if summary:
+        system_prompt = f"{system_prompt}\n\nEarlier in this conversation: {summary}"
+
+    messages = [
+        {"role": "system", "content": system_prompt}
+    ]
+    
+    # Add as much recent history as fits the token budget
+    token_budget = getattr(settings, 'VOICE_HISTORY_TOKEN_BUDGET', 1200) - (estimate_tokens(summary) if summary else 0)
+    for exchange in trim_history(conversation_context, token_budget):
+        messages.append({"role": "user", "content": exchange['user']})
+        messages.append({"role": "assistant", "content": exchange['assistant']})
+    
+    # Add current message
+    messages.append({"role": "user", "content": user_message})
+    
+    return messages
+
+def render_voice_system_prompt(student_context):
+    """System prompt describing the student to the AI providers"""
     student_name = student_context.get('student_name', 'the student')
     overall_progress = student_context.get('progress', {}).get('avg_progress', 0)
     completed_assignments = student_context.get('progress', {}).get('completed', 0)
     learning_streak = student_context.get('streak', {}).get('current_streak', 0)
     
-    system_prompt = f"""You are an intelligent, friendly learning assistant for a student named {student_name}. 
-You help with educational progress, assignments, motivation, and learning support.
-
+    # Shared answers are written without the student's own data
+    student_details = f"""
 Student Context:
 - Overall Progress: {overall_progress}%
 - Completed Assignments: {completed_assignments}
 - Learning Streak: {learning_streak} days
-
+""" if 'progress' in student_context else ''
+    
+    system_prompt = f"""You are an intelligent, friendly learning assistant for a student named {student_name}. 
+You help with educational progress, assignments, motivation, and learning support.
+{student_details}
 Your role:
 1. Be encouraging, educational, and supportive
 2. Provide accurate information about learning concepts
@@ -1955,20 +2846,7 @@ If the student asks about specific subjects (math, science, history, etc.), prov
 If they ask about their progress, use the context above.
 Always maintain a positive, educational tone."""
 
-    messages = [
-        {"role": "system", "content": system_prompt}
-    ]
-    
-    # Add conversation history (last 5 exchanges)
-    for exchange in conversation_context[-5:]:
-        if 'user' in exchange and 'assistant' in exchange:
-            messages.append({"role": "user", "content": exchange['user']})
-            messages.append({"role": "assistant", "content": exchange['assistant']})
-    
-    # Add current message
-    messages.append({"role": "user", "content": user_message})
-    
-    return messages
+    return system_prompt
 
 def build_huggingface_prompt(user_message, student_context, conversation_context):
     """Build prompt for Hugging Face API"""
@@ -1978,11 +2856,16 @@ def build_huggingface_prompt(user_message, student_context, conversation_context
 User: {user_message}
 Assistant:"""
 
-def build_ollama_prompt(user_message, student_context, conversation_context):
-    """Build prompt for Ollama API"""
-    student_name = student_context.get('student_name', 'Student')
+def build_ollama_prompt(user_message, student_context, conversation_context, continuing=False):
+    """Build prompt for Ollama API; a continued conversation only needs the new turn"""
+    if continuing:
+        return f"""### Input:
+{user_message}
+
+### Response:"""
+    instruction = student_context.get('system_prompt') or render_voice_system_prompt(student_context)
     return f"""### Instruction:
-You are an AI learning assistant for {student_name}. Provide helpful, educational responses.
+{instruction}
 
 ### Input:
 {user_message}
@@ -2002,6 +2885,16 @@ def get_greeting_response(student_context):
 
 def get_intelligent_fallback_response(user_message, student_context, conversation_context):
     """Intelligent fallback response when all APIs fail"""
+    # Curriculum questions get a real answer from the offline content index
+    if user_message:
+        # Speech transcripts rarely carry the question mark
+        question = parse_question(user_message.rstrip(' ?') + '?')
+        if question:
+            return f"{question.expression} is {format_number(question.answer)}."
+        answer = curriculum_index.best_answer(user_message, student_context.get('grade_level'))
+        if answer:
+            return answer
+
     message_lower = user_message.lower()
     student_name = student_context.get('student_name', 'there')
     
@@ -2065,10 +2958,14 @@ def get_intelligent_fallback_response(user_message, student_context, conversatio
     ]
     return random.choice(default_responses)
 
-# ... keep the existing get_student_context_data and update_student_activity functions unchanged
+# ... keep the existing get_student_context_data function unchanged
 
 def get_student_context_data(student):
-    """Get comprehensive student data for context"""
+    """Get comprehensive student data for context.
+
+    Cached per student with the system prompt pre-rendered; progress,
+    streak and achievement changes invalidate the entry (see signals.py).
+    """
     try:
         if not student:
             return {
@@ -2078,6 +2975,12 @@ def get_student_context_data(student):
                 'streak': {'current_streak': 0, 'longest_streak': 0},
                 'student_name': 'Student'
             }
+        
+        context_cache = Student.voice_context_cache()
+        cache_key = Student.VOICE_CONTEXT_KEY.format(student.id)
+        student_context = context_cache.get(cache_key)
+        if student_context is not None:
+            return student_context
             
         # Progress data
         progress_data = StudentProgress.objects.filter(student=student).aggregate(
@@ -2089,27 +2992,20 @@ def get_student_context_data(student):
         )
         
         # Subjects progress
-        subjects_data = []
-        for subject in Subject.objects.all()[:6]:
-            subject_progress = StudentProgress.objects.filter(
-                student=student, subject=subject
-            ).aggregate(
-                avg_progress=Avg('progress_percentage'),
-                completed=Count('id', filter=Q(completed=True)),
-                total=Count('id')
-            )
-            if subject_progress['total'] > 0:
-                subjects_data.append({
-                    'name': subject.name,
-                    'progress': float(subject_progress['avg_progress'] or 0),
-                    'completed': subject_progress['completed'] or 0,
-                    'total': subject_progress['total'] or 0
-                })
+        subjects_data = [
+            {
+                'name': item['name'],
+                'progress': float(item['progress']),
+                'completed': item['completed'],
+                'total': item['total']
+            }
+            for item in get_student_subject_breakdown(student, limit=6)
+        ]
         
         # Learning streak
         streak, created = LearningStreak.objects.get_or_create(student=student)
         
-        return {
+        student_context = {
             'progress': {
                 'avg_progress': float(progress_data['avg_progress'] or 0),
                 'completed': progress_data['completed'] or 0,
@@ -2122,8 +3018,12 @@ def get_student_context_data(student):
                 'current_streak': streak.current_streak,
                 'longest_streak': streak.longest_streak
             },
-            'student_name': student.name
+            'student_name': student.name,
+            'grade_level': student.grade_level
         }
+        student_context['system_prompt'] = render_voice_system_prompt(student_context)
+        context_cache.set(cache_key, student_context, getattr(settings, 'VOICE_CONTEXT_TTL', 300))
+        return student_context
     except Exception as e:
         print(f"Error getting student context: {e}")
         return {
@@ -2133,15 +3033,6 @@ def get_student_context_data(student):
             'student_name': student.name if student else 'Student'
         }
 
-def update_student_activity(student):
-    """Update student's learning streak and activity"""
-    try:
-        streak, created = LearningStreak.objects.get_or_create(student=student)
-        streak.update_streak()
-        print(f"Updated student activity streak to {streak.current_streak}")
-    except Exception as e:
-        print(f"Error updating student activity: {e}")
-
 
 
 # views.py - Add real blockchain verification views
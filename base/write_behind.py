@@ -0,0 +1,236 @@
+# base/write_behind.py
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def try_lock(handle):
+    """Exclusive lock on an open file without waiting; False if another process holds it"""
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class VoiceLogQueue:
+    """Write-behind queue for voice interaction logging.
+
+    Requests enqueue the interaction and return; a background thread
+    commits batches in one transaction (interaction rows plus streak
+    updates) and anchors significant interactions afterwards. Each entry is
+    appended to a per-process journal file first. Each process holds a lock
+    on a file next to its journal for as long as it runs, so journals whose
+    lock is free were left behind by dead processes and are replayed on
+    start-up. When the queue is full the
+    caller writes synchronously instead of waiting; interactions written
+    that way, or replayed, are left for the anchor_pending_records command.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._journal_path = None
+        self._lock_file = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'VOICE_WRITE_BEHIND', True)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'VOICE_WRITE_BEHIND_BATCH', 50)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'VOICE_WRITE_BEHIND_INTERVAL', 0.5)
+
+    @property
+    def journal_dir(self):
+        return getattr(settings, 'VOICE_WRITE_BEHIND_DIR', os.path.join(settings.BASE_DIR, 'cache', 'voice_log'))
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._journal_path = os.path.join(self.journal_dir, f'voice-{os.getpid()}.jsonl')
+            if self._lock_file is None:
+                self._lock_file = open(self.lock_path(self._journal_path), 'a+')
+                if not try_lock(self._lock_file):
+                    print("Could not lock the voice log journal; another process may replay it")
+            # A journal under our pid belongs to an earlier process that reused it
+            self._replay_journal(self._journal_path)
+            self._queue = queue.Queue(maxsize=getattr(settings, 'VOICE_WRITE_BEHIND_MAX', 1000))
+            self._thread = threading.Thread(target=self._run, name='voice-write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+        self.replay_orphaned_journals()
+
+    def submit(self, student_id, voice_command, system_response, response_source='', confidence_score=0.9):
+        """Queue one interaction for logging; falls back to a direct write when full or disabled"""
+        entry = {
+            'student_id': student_id,
+            'voice_command': voice_command[:500],
+            'system_response': system_response[:500],
+            'response_source': response_source or '',
+            'confidence_score': confidence_score,
+            'timestamp': timezone.now().isoformat(),
+        }
+        if not self.enabled:
+            self.commit([entry])
+            return
+
+        self.start()
+        if self._queue.full():
+            print("Voice log queue full, writing synchronously")
+            self.commit([entry])
+            return
+        # Journal before queueing so the writer never clears an entry it has not seen
+        with self._journal_lock:
+            with open(self._journal_path, 'a') as journal:
+                journal.write(json.dumps(entry) + '\n')
+            self._queue.put(entry)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                ids = self.commit(batch)
+                self._truncate_journal_if_drained()
+            except Exception as e:
+                print(f"Voice log batch failed, entries stay in the journal: {e}")
+            else:
+                self._anchor(ids)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                close_old_connections()
+
+    def _truncate_journal_if_drained(self):
+        with self._journal_lock:
+            # Entries still queued are in the journal; only clear it once everything is written
+            if self._queue.empty() and self._journal_path and os.path.exists(self._journal_path):
+                open(self._journal_path, 'w').close()
+
+    def _anchor(self, ids):
+        """Anchor a committed batch on the writer thread, off the request path"""
+        from .models import VoiceInteraction
+
+        try:
+            VoiceInteraction.anchor_pending(limit=len(ids), ids=ids)
+        except Exception as e:
+            print(f"Anchoring voice interactions failed, anchor_pending_records will retry: {e}")
+
+    def commit(self, entries):
+        """Write interactions and streak updates in one transaction; returns the new ids"""
+        from .models import LearningStreak, VoiceInteraction
+
+        interactions = [
+            VoiceInteraction(
+                student_id=entry['student_id'],
+                voice_command=entry['voice_command'],
+                system_response=entry['system_response'],
+                response_source=entry.get('response_source', ''),
+                confidence_score=entry.get('confidence_score', 0.9),
+                success=True,
+                timestamp=parse_datetime(entry['timestamp']) or timezone.now()
+            )
+            for entry in entries
+        ]
+        activity = {}
+        for interaction in interactions:
+            day = timezone.localdate(interaction.timestamp)
+            activity[interaction.student_id] = max(day, activity.get(interaction.student_id, day))
+
+        with transaction.atomic():
+            VoiceInteraction.objects.bulk_create(interactions)
+            for student_id, day in activity.items():
+                LearningStreak.record_activity(student_id, day)
+        print(f"Logged {len(interactions)} voice interactions")
+        return [interaction.pk for interaction in interactions if interaction.pk]
+
+    def flush(self, timeout=5):
+        """Wait for queued entries to be written (used at exit and in tests)"""
+        if not self._queue:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @staticmethod
+    def lock_path(journal_path):
+        return journal_path[:-len('.jsonl')] + '.lock'
+
+    def replay_orphaned_journals(self):
+        """Write entries journaled by processes that died before committing them"""
+        for path in glob.glob(os.path.join(self.journal_dir, 'voice-*.jsonl')):
+            if path == self._journal_path:
+                continue
+            lock_path = self.lock_path(path)
+            if not os.path.exists(lock_path):
+                self._replay_journal(path)
+                continue
+            with open(lock_path, 'a+') as lock_file:
+                if not try_lock(lock_file):
+                    continue  # Owner is still running
+                self._replay_journal(path)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def _replay_journal(self, path):
+        from .models import VoiceInteraction
+
+        claimed = f'{path}.replaying-{os.getpid()}'
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return
+        with open(claimed) as journal:
+            entries = [json.loads(line) for line in journal if line.strip()]
+
+        # The journal may hold entries committed just before the process died
+        if entries:
+            committed = {
+                (student_id, timestamp.isoformat())
+                for student_id, timestamp in VoiceInteraction.objects.filter(
+                    student_id__in={entry['student_id'] for entry in entries},
+                    timestamp__in={parse_datetime(entry['timestamp']) for entry in entries}
+                ).values_list('student_id', 'timestamp')
+            }
+            entries = [
+                entry for entry in entries
+                if (entry['student_id'], parse_datetime(entry['timestamp']).isoformat()) not in committed
+            ]
+        if entries:
+            print(f"Replaying {len(entries)} voice interactions from {os.path.basename(path)}")
+            self.commit(entries)
+        os.remove(claimed)
+
+
+# Singleton instance
+voice_log_queue = VoiceLogQueue()
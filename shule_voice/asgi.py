@@ -3,6 +3,10 @@ ASGI config for shule_voice project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (for example ``uvicorn shule_voice.asgi:application
+--workers 2``) so the async voice endpoint (/api/voice-assistant/async/) can keep
+many LLM calls in flight per worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -14,3 +18,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shule_voice.settings')
 
 application = get_asgi_application()
+
+# Only servers load this module (runserver included), so the local Ollama model
+# is warmed for them and not for management commands, workers, tests or scripts
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'OLLAMA_WARMUP', True):
+    from base.llm import ollama
+
+    ollama.warm_up()
@@ -40,6 +40,80 @@ ALLOWED_HOSTS = []
 
 # Add to your settings.py
 GROQ_API_KEY = "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"  # Get free API key from https://console.groq.com
+# Groq models in preference order; the live catalog is refreshed in the background every LLM_MODEL_CATALOG_TTL seconds
+GROQ_MODELS = [
+    "llama-3.1-70b-versatile",
+    "llama-3.1-8b-instant",
+    "mixtral-8x7b-32768",
+    "gemma2-9b-it",
+    "llama3-70b-8192",
+    "llama3-8b-8192",
+]
+LLM_MODEL_CATALOG_TTL = int(os.getenv('LLM_MODEL_CATALOG_TTL', 3600))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 15))
+# Voice replies: overall deadline before the local fallback answers, and when to hedge to the next provider
+LLM_RESPONSE_DEADLINE = float(os.getenv('LLM_RESPONSE_DEADLINE', 8))
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', 0.9))
+LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', 2))
+# Threads shared by all races in a process; hedges are not started while every one is busy
+LLM_RACE_WORKERS = int(os.getenv('LLM_RACE_WORKERS', 32))
+# Provider circuit breakers, shared by all workers through the LLM_HEALTH_CACHE cache
+LLM_HEALTH_CACHE = 'shared'
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 3))
+LLM_BREAKER_COOLDOWN = int(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+LLM_BREAKER_SLOW_CALL = float(os.getenv('LLM_BREAKER_SLOW_CALL', 6))
+# Database threads shared by async voice requests (voice_assistant_async under ASGI)
+VOICE_DB_THREADS = int(os.getenv('VOICE_DB_THREADS', 4))
+# Cache of answers to common voice questions (per process)
+VOICE_CACHE_MAX_ENTRIES = int(os.getenv('VOICE_CACHE_MAX_ENTRIES', 1000))
+VOICE_CACHE_TTL = int(os.getenv('VOICE_CACHE_TTL', 86400))
+# Per-student voice prompt context; the shared cache lets signal invalidation reach every worker
+VOICE_CONTEXT_CACHE = 'shared'
+VOICE_CONTEXT_TTL = int(os.getenv('VOICE_CONTEXT_TTL', 300))
+# Local Ollama provider; the model is kept loaded for OLLAMA_KEEP_ALIVE and loaded when a server starts if OLLAMA_WARMUP is on
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama2')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+OLLAMA_WARMUP = os.getenv('OLLAMA_WARMUP', 'true').lower() == 'true'
+OLLAMA_CONTEXT_MAX_ENTRIES = int(os.getenv('OLLAMA_CONTEXT_MAX_ENTRIES', 200))
+
+# Offline fallback: curated lesson content indexed with BM25 (see base/retrieval.py)
+LESSON_CONTENT_FILE = os.getenv('LESSON_CONTENT_FILE', str(BASE_DIR / 'base' / 'content' / 'early_grades.json'))
+VOICE_RETRIEVAL_CACHE = os.getenv('VOICE_RETRIEVAL_CACHE', 'shared')
+# A match must score VOICE_RETRIEVAL_MIN_SCORE and cover this share of the question's terms in its own question or keywords
+VOICE_RETRIEVAL_MIN_SCORE = float(os.getenv('VOICE_RETRIEVAL_MIN_SCORE', 3.0))
+VOICE_RETRIEVAL_MIN_COVERAGE = float(os.getenv('VOICE_RETRIEVAL_MIN_COVERAGE', 0.5))
+
+# Voice admission control: token buckets (requests per second, burst) per student and per teacher,
+# and a cap on concurrent upstream LLM calls with a bounded wait for a slot (seconds)
+VOICE_STUDENT_RATE = float(os.getenv('VOICE_STUDENT_RATE', 0.2))
+VOICE_STUDENT_BURST = int(os.getenv('VOICE_STUDENT_BURST', 5))
+VOICE_TEACHER_RATE = float(os.getenv('VOICE_TEACHER_RATE', 2.0))
+VOICE_TEACHER_BURST = int(os.getenv('VOICE_TEACHER_BURST', 30))
+VOICE_LLM_CONCURRENCY = int(os.getenv('VOICE_LLM_CONCURRENCY', 8))
+VOICE_ADMISSION_WAIT = float(os.getenv('VOICE_ADMISSION_WAIT', 3.0))
+# Voice conversations are kept server-side; the browser only sends their id
+VOICE_CONVERSATION_CACHE = os.getenv('VOICE_CONVERSATION_CACHE', 'shared')
+VOICE_CONVERSATION_TTL = int(os.getenv('VOICE_CONVERSATION_TTL', 3600))
+# Per-process copies, checked against a version key in the cache before use
+VOICE_CONVERSATION_LOCAL_MAX = int(os.getenv('VOICE_CONVERSATION_LOCAL_MAX', 200))
+VOICE_CONVERSATION_MAX_TURNS = int(os.getenv('VOICE_CONVERSATION_MAX_TURNS', 20))
+VOICE_HISTORY_TOKEN_BUDGET = int(os.getenv('VOICE_HISTORY_TOKEN_BUDGET', 1200))
+# Older turns are folded into a running summary once history passes the threshold (tokens)
+VOICE_SUMMARY_THRESHOLD = int(os.getenv('VOICE_SUMMARY_THRESHOLD', 600))
+VOICE_SUMMARY_KEEP_TURNS = int(os.getenv('VOICE_SUMMARY_KEEP_TURNS', 3))
+VOICE_SUMMARY_MAX_TOKENS = int(os.getenv('VOICE_SUMMARY_MAX_TOKENS', 200))
+VOICE_SUMMARY_MODEL = os.getenv('VOICE_SUMMARY_MODEL', 'llama-3.1-8b-instant')
+# Follow-ups for right and wrong answers are pre-generated while a question is being spoken,
+# only while under VOICE_SPECULATION_MAX_LOAD of the upstream slots are busy
+VOICE_SPECULATION = os.getenv('VOICE_SPECULATION', 'true').lower() == 'true'
+VOICE_SPECULATION_TTL = int(os.getenv('VOICE_SPECULATION_TTL', 120))
+VOICE_SPECULATION_MAX_LOAD = float(os.getenv('VOICE_SPECULATION_MAX_LOAD', 0.5))
+# Voice interaction logging is written behind the response in batches, journaled under VOICE_WRITE_BEHIND_DIR
+VOICE_WRITE_BEHIND = os.getenv('VOICE_WRITE_BEHIND', 'true').lower() == 'true'
+VOICE_WRITE_BEHIND_DIR = os.getenv('VOICE_WRITE_BEHIND_DIR', str(BASE_DIR / 'cache' / 'voice_log'))
+VOICE_WRITE_BEHIND_BATCH = int(os.getenv('VOICE_WRITE_BEHIND_BATCH', 50))
+VOICE_WRITE_BEHIND_MAX = int(os.getenv('VOICE_WRITE_BEHIND_MAX', 1000))
 # Application definition
 
 INSTALLED_APPS = [
@@ -83,6 +157,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'shule_voice.wsgi.application'
+ASGI_APPLICATION = 'shule_voice.asgi.application'
 
 
 # Database
@@ -127,6 +202,18 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Caches: per-process memory by default, plus a file cache every worker on this machine shares
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SHARED_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shule_voice.settings')
 
 application = get_wsgi_application()
+
+# Only servers load this module (runserver included), so the local Ollama model
+# is warmed for them and not for management commands, workers, tests or scripts
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'OLLAMA_WARMUP', True):
+    from base.llm import ollama
+
+    ollama.warm_up()
@@ -8,6 +8,8 @@ import requests
 import os
 from datetime import datetime
 
+from base.spoken_math import ArithmeticQuestion, format_number, parse_question
+
 # Initialize Firebase Firestore
 if not firebase_admin._apps:
     cred = credentials.Certificate("/home/george/Desktop/shuleproject/firebase-key.json")
@@ -42,6 +44,7 @@ def has_internet():
 
 # Function to get Grok API response
 def get_grok_response(user_input):
+    global history
     if not API_KEY:
         return "API key not set. Check your environment variable."
     
@@ -73,6 +76,18 @@ def get_grok_response(user_input):
     except Exception as e:
         return f"Request failed: {str(e)}"
 
+# Function to explain a wrong maths answer (graded locally; Grok only explains)
+def explain_answer(question, answer_text):
+    if API_KEY:
+        explanation = get_grok_response(
+            f"In math lesson: I answered '{answer_text}' to '{question.text}' "
+            f"The answer is {format_number(question.answer)}. Explain it in one or two short sentences. "
+            "Do not ask a new question."
+        )
+        if not explanation.startswith(("API error", "Request failed")):
+            return explanation
+    return question.explanation()
+
 # Function to log progress to Firestore
 def log_progress(student_id, topic, user_input, ai_response, correct=None, time_spent=0):
     try:
@@ -95,6 +110,9 @@ es.say("Hello! I'm ShuleVoice. Say 'start math', 'start english', or 'start scie
 current_topic = None
 student_id = None
 start_time = None
+current_question = None  # Arithmetic question waiting for an answer
+level = 1
+streak = 0
 
 stream.start_stream()
 while True:
@@ -110,14 +128,38 @@ while True:
             elif "start" in text and student_id:
                 current_topic = text.replace("start ", "")
                 start_time = datetime.now()
-                response = f"Great! Let's start {current_topic}. What's your first answer or question?"
+                if "math" in current_topic:
+                    current_question = ArithmeticQuestion.generate(level)
+                    response = f"Great! Let's start math. {current_question.text}"
+                else:
+                    current_question = None
+                    response = f"Great! Let's start {current_topic}. What's your first answer or question?"
             elif current_topic and student_id:
                 if not start_time:
                     start_time = datetime.now()
-                user_input = f"In {current_topic} lesson: {text}"
-                response = get_grok_response(user_input)
                 time_spent = (datetime.now() - start_time).seconds if start_time else 0
-                correct = "correct" in response.lower()  # Simple heuristic
+                verdict = current_question.check(text) if current_question else None
+                if verdict == "correct":
+                    correct = True
+                    streak += 1
+                    if streak >= 3 and level < max(ArithmeticQuestion.LEVELS):
+                        level, streak = level + 1, 0
+                    response = current_question.praise()
+                    current_question = ArithmeticQuestion.generate(level)
+                    response = f"{response} {current_question.text}"
+                elif verdict == "incorrect":
+                    correct = False
+                    streak = 0
+                    response = explain_answer(current_question, text)
+                    current_question = ArithmeticQuestion.generate(level)
+                    response = f"{response} Let's try another. {current_question.text}"
+                else:
+                    # Not a numeric answer: Grok replies, and the answer stays ungraded
+                    correct = None
+                    user_input = f"In {current_topic} lesson: {text}"
+                    response = get_grok_response(user_input)
+                    # If Grok asked a sum itself, the next answer is graded locally
+                    current_question = parse_question(response)
                 log_progress(student_id, current_topic, text, response, correct, time_spent)
                 start_time = datetime.now()  # Reset for next interaction
             else: